@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk deployment package benchmark
+Đo SecurityManager.create_deployment_packages với số worker khác nhau (1 = tuần tự
+như vòng lặp create_deployment_package cũ) trên một danh mục doanh nghiệp giả lập.
+
+Ví dụ:
+    python benchmarks/bench_bulk_packages.py --companies 500 --workers 1 2 4 8
+"""
+
+import os
+import random
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+from bench_common import add_src_to_path, tmpfs_dir, write_results, compare_results
+import htkk_corpus
+
+
+def company_configs(count, seed, broken=0):
+    """Sinh config doanh nghiệp; ``broken`` config thiếu trường để kiểm tra báo lỗi từng mục."""
+    rng = random.Random(seed)
+    for index in range(count):
+        config = {
+            'company_mst': htkk_corpus.random_mst(rng),
+            'company_name': htkk_corpus.random_company(rng),
+            'telegram_config': {
+                'bot_token': f"{rng.randrange(10**9)}:BENCH{index:06d}",
+                'chat_id': str(-rng.randrange(10**12)),
+                'admin_ids': [rng.randrange(10**9)],
+            },
+            'templates': [f'template_{i}.xml' for i in range(rng.randrange(1, 20))],
+        }
+        if index < broken:
+            del config['company_name']
+        yield config
+
+
+def run_benchmark(args):
+    sandbox = Path(tempfile.mkdtemp(prefix='xmlprot_bulk_', dir=args.workdir or tmpfs_dir()))
+    os.environ['APPDATA'] = str(sandbox / 'appdata')
+    (sandbox / 'appdata').mkdir()
+    add_src_to_path()
+    import security_manager
+
+    manager = security_manager.SecurityManager(kdf_iterations=args.iterations)
+    results = {'config': {'companies': args.companies, 'kdf_iterations': manager.kdf_iterations,
+                          'cpu_count': os.cpu_count(), 'broken': args.broken}}
+    baseline = None
+    try:
+        for workers in args.workers:
+            output_dir = sandbox / f'packages_{workers}'
+            # Mỗi lần đo phải derive lại key (worker fork sẽ thừa hưởng cache của process cha)
+            security_manager.kdf_cache.clear()
+            summary = manager.create_deployment_packages(
+                company_configs(args.companies, args.seed, args.broken), output_dir, workers=workers)
+            written = len(list(output_dir.glob('*.json')))
+            baseline = baseline or summary['packages_per_s']
+            results[f'workers_{workers}'] = {
+                'elapsed_s': summary['elapsed_s'],
+                'packages_per_s': summary['packages_per_s'],
+                'speedup': round(summary['packages_per_s'] / baseline, 2) if baseline else 0,
+                'succeeded': summary['succeeded'],
+                'failed': summary['failed'],
+                'files_written': written,
+            }
+            shutil.rmtree(output_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tạo deployment package hàng loạt theo số worker")
+    parser.add_argument('--companies', type=int, default=200, help="Số doanh nghiệp trong danh mục")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help="Các số worker cần đo")
+    parser.add_argument('--iterations', type=int, default=None, help="Số vòng PBKDF2 (mặc định như runtime)")
+    parser.add_argument('--broken', type=int, default=2, help="Số config lỗi cố ý (kiểm tra báo lỗi từng mục)")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workdir', default=None, help="Thư mục làm việc (mặc định tmpfs nếu có)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('bulk_packages', results, args.output, args.label)
+
+    print(f"🏭 Bulk deployment packages ({args.companies} DN, {results['config']['kdf_iterations']} vòng PBKDF2, "
+          f"{results['config']['cpu_count']} CPU)")
+    print(f"   {'workers':>8s} {'giây':>8s} {'package/s':>10s} {'speedup':>8s} {'lỗi':>5s}")
+    for workers in args.workers:
+        row = results[f'workers_{workers}']
+        print(f"   {workers:>8d} {row['elapsed_s']:>8.2f} {row['packages_per_s']:>10.1f} "
+              f"{row['speedup']:>7.2f}x {row['failed']:>5d}")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark helpers
+Lưu kết quả dạng JSON (kèm thông tin môi trường) và so sánh giữa các phiên bản
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+SRC_DIR = REPO_DIR / 'src'
+RESULTS_DIR = BENCH_DIR / 'results'
+
+
+def add_src_to_path():
+    """Cho phép import các module trong src/ giống khi chạy runtime."""
+    if str(SRC_DIR) not in sys.path:
+        sys.path.insert(0, str(SRC_DIR))
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, timeout=5)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'git_revision': git_revision(),
+    }
+
+
+def tmpfs_dir():
+    """Thư mục RAM (tmpfs) nếu có, để loại nhiễu từ ổ đĩa."""
+    for candidate in ('/dev/shm', os.getenv('TMPDIR')):
+        if candidate and os.path.isdir(candidate) and os.access(candidate, os.W_OK):
+            return candidate
+    return None
+
+
+def write_results(name, results, output=None, label=None):
+    """Ghi kết quả benchmark ra JSON và trả về đường dẫn."""
+    payload = {
+        'benchmark': name,
+        'label': label,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment_info(),
+        'results': results,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        revision = payload['environment']['git_revision'] or 'worktree'
+        output = RESULTS_DIR / f"{name}_{revision}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    return output
+
+
+def flatten(data, prefix=''):
+    items = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            items.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[name] = value
+    return items
+
+
+def compare_results(baseline_file, results):
+    """In chênh lệch các số liệu so với một file kết quả trước đó."""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = flatten(json.load(f).get('results', {}))
+    current = flatten(results)
+    print(f"📊 So sánh với {baseline_file}:")
+    for name in sorted(set(baseline) & set(current)):
+        old, new = baseline[name], current[name]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"   {name:50s} {old:>14.3f} -> {new:>14.3f} ({change})")
+
+
+def percentile(values, quantile):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(quantile * len(ordered))) - 1))
+    return ordered[index]
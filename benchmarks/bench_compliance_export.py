@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compliance export benchmark
+Xuất mọi security event của một khung thời gian: cách dựng sẵn trong bộ nhớ
+(fetchall + json.dump(indent=2) như generate_compliance_report) so với
+export_security_events (trang keyset, ghi dần JSON Lines / CSV gzip). Đo tốc
+độ (dòng/giây), bộ nhớ Python đỉnh (tracemalloc, lượt chạy riêng) và độ trễ
+đọc trang cuối bằng OFFSET so với keyset.
+
+Ví dụ:
+    python benchmarks/bench_compliance_export.py --rows 2000000 --days 90
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+
+from bench_common import add_src_to_path, write_results, compare_results
+from bench_monitoring_queries import build_database
+
+MODES = (('fetchall_json', 'events.json'), ('keyset_jsonl', 'events.jsonl'), ('keyset_csv_gz', 'events.csv.gz'))
+
+
+def fetchall_export(db, path, since_time, until_time):
+    """Cách làm trong bộ nhớ: đọc hết khung rồi ghi một JSON lớn."""
+    import compliance_export
+
+    with db.read() as cursor:
+        rows = cursor.execute(f"SELECT {', '.join(compliance_export.EXPORT_COLUMNS)} FROM security_events "
+                              "WHERE timestamp >= ? AND timestamp <= ? ORDER BY timestamp, id",
+                              (since_time, until_time)).fetchall()
+    events = [dict(zip(compliance_export.EXPORT_COLUMNS, row)) for row in rows]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'events': events}, f, indent=2, ensure_ascii=False)
+    return len(events)
+
+
+def run_mode(mode, path, db, window, args):
+    from compliance_export import export_security_events
+
+    if mode == 'fetchall_json':
+        return fetchall_export(db, path, *window)
+    return export_security_events(db, path, *window, page_size=args.page_size)['done']
+
+
+def last_page_ms(db, window, args):
+    """Đọc trang cuối của khung: OFFSET phải duyệt qua mọi dòng trước đó, keyset tìm thẳng trong index."""
+    import monitoring_queries
+
+    since_time, until_time = window
+    with db.read() as cursor:
+        total = cursor.execute('SELECT COUNT(*) FROM security_events WHERE timestamp >= ? AND timestamp <= ?',
+                               window).fetchone()[0]
+        offset = max(total - args.page_size, 0)
+        start = time.perf_counter()
+        rows = cursor.execute(monitoring_queries.QUERIES['export_events_page'][0].replace(
+            'LIMIT ?', 'LIMIT ? OFFSET ?'), (since_time, until_time, since_time, 0, args.page_size, offset)).fetchall()
+        offset_ms = (time.perf_counter() - start) * 1000
+        before_last = cursor.execute('SELECT timestamp, id FROM security_events WHERE timestamp >= ? AND timestamp <= ? '
+                                     'ORDER BY timestamp, id LIMIT 1 OFFSET ?', (since_time, until_time,
+                                                                                 offset - 1)).fetchone()
+        start = time.perf_counter()
+        keyset_rows = monitoring_queries.fetch(cursor, 'export_events_page', before_last[0], until_time,
+                                               before_last[0], before_last[1], args.page_size)
+        keyset_ms = (time.perf_counter() - start) * 1000
+    return {'offset_ms': round(offset_ms, 3), 'keyset_ms': round(keyset_ms, 3), 'pages_match': rows == keyset_rows}
+
+
+def run_benchmark(args):
+    sandbox = tempfile.mkdtemp(prefix='xmlprot_export_', dir=args.workdir)
+    os.environ['APPDATA'] = sandbox
+    add_src_to_path()
+    import monitoring_queries
+    from monitoring_db import MonitoringDatabase
+
+    db_file = os.path.join(sandbox, 'monitoring.db')
+    try:
+        results = {'config': {'rows': args.rows, 'days': args.days, 'window_days': args.window_days,
+                              'page_size': args.page_size},
+                   'dataset': build_database(db_file, args)}
+        conn = sqlite3.connect(db_file)
+        conn.execute('BEGIN')
+        monitoring_queries.migrate(conn.cursor())
+        conn.commit()
+        conn.close()
+        db = MonitoringDatabase(db_file)
+        window = (monitoring_queries.since(args.window_days * 86400), monitoring_queries.since(0))
+        for mode, filename in MODES:
+            path = os.path.join(sandbox, filename)
+            start = time.perf_counter()
+            rows = run_mode(mode, path, db, window, args)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path)
+            os.remove(path)
+            tracemalloc.start()
+            run_mode(mode, path, db, window, args)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            os.remove(path)
+            results[mode] = {'rows': rows, 'elapsed_s': round(elapsed, 3), 'rows_per_s': round(rows / elapsed, 1),
+                             'peak_mb': round(peak / 1024 / 1024, 2), 'file_mb': round(size / 1024 / 1024, 2)}
+        results['last_page'] = last_page_ms(db, window, args)
+        db.close()
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark export security event: trong bộ nhớ vs trang keyset")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Số security event giả lập")
+    parser.add_argument('--days', type=int, default=90, help="Khoảng thời gian dữ liệu trải ra (ngày)")
+    parser.add_argument('--window-days', type=int, default=90, help="Khung export (ngày)")
+    parser.add_argument('--page-size', type=int, default=5000, help="Số dòng mỗi trang keyset")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workdir', default=None, help="Thư mục tạo DB")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('compliance_export', results, args.output, args.label)
+
+    print(f"📤 Compliance export benchmark ({args.rows:,} event / {args.days} ngày, khung {args.window_days} ngày)")
+    print(f"   {'cách export':16s} {'dòng':>10s} {'giây':>8s} {'dòng/s':>10s} {'peak MB':>9s} {'file MB':>9s}")
+    for mode, _ in MODES:
+        row = results[mode]
+        print(f"   {mode:16s} {row['rows']:>10,} {row['elapsed_s']:>8.2f} {row['rows_per_s']:>10,.0f} "
+              f"{row['peak_mb']:>9.2f} {row['file_mb']:>9.2f}")
+    page = results['last_page']
+    print(f"   Trang cuối: OFFSET {page['offset_ms']:.2f} ms, keyset {page['keyset_ms']:.2f} ms "
+          f"(cùng kết quả: {'✅' if page['pages_match'] else '❌'})")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
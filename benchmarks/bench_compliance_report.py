@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compliance report benchmark
+So sánh thời gian các truy vấn của báo cáo compliance trên dữ liệu thô (đã có
+index) với rollup phút/giờ/ngày, cho khung 1, 30 và 365 ngày trên DB giả lập
+(dùng chung bộ sinh dữ liệu với bench_monitoring_queries.py).
+
+Ví dụ:
+    python benchmarks/bench_compliance_report.py --rows 10000000 --days 365
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import statistics
+
+from bench_common import add_src_to_path, write_results, compare_results
+from bench_monitoring_queries import build_database
+
+# Truy vấn báo cáo: (truy vấn trên bảng thô, truy vấn trên rollup)
+REPORT_QUERIES = (
+    ('event_overview', 'rollup_event_overview'),
+    ('severity_counts', 'rollup_severity_counts'),
+    ('top_event_types', 'rollup_top_event_types'),
+    ('performance_summary', 'rollup_performance_summary'),
+)
+
+
+def timed(func, runs):
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3), result
+
+
+def run_benchmark(args):
+    sandbox = tempfile.mkdtemp(prefix='xmlprot_report_', dir=args.workdir)
+    os.environ['APPDATA'] = sandbox
+    add_src_to_path()
+    import monitoring_queries
+
+    db_file = os.path.join(sandbox, 'monitoring.db')
+    try:
+        results = {'config': {'rows': args.rows, 'days': args.days, 'windows': args.windows, 'runs': args.runs},
+                   'dataset': build_database(db_file, args)}
+        conn = sqlite3.connect(db_file)
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        cursor.execute('BEGIN')
+        monitoring_queries.migrate(cursor)
+        conn.commit()
+        results['migration_s'] = round(time.perf_counter() - started, 1)
+        results['rollup_rows'] = {
+            table: cursor.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in (f'{kind}_rollup_{granularity}' for kind in ('event', 'performance')
+                          for granularity, _ in monitoring_queries.ROLLUP_GRANULARITIES)
+        }
+        results['rollup_rows']['client_activity'] = cursor.execute('SELECT COUNT(*) FROM client_activity').fetchone()[0]
+
+        for window in args.windows:
+            since_time = monitoring_queries.since(window * 86400)
+            row = {}
+            raw_total = rollup_total = 0.0
+            for raw_name, rollup_name in REPORT_QUERIES:
+                raw_ms, raw_result = timed(
+                    lambda: monitoring_queries.fetch(cursor, raw_name, since_time), args.runs)
+                rollup_ms, rollup_result = timed(
+                    lambda: monitoring_queries.fetch_rollup(cursor, rollup_name, since_time), args.runs)
+                raw_total += raw_ms
+                rollup_total += rollup_ms
+                row[raw_name] = {'raw_ms': raw_ms, 'rollup_ms': rollup_ms}
+                if raw_name == 'event_overview':
+                    # Rollup làm tròn mốc bắt đầu xuống đầu phút: lệch tối đa số event của một phút
+                    row['events_raw'] = raw_result[0][0]
+                    row['events_rollup'] = rollup_result[0][0]
+            row['report_raw_ms'] = round(raw_total, 3)
+            row['report_rollup_ms'] = round(rollup_total, 3)
+            row['speedup'] = round(raw_total / rollup_total, 1) if rollup_total else None
+            results[f'window_{window}d'] = row
+        conn.close()
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark báo cáo compliance: dữ liệu thô vs rollup")
+    parser.add_argument('--rows', type=int, default=10_000_000, help="Số security event giả lập")
+    parser.add_argument('--days', type=int, default=365, help="Khoảng thời gian dữ liệu trải ra (ngày)")
+    parser.add_argument('--windows', type=int, nargs='+', default=[1, 30, 365], help="Các khung báo cáo (ngày)")
+    parser.add_argument('--runs', type=int, default=5, help="Số lần chạy mỗi truy vấn, lấy median")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workdir', default=None, help="Thư mục tạo DB (cần vài GB cho 10 triệu dòng)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('compliance_report', results, args.output, args.label)
+
+    dataset = results['dataset']
+    print(f"📊 Compliance report benchmark ({dataset['security_events']:,} event / {args.days} ngày, "
+          f"migration + backfill rollup {results['migration_s']} s)")
+    print(f"   {'khung':>6s} {'thô ms':>10s} {'rollup ms':>10s} {'speedup':>9s} {'event thô':>11s} {'event rollup':>13s}")
+    for window in args.windows:
+        row = results[f'window_{window}d']
+        print(f"   {window:>5d}d {row['report_raw_ms']:>10.2f} {row['report_rollup_ms']:>10.2f} "
+              f"{row['speedup'] or 0:>8.1f}x {row['events_raw']:>11,} {row['events_rollup']:>13,}")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Secure config load benchmark
+Đo thời gian giải mã config ở 4 trạng thái: cold (phải chạy PBKDF2), warm (key
+đã cache trong process, vẫn đọc + giải mã file), disk (cache key niêm phong trên
+đĩa, giống lần boot kế tiếp) và cached (ConfigManager.load_config_secure qua
+config_cache: chỉ stat file), với nhiều số vòng PBKDF2.
+
+Ví dụ:
+    python benchmarks/bench_config_load.py --iterations 100000 200000 --runs 20
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from bench_common import add_src_to_path, write_results, compare_results, percentile
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p90_ms': round(percentile(samples, 0.90), 3),
+        'min_ms': round(min(samples), 3),
+    }
+
+
+def run_benchmark(args):
+    appdata = tempfile.mkdtemp(prefix='xmlprot_kdf_')
+    os.environ['APPDATA'] = appdata
+    add_src_to_path()
+    import security_manager
+
+    cache = security_manager.kdf_cache
+    results = {'calibrated_iterations_250ms': security_manager.calibrate_kdf_iterations(250)}
+    try:
+        for iterations in args.iterations:
+            manager = security_manager.ConfigManager(kdf_iterations=iterations)
+            config = manager.create_company_config('BENCH_TOKEN', '-100', [1], '0101234567', 'Công ty Benchmark')
+            manager.save_config_secure(config)
+            load = lambda: manager.security.load_secure_config('0101234567', 'Công ty Benchmark')
+
+            def cold():
+                cache.clear()
+                load()
+
+            disk_manager = security_manager.SecurityManager(kdf_iterations=iterations, disk_key_cache=True)
+            disk_manager.generate_company_key('0101234567', 'Công ty Benchmark')
+
+            def disk():
+                cache.clear()
+                disk_manager.load_secure_config('0101234567', 'Công ty Benchmark')
+
+            cached = lambda: manager.load_config_secure('0101234567', 'Công ty Benchmark')
+
+            load()
+            results[str(iterations)] = {
+                'cold': timed(cold, args.runs),
+                'warm': timed(load, args.runs),
+                'disk': timed(disk, args.runs),
+                'cached': timed(cached, args.runs),
+            }
+            disk_manager.kdf_cache_file.unlink(missing_ok=True)
+        results['cache_stats'] = cache.stats()
+        results['config_cache_stats'] = security_manager.config_cache.stats()
+    finally:
+        shutil.rmtree(appdata, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark giải mã config cold/warm của SecurityManager")
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100000, 200000, 600000],
+                        help="Các số vòng PBKDF2 cần đo")
+    parser.add_argument('--runs', type=int, default=10, help="Số lần đo mỗi trạng thái")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('config_load', results, args.output, args.label)
+
+    print("🔐 Secure config load benchmark (median ms)")
+    print(f"   {'iterations':>10s} {'cold':>10s} {'warm':>10s} {'disk':>10s} {'cached':>10s}")
+    for iterations in args.iterations:
+        row = results[str(iterations)]
+        print(f"   {iterations:>10d} {row['cold']['median_ms']:>10.3f} {row['warm']['median_ms']:>10.3f} "
+              f"{row['disk']['median_ms']:>10.3f} {row['cached']['median_ms']:>10.3f}")
+    print(f"   Số vòng gợi ý (~250 ms trên máy này): {results['calibrated_iterations_250ms']}")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Crypto envelope benchmark
+So sánh Fernet + base64 (định dạng cũ của SecurityManager) với envelope
+AES-256-GCM / ChaCha20-Poly1305: kích thước tăng thêm (%) và tốc độ mã hóa /
+giải mã trên input cỡ config (~1 KB) và cỡ bundle (1 MB, 16 MB).
+
+Ví dụ:
+    python benchmarks/bench_crypto_envelope.py --sizes 1024 1048576 16777216
+"""
+
+import os
+import time
+import base64
+import argparse
+import statistics
+
+from bench_common import add_src_to_path, write_results, compare_results
+
+add_src_to_path()
+import crypto_envelope  # noqa: E402
+from cryptography.fernet import Fernet  # noqa: E402
+
+SALT = b'bench-salt-16byt'
+ITERATIONS = 100000
+
+
+def legacy_codec(master_key):
+    """Định dạng cũ: Fernet rồi thêm một lớp urlsafe base64."""
+    fernet = Fernet(base64.urlsafe_b64encode(master_key))
+
+    def encrypt(data):
+        return base64.urlsafe_b64encode(fernet.encrypt(data))
+
+    def decrypt(blob):
+        return fernet.decrypt(base64.urlsafe_b64decode(blob))
+    return encrypt, decrypt
+
+
+def envelope_codec(master_key, algorithm):
+    """Envelope dạng text như trong secure_config.enc."""
+    def encrypt(data):
+        return crypto_envelope.to_text(crypto_envelope.seal(master_key, data, algorithm, SALT, ITERATIONS))
+
+    def decrypt(text):
+        return crypto_envelope.unseal(crypto_envelope.from_text(text), lambda salt, iterations: master_key)
+    return encrypt, decrypt
+
+
+def time_op(operation, value, repeat, min_time):
+    """Median thời gian một lần gọi (giây) qua ``repeat`` đợt, mỗi đợt ít nhất ``min_time``."""
+    samples = []
+    for _ in range(repeat):
+        loops = 0
+        start = time.perf_counter()
+        while True:
+            operation(value)
+            loops += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        samples.append(elapsed / loops)
+    return statistics.median(samples)
+
+
+def run_benchmark(args):
+    master_key = os.urandom(32)
+    codecs = {crypto_envelope.LEGACY_ALGORITHM: legacy_codec(master_key)}
+    for algorithm in crypto_envelope.ALGORITHMS:
+        codecs[algorithm] = envelope_codec(master_key, algorithm)
+
+    results = {'config': {'sizes': args.sizes, 'repeat': args.repeat, 'min_time_s': args.min_time}}
+    for size in args.sizes:
+        data = os.urandom(size)
+        row = {}
+        for name, (encrypt, decrypt) in codecs.items():
+            blob = encrypt(data)
+            if decrypt(blob) != data:
+                raise RuntimeError(f"{name}: giải mã không khớp dữ liệu gốc")
+            encrypt_s = time_op(encrypt, data, args.repeat, args.min_time)
+            decrypt_s = time_op(decrypt, blob, args.repeat, args.min_time)
+            row[name] = {
+                'output_bytes': len(blob),
+                'overhead_pct': round((len(blob) - size) / size * 100, 2),
+                'encrypt_us': round(encrypt_s * 1e6, 2),
+                'decrypt_us': round(decrypt_s * 1e6, 2),
+                'encrypt_mb_s': round(size / encrypt_s / 1024 / 1024, 1),
+                'decrypt_mb_s': round(size / decrypt_s / 1024 / 1024, 1),
+            }
+        results[f'size_{size}'] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Fernet cũ vs crypto envelope AEAD")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1024, 1024 * 1024, 16 * 1024 * 1024],
+                        help="Kích thước input (byte)")
+    parser.add_argument('--repeat', type=int, default=5, help="Số đợt đo, lấy median")
+    parser.add_argument('--min-time', type=float, default=0.2, help="Thời gian tối thiểu mỗi đợt (giây)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('crypto_envelope', results, args.output, args.label)
+
+    print("🔐 Crypto envelope benchmark (median)")
+    for size in args.sizes:
+        print(f"   Input {size:,} bytes")
+        print(f"   {'thuật toán':20s} {'overhead':>9s} {'enc µs':>11s} {'dec µs':>11s} {'enc MB/s':>9s} {'dec MB/s':>9s}")
+        for name, row in results[f'size_{size}'].items():
+            print(f"   {name:20s} {row['overhead_pct']:>8.1f}% {row['encrypt_us']:>11.1f} {row['decrypt_us']:>11.1f} "
+                  f"{row['encrypt_mb_s']:>9.1f} {row['decrypt_mb_s']:>9.1f}")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
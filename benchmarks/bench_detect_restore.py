@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detect-to-restore benchmark
+Chạy XMLProtectorRuntime thật trên thư mục tmpfs, bắn tờ khai giả mạo + XML nhiễu
+theo tốc độ cấu hình và đo throughput, p50/p99 detect-to-restore, CPU, RSS.
+
+Ví dụ:
+    python benchmarks/bench_detect_restore.py --events 100 --rate 10
+    python benchmarks/bench_detect_restore.py --compare benchmarks/results/<file>.json
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+import psutil
+
+from bench_common import (add_src_to_path, tmpfs_dir, write_results, compare_results, percentile)
+import htkk_corpus
+
+
+class RestorePoller(threading.Thread):
+    """Theo dõi các file giả mạo đang chờ và ghi nhận thời điểm được khôi phục."""
+
+    def __init__(self, process, interval=0.002):
+        super().__init__(name='bench-restore-poller', daemon=True)
+        self.process = process
+        self.interval = interval
+        self.pending = {}
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.peak_rss = process.memory_info().rss
+
+    def expect(self, path, expected_bytes, written_at):
+        with self.lock:
+            self.pending[path] = (expected_bytes, written_at)
+
+    def outstanding(self):
+        with self.lock:
+            return len(self.pending)
+
+    def run(self):
+        samples = 0
+        while not self.stop_event.is_set():
+            with self.lock:
+                items = list(self.pending.items())
+            for path, (expected, written_at) in items:
+                try:
+                    with open(path, 'rb') as f:
+                        restored = f.read() == expected
+                except OSError:
+                    continue
+                if restored:
+                    latency = time.perf_counter() - written_at
+                    with self.lock:
+                        self.pending.pop(path, None)
+                        self.latencies.append(latency)
+            samples += 1
+            if samples % 50 == 0:
+                self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+
+def run_benchmark(args):
+    sandbox = Path(tempfile.mkdtemp(prefix='xmlprot_bench_', dir=args.workdir or tmpfs_dir()))
+    appdata = sandbox / 'appdata'
+    watch_dir = sandbox / 'watch'
+    appdata.mkdir()
+    watch_dir.mkdir()
+    os.environ['APPDATA'] = str(appdata)
+    os.chdir(sandbox)  # Tránh load nhầm ./templates của repo
+
+    base = htkk_corpus.load_base_declaration()
+    declarations = htkk_corpus.generate_templates(args.templates, seed=args.seed, base=base)
+    htkk_corpus.write_templates(declarations, appdata / 'XMLProtectorRuntime' / 'templates')
+
+    add_src_to_path()
+    import logging
+    logging.disable(logging.NOTSET if args.verbose else logging.WARNING)
+    import xml_protector_runtime as runtime
+    from watchdog.observers import Observer
+
+    if args.settle_delay is not None:
+        runtime.XMLFileHandler.SETTLE_DELAY = args.settle_delay
+
+    process = psutil.Process()
+    boot_start = time.perf_counter()
+    protector = runtime.XMLProtectorRuntime()
+    boot_ms = (time.perf_counter() - boot_start) * 1000
+
+    expected = {t['mst']: protector.template_bytes(t) for t in protector.templates.values()}
+    observer = Observer()
+    observer.schedule(runtime.XMLFileHandler(protector), str(watch_dir), recursive=True)
+    observer.start()
+    protector.observer = observer
+
+    poller = RestorePoller(process)
+    poller.start()
+
+    rng = random.Random(args.seed)
+    cpu_start = process.cpu_times()
+    wall_start = time.perf_counter()
+    tampered = noise = 0
+    interval = 1.0 / args.rate if args.rate > 0 else 0
+    for index in range(args.events):
+        target = wall_start + index * interval
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        path = watch_dir / f"declaration_{index:06d}.xml"
+        if rng.random() < args.noise_ratio:
+            path.write_text(htkk_corpus.make_noise_xml(rng), encoding='utf-8')
+            noise += 1
+            continue
+        declaration = rng.choice(declarations)
+        content = htkk_corpus.make_tampered(declaration, rng, base=base)
+        written_at = time.perf_counter()
+        path.write_text(content, encoding='utf-8')
+        poller.expect(str(path), expected[declaration['mst']], written_at)
+        tampered += 1
+    send_done = time.perf_counter()
+
+    deadline = time.perf_counter() + args.timeout
+    while poller.outstanding() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    wall_end = time.perf_counter()
+    cpu_end = process.cpu_times()
+
+    poller.stop_event.set()
+    observer.stop()
+    observer.join()
+    poller.join()
+
+    latencies_ms = [latency * 1000 for latency in poller.latencies]
+    elapsed = wall_end - wall_start
+    cpu_seconds = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    results = {
+        'config': {
+            'events': args.events,
+            'rate_per_s': args.rate,
+            'templates': args.templates,
+            'noise_ratio': args.noise_ratio,
+            'settle_delay_s': runtime.XMLFileHandler.SETTLE_DELAY,
+            'workdir': str(sandbox.parent),
+        },
+        'events': {
+            'tampered': tampered,
+            'noise': noise,
+            'restored': len(latencies_ms),
+            'missed': poller.outstanding(),
+        },
+        'timing': {
+            'runtime_boot_ms': round(boot_ms, 1),
+            'send_duration_s': round(send_done - wall_start, 3),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_restores_per_s': round(len(latencies_ms) / elapsed, 3) if elapsed else 0,
+        },
+        'detect_to_restore_ms': {
+            'p50': round(percentile(latencies_ms, 0.50), 2),
+            'p90': round(percentile(latencies_ms, 0.90), 2),
+            'p99': round(percentile(latencies_ms, 0.99), 2),
+            'max': round(max(latencies_ms), 2) if latencies_ms else 0,
+        },
+        'resources': {
+            'cpu_seconds': round(cpu_seconds, 3),
+            'cpu_percent': round(cpu_seconds / elapsed * 100, 1) if elapsed else 0,
+            'peak_rss_mb': round(poller.peak_rss / 1024 / 1024, 1),
+        },
+        'runtime_metrics': protector.get_metrics(),
+    }
+
+    if not args.keep:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detect-to-restore của XML Protector Runtime")
+    parser.add_argument('--events', type=int, default=40, help="Tổng số file ghi vào thư mục theo dõi")
+    parser.add_argument('--rate', type=float, default=5.0, help="Số sự kiện/giây (0 = nhanh nhất có thể)")
+    parser.add_argument('--templates', type=int, default=20, help="Số tờ khai gốc trong template set")
+    parser.add_argument('--noise-ratio', type=float, default=0.3, help="Tỉ lệ XML nhiễu không liên quan")
+    parser.add_argument('--settle-delay', type=float, default=None,
+                        help="Ghi đè XMLFileHandler.SETTLE_DELAY (mặc định giữ nguyên giá trị runtime)")
+    parser.add_argument('--timeout', type=float, default=300.0, help="Thời gian chờ tối đa để khôi phục hết")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workdir', default=None, help="Thư mục làm việc (mặc định tmpfs nếu có)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    parser.add_argument('--keep', action='store_true', help="Giữ lại sandbox sau khi chạy")
+    parser.add_argument('--verbose', action='store_true', help="Hiện log của runtime")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('detect_restore', results, args.output, args.label)
+
+    print("🏁 Detect-to-restore benchmark")
+    print(f"   Sự kiện: {results['events']}")
+    print(f"   Throughput: {results['timing']['throughput_restores_per_s']} restore/s")
+    print(f"   Latency (ms): {results['detect_to_restore_ms']}")
+    print(f"   CPU: {results['resources']['cpu_percent']}% | RSS đỉnh: {results['resources']['peak_rss_mb']} MB")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Machine fingerprint benchmark
+So sánh chi phí lấy Machine ID khi khởi động: tính lại mỗi lần (hành vi cũ của
+SecurityManager.__init__), boot đầu tiên và boot kế tiếp (tính một lần mỗi
+process, trong thread nền từ lúc tạo SecurityManager) và các instance sau
+trong cùng process (memo). Mỗi instance đọc machine_id như khi derive key.
+Mỗi phép đo boot chạy trong process mới để không dính cache của uuid.
+
+Ví dụ:
+    python benchmarks/bench_machine_id.py --runs 10
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from bench_common import SRC_DIR, write_results, compare_results
+
+# Đo trong process mới: in ra JSON các thời gian (ms)
+PROBE = r'''
+import json, time
+import security_manager as sm
+imported = time.perf_counter()
+if MODE == 'recompute':
+    # Hành vi cũ: mỗi instance tự gọi platform.* + uuid.getnode()
+    sm.prefetch_machine_fingerprint = lambda app_dir: None
+    sm.get_machine_fingerprint = lambda app_dir: sm.compute_machine_id()
+sm.SecurityManager().machine_id
+first = time.perf_counter()
+for _ in range(INSTANCES - 1):
+    sm.ConfigManager().security.machine_id
+done = time.perf_counter()
+print(json.dumps({'first_ms': (first - imported) * 1000, 'rest_ms': (done - first) * 1000,
+                  'total_ms': (done - imported) * 1000}))
+'''
+
+
+def probe(mode, appdata, instances):
+    code = PROBE.replace('MODE', repr(mode)).replace('INSTANCES', str(instances))
+    env = dict(os.environ, APPDATA=str(appdata))
+    result = subprocess.run([sys.executable, '-c', code], cwd=SRC_DIR, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples, key):
+    values = [sample[key] for sample in samples]
+    return {'median_ms': round(statistics.median(values), 3), 'max_ms': round(max(values), 3)}
+
+
+def run_benchmark(args):
+    results = {'config': {'runs': args.runs, 'instances_per_process': args.instances}}
+    recompute, first_boot, next_boot = [], [], []
+    for _ in range(args.runs):
+        appdata = tempfile.mkdtemp(prefix='xmlprot_mid_')
+        try:
+            recompute.append(probe('recompute', appdata, args.instances))
+            first_boot.append(probe('memo', appdata, args.instances))
+            next_boot.append(probe('memo', appdata, args.instances))
+        finally:
+            shutil.rmtree(appdata, ignore_errors=True)
+    results['before'] = {'first_instance': summarize(recompute, 'first_ms'),
+                         'other_instances': summarize(recompute, 'rest_ms'),
+                         'total': summarize(recompute, 'total_ms')}
+    results['first_boot'] = {'first_instance': summarize(first_boot, 'first_ms'),
+                             'other_instances': summarize(first_boot, 'rest_ms'),
+                             'total': summarize(first_boot, 'total_ms')}
+    results['next_boot'] = {'first_instance': summarize(next_boot, 'first_ms'),
+                            'other_instances': summarize(next_boot, 'rest_ms'),
+                            'total': summarize(next_boot, 'total_ms')}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Machine ID lúc khởi động SecurityManager")
+    parser.add_argument('--runs', type=int, default=7, help="Số process đo cho mỗi trạng thái")
+    parser.add_argument('--instances', type=int, default=3,
+                        help="Số SecurityManager/ConfigManager tạo trong một process (runtime + builder)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('machine_id', results, args.output, args.label)
+
+    print(f"🖥️ Machine ID benchmark ({args.instances} instance/process, median ms)")
+    print(f"   {'':32s} {'instance đầu':>13s} {'còn lại':>10s} {'tổng':>10s}")
+    for key, title in (('before', 'Trước (tính lại mỗi instance)'), ('first_boot', 'Boot đầu (memo + lưu)'),
+                       ('next_boot', 'Boot kế tiếp (memo)')):
+        row = results[key]
+        print(f"   {title:32s} {row['first_instance']['median_ms']:>13.3f} "
+              f"{row['other_instances']['median_ms']:>10.3f} {row['total']['median_ms']:>10.3f}")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
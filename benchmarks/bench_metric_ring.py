@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Real-time metric buffer benchmark
+So sánh deque các dict mẫu (kèm datetime, như metrics_buffer trước đây) với
+TimeSeriesRing (mỗi metric một array('d') + cột timestamp monotonic) ở 1 triệu
+mẫu: bộ nhớ mỗi mẫu (tracemalloc), tốc độ ghi, truy vấn min/max/mean/p95 theo
+khung thời gian và lấy 20 mẫu mới nhất.
+
+Ví dụ:
+    python benchmarks/bench_metric_ring.py --samples 1000000
+"""
+
+import time
+import random
+import argparse
+import statistics
+import tracemalloc
+from collections import deque
+from datetime import datetime, timedelta
+
+from bench_common import add_src_to_path, write_results, compare_results
+
+FIELDS = ('cpu_percent', 'memory_percent', 'disk_usage', 'active_connections', 'own_cpu_percent',
+          'own_rss_mb', 'sample_ms')
+# Khung truy vấn (giây) với một mẫu mỗi giây
+WINDOWS = (('1h', 3600), ('1d', 86400), ('all', None))
+
+
+def generate(samples, seed):
+    rng = random.Random(seed)
+    for _ in range(samples):
+        yield {field: rng.uniform(0, 100) for field in FIELDS}
+
+
+def deque_stats(buffer, seconds, now):
+    """Cách làm với deque các dict: lọc theo datetime rồi tách từng metric ra list."""
+    since = now - timedelta(seconds=seconds) if seconds is not None else None
+    window = [sample for sample in buffer if since is None or sample['timestamp'] >= since]
+    stats = {}
+    for field in FIELDS:
+        values = [sample[field] for sample in window]
+        ordered = sorted(values)
+        stats[field] = {'count': len(values), 'min': ordered[0], 'max': ordered[-1],
+                        'mean': sum(values) / len(values), 'p95': ordered[-(-len(ordered) * 95 // 100) - 1]}
+    return stats
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def measure_build(factory, append, args):
+    """(buffer, bytes/mẫu, giây ghi) khi nạp --samples mẫu."""
+    tracemalloc.start()
+    buffer = factory()
+    start = time.perf_counter()
+    for index, values in enumerate(generate(args.samples, args.seed)):
+        append(buffer, index, values)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return buffer, current / args.samples, elapsed
+
+
+def run_benchmark(args):
+    add_src_to_path()
+    from runtime_metrics import TimeSeriesRing
+
+    base = datetime(2025, 1, 1)
+    now_wall = base + timedelta(seconds=args.samples - 1)
+    results = {'config': {'samples': args.samples, 'fields': len(FIELDS), 'runs': args.runs}}
+
+    def deque_append(buffer, index, values):
+        values['timestamp'] = base + timedelta(seconds=index)
+        buffer.append(values)
+
+    def ring_append(buffer, index, values):
+        buffer.append(values, timestamp=float(index))
+
+    buffers = {}
+    for name, factory, append in (
+            ('deque', lambda: deque(maxlen=args.samples), deque_append),
+            ('ring', lambda: TimeSeriesRing(FIELDS, args.samples), ring_append)):
+        buffer, per_sample, elapsed = measure_build(factory, append, args)
+        buffers[name] = buffer
+        results[name] = {'bytes_per_sample': round(per_sample, 1),
+                         'append_per_s': round(args.samples / elapsed, 1)}
+
+    ring, dq = buffers['ring'], buffers['deque']
+    for label, seconds in WINDOWS:
+        results['deque'][f'stats_{label}_ms'] = timed(lambda: deque_stats(dq, seconds, now_wall), args.runs)
+        results['ring'][f'stats_{label}_ms'] = timed(
+            lambda: ring.window_stats(seconds, now=float(args.samples - 1)), args.runs)
+    results['deque']['tail_20_ms'] = timed(lambda: list(dq)[-20:], args.runs)
+    results['ring']['tail_20_ms'] = timed(lambda: ring.tail(20), args.runs)
+
+    # Hai cách phải cho cùng kết quả
+    expected = deque_stats(dq, 3600, now_wall)
+    actual = ring.window_stats(3600, now=float(args.samples - 1))
+    results['results_match'] = all(
+        abs(expected[field][key] - actual[field][key]) < 1e-6
+        for field in FIELDS for key in ('count', 'min', 'max', 'mean', 'p95'))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark buffer real-time metrics: deque dict vs TimeSeriesRing")
+    parser.add_argument('--samples', type=int, default=1_000_000, help="Số mẫu trong buffer")
+    parser.add_argument('--runs', type=int, default=3, help="Số lần chạy mỗi truy vấn, lấy median")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('metric_ring', results, args.output, args.label)
+
+    print(f"📈 Metric buffer benchmark ({args.samples:,} mẫu x {len(FIELDS)} metric, "
+          f"kết quả khớp: {'✅' if results['results_match'] else '❌'})")
+    columns = ['bytes_per_sample', 'append_per_s'] + [f'stats_{label}_ms' for label, _ in WINDOWS] + ['tail_20_ms']
+    print(f"   {'buffer':8s}" + ''.join(f" {column:>16s}" for column in columns))
+    for name in ('deque', 'ring'):
+        print(f"   {name:8s}" + ''.join(f" {results[name][column]:>16,.2f}" for column in columns))
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
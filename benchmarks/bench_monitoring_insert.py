@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monitoring DB insert benchmark
+So sánh 3 cách ghi security event khi nhiều thread cùng ghi và một thread đọc
+báo cáo song song: kiểu cũ (mỗi lần gọi mở connection, commit, đóng), connection
+ghi WAL sống lâu commit từng event (wal_sync), và record_security_event qua hàng
+đợi write-behind ghi theo lô (write_behind, thời gian gồm cả flush cuối).
+
+Ví dụ:
+    python benchmarks/bench_monitoring_insert.py --events 5000 --threads 1 4
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+
+from bench_common import add_src_to_path, write_results, compare_results, percentile
+
+INSERT_EVENT = '''
+    INSERT INTO security_events (event_type, severity, client_id, description, raw_data)
+    VALUES (?, ?, ?, ?, ?)
+'''
+REPORT_QUERY = '''
+    SELECT severity, COUNT(*) FROM security_events WHERE timestamp > ? GROUP BY severity
+'''
+MODES = ('legacy', 'wal_sync', 'write_behind')
+
+
+def legacy_backend(db_file):
+    """Đường ghi/đọc trước khi có MonitoringDatabase: connection mới cho mỗi lần gọi."""
+    def write(index):
+        conn = sqlite3.connect(db_file)
+        conn.execute(INSERT_EVENT, event_row(index))
+        conn.commit()
+        conn.close()
+
+    def read():
+        conn = sqlite3.connect(db_file)
+        conn.execute(REPORT_QUERY, ('1970-01-01',)).fetchall()
+        conn.close()
+    return {'write': write, 'read': read}
+
+
+def wal_sync_backend(monitoring):
+    """Connection WAL dùng chung nhưng mỗi event một transaction."""
+    def write(index):
+        with monitoring.db.write() as cursor:
+            cursor.execute(INSERT_EVENT, event_row(index))
+    return {'write': write, 'read': lambda: pooled_read(monitoring), 'close': monitoring.close}
+
+
+def write_behind_backend(monitoring):
+    enqueue_us = []
+
+    def write(index):
+        event_type, severity, client_id, description, raw_data = event_row(index)
+        start = time.perf_counter()
+        monitoring.record_security_event(event_type, severity, client_id, description, raw_data)
+        enqueue_us.append((time.perf_counter() - start) * 1e6)
+
+    def extra():
+        stats = monitoring.get_ingestion_stats()
+        return {
+            'enqueue_p99_us': round(percentile(enqueue_us, 0.99), 2),
+            'batches': stats['batches'],
+            'flush_ms_p95': stats['flush_ms_p95'],
+            'flush_ms_max': stats['flush_ms_max'],
+            'backpressure_waits': stats['backpressure_waits'],
+        }
+    return {'write': write, 'read': lambda: pooled_read(monitoring), 'finish': monitoring.ingest.flush,
+            'close': monitoring.close, 'extra': extra}
+
+
+def pooled_read(monitoring):
+    with monitoring.db.read() as cursor:
+        cursor.execute(REPORT_QUERY, ('1970-01-01',)).fetchall()
+
+
+def event_row(index):
+    severity = ('info', 'low', 'medium', 'high', 'critical')[index % 5]
+    return ('fake_xml_detected', severity, f'client_{index % 50:03d}', f'Fake XML #{index} blocked',
+            json.dumps({'file': f'C:/HTKK/{index}.xml', 'mst': '0101234567'}))
+
+
+def run_case(backend, events, threads, with_reader):
+    """Ghi ``events`` event bằng ``threads`` thread; trả về events/s và độ trễ đọc."""
+    write, read = backend['write'], backend['read']
+    read_latencies = []
+    stop = threading.Event()
+
+    def writer(offset):
+        for index in range(offset, events, threads):
+            write(index)
+
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            read()
+            read_latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    reader_thread = threading.Thread(target=reader, daemon=True) if with_reader else None
+    if reader_thread:
+        reader_thread.start()
+    workers = [threading.Thread(target=writer, args=(offset,)) for offset in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if 'finish' in backend:
+        backend['finish']()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if reader_thread:
+        reader_thread.join()
+    result = {
+        'elapsed_s': round(elapsed, 3),
+        'events_per_s': round(events / elapsed, 1),
+        'reads': len(read_latencies),
+        'read_p50_ms': round(statistics.median(read_latencies), 3) if read_latencies else None,
+        'read_p95_ms': round(percentile(read_latencies, 0.95), 3) if read_latencies else None,
+    }
+    if 'extra' in backend:
+        result.update(backend['extra']())
+    return result
+
+
+def run_benchmark(args):
+    sandbox = tempfile.mkdtemp(prefix='xmlprot_monitoring_', dir=args.workdir)
+    os.environ['APPDATA'] = sandbox
+    add_src_to_path()
+    from monitoring_system import AdvancedMonitoringSystem
+
+    results = {'config': {'events': args.events, 'threads': args.threads, 'reader': args.reader,
+                          'workdir': args.workdir or tempfile.gettempdir()}}
+    try:
+        for threads in args.threads:
+            for mode in MODES:
+                case_dir = os.path.join(sandbox, f'{mode}_{threads}')
+                os.makedirs(case_dir)
+                if mode == 'legacy':
+                    db_file = os.path.join(case_dir, 'monitoring.db')
+                    conn = sqlite3.connect(db_file)
+                    AdvancedMonitoringSystem.create_tables(conn.cursor())
+                    conn.commit()
+                    conn.close()
+                    backend = legacy_backend(db_file)
+                else:
+                    os.environ['APPDATA'] = case_dir
+                    monitoring = AdvancedMonitoringSystem()
+                    # Chỉ đo đường ghi DB, không đo log ra console/file
+                    logging.disable(logging.CRITICAL)
+                    backend = (wal_sync_backend if mode == 'wal_sync' else write_behind_backend)(monitoring)
+                try:
+                    results[f'{mode}_threads_{threads}'] = run_case(backend, args.events, threads, args.reader)
+                finally:
+                    backend.get('close', lambda: None)()
+                    logging.disable(logging.NOTSET)
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ghi monitoring DB: connection mỗi lần gọi vs WAL vs write-behind")
+    parser.add_argument('--events', type=int, default=20000, help="Số security event mỗi lần đo")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4], help="Số thread ghi")
+    parser.add_argument('--no-reader', dest='reader', action='store_false', help="Không chạy thread đọc song song")
+    parser.add_argument('--workdir', default=None, help="Thư mục DB (mặc định thư mục tạm trên đĩa, để đo cả fsync)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('monitoring_insert', results, args.output, args.label)
+
+    print(f"🗄️ Monitoring DB insert benchmark ({args.events} event)")
+    print(f"   {'chế độ':12s} {'threads':>8s} {'event/s':>10s} {'đọc p50 ms':>11s} {'đọc p95 ms':>11s}")
+    for threads in args.threads:
+        for mode in MODES:
+            row = results[f'{mode}_threads_{threads}']
+            print(f"   {mode:12s} {threads:>8d} {row['events_per_s']:>10.1f} "
+                  f"{row['read_p50_ms'] if row['read_p50_ms'] is not None else '-':>11} "
+                  f"{row['read_p95_ms'] if row['read_p95_ms'] is not None else '-':>11}")
+        row = results[f'write_behind_threads_{threads}']
+        print(f"   {'':10s} write_behind: enqueue p99 {row['enqueue_p99_us']} µs, {row['batches']} lô, "
+              f"flush p95 {row['flush_ms_p95']} ms, max {row['flush_ms_max']} ms")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monitoring query benchmark
+Sinh monitoring.db giả lập (mặc định 10 triệu security event trải trên 90 ngày),
+đo độ trễ các truy vấn dashboard/báo cáo trước migration (không index,
+event_type LIKE '%xml%') và sau migration (index + event_category, truy vấn của
+monitoring_queries), kèm EXPLAIN QUERY PLAN.
+
+Ví dụ:
+    python benchmarks/bench_monitoring_queries.py --rows 10000000 --runs 5
+"""
+
+import os
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import statistics
+
+from bench_common import add_src_to_path, write_results, compare_results
+
+# Truy vấn trước migration (như trong monitoring_system cũ) -> khung thời gian (giây)
+LEGACY_QUERIES = {
+    'recent_performance': ('''
+        SELECT timestamp, cpu_percent, memory_percent, disk_usage, active_connections
+        FROM performance_stats WHERE timestamp > ? ORDER BY timestamp DESC LIMIT 100
+    ''', 3600),
+    'severity_counts': ('''
+        SELECT COUNT(*) as count, severity FROM security_events WHERE timestamp > ? GROUP BY severity
+    ''', 3600),
+    'category_count': ('''
+        SELECT COUNT(*) as xml_events FROM security_events WHERE timestamp > ? AND event_type LIKE '%xml%'
+    ''', 3600),
+    'event_overview': ('''
+        SELECT COUNT(*) as total_events, COUNT(DISTINCT client_id) as unique_clients
+        FROM security_events WHERE timestamp > ?
+    ''', 30 * 86400),
+    'top_event_types': ('''
+        SELECT event_type, COUNT(*) as count FROM security_events WHERE timestamp > ?
+        GROUP BY event_type ORDER BY count DESC LIMIT 10
+    ''', 30 * 86400),
+    'performance_summary': ('''
+        SELECT AVG(cpu_percent), AVG(memory_percent), AVG(disk_usage), MAX(active_connections)
+        FROM performance_stats WHERE timestamp > ?
+    ''', 30 * 86400),
+}
+
+EVENT_TYPES = (
+    ('fake_xml_detected', 30), ('template_overwrite', 25), ('xml_restore_failed', 3), ('admin_login', 10),
+    ('auto_update_download', 5), ('auto_update_error', 1), ('config_changed', 4), ('remote_command', 12),
+    ('file_access_denied', 10),
+)
+SEVERITIES = (('info', 60), ('low', 20), ('medium', 12), ('high', 6), ('critical', 2))
+
+
+def timestamp_at(epoch):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+
+
+def generate_events(rows, days, seed):
+    """Security event theo thứ tự thời gian (như khi được ghi thật)."""
+    rng = random.Random(seed)
+    types = [name for name, weight in EVENT_TYPES for _ in range(weight)]
+    severities = [name for name, weight in SEVERITIES for _ in range(weight)]
+    start = time.time() - days * 86400
+    step = days * 86400 / rows
+    for index in range(rows):
+        yield (timestamp_at(start + index * step), rng.choice(types), rng.choice(severities),
+               f'client_{rng.randrange(500):03d}', f'event #{index}')
+
+
+def generate_performance(rows, days, seed):
+    rng = random.Random(seed + 1)
+    start = time.time() - days * 86400
+    step = days * 86400 / rows
+    for index in range(rows):
+        yield (timestamp_at(start + index * step), rng.uniform(0, 100), rng.uniform(20, 90),
+               rng.uniform(30, 80), '{}', rng.randrange(20), 0)
+
+
+def build_database(db_file, args):
+    from monitoring_system import AdvancedMonitoringSystem
+
+    conn = sqlite3.connect(db_file)
+    # Như MonitoringDatabase với DB mới
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    AdvancedMonitoringSystem.create_tables(conn.cursor())
+    started = time.perf_counter()
+    events = generate_events(args.rows, args.days, args.seed)
+    while True:
+        chunk = [row for _, row in zip(range(100000), events)]
+        if not chunk:
+            break
+        conn.executemany('INSERT INTO security_events (timestamp, event_type, severity, client_id, description) '
+                         'VALUES (?, ?, ?, ?, ?)', chunk)
+        conn.commit()
+    # performance_stats: một mẫu mỗi 30 giây như vòng monitoring
+    perf_rows = args.days * 86400 // 30
+    conn.executemany('INSERT INTO performance_stats (timestamp, cpu_percent, memory_percent, disk_usage, '
+                     'network_io, active_connections, xml_files_processed) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     generate_performance(perf_rows, args.days, args.seed))
+    conn.commit()
+    build_s = time.perf_counter() - started
+    conn.close()
+    return {'security_events': args.rows, 'performance_stats': perf_rows, 'build_s': round(build_s, 1)}
+
+
+def timed(cursor, sql, params, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        cursor.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def run_benchmark(args):
+    sandbox = tempfile.mkdtemp(prefix='xmlprot_queries_', dir=args.workdir)
+    os.environ['APPDATA'] = sandbox
+    add_src_to_path()
+    import monitoring_queries
+
+    db_file = os.path.join(sandbox, 'monitoring.db')
+    try:
+        results = {'config': {'rows': args.rows, 'days': args.days, 'runs': args.runs},
+                   'dataset': build_database(db_file, args)}
+        conn = sqlite3.connect(db_file)
+        cursor = conn.cursor()
+        before = {}
+        for name, (sql, window) in LEGACY_QUERIES.items():
+            before[name] = timed(cursor, sql, (monitoring_queries.since(window),), args.runs)
+
+        started = time.perf_counter()
+        cursor.execute('BEGIN')
+        monitoring_queries.migrate(cursor)
+        conn.commit()
+        results['migration_s'] = round(time.perf_counter() - started, 2)
+        results['db_mb'] = round(os.path.getsize(db_file) / 1024 / 1024, 1)
+
+        plans = monitoring_queries.check_query_plans(cursor)
+        for name, (_, window) in LEGACY_QUERIES.items():
+            params = (monitoring_queries.since(window),)
+            if name == 'category_count':
+                params = ('xml',) + params
+            after = timed(cursor, monitoring_queries.QUERIES[name][0], params, args.runs)
+            results[name] = {
+                'before_ms': before[name],
+                'after_ms': after,
+                'speedup': round(before[name] / after, 1) if after else None,
+                'plan_ok': plans[name]['ok'],
+                'plan': plans[name]['plan'],
+            }
+        conn.close()
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark truy vấn monitoring trước/sau index + event_category")
+    parser.add_argument('--rows', type=int, default=10_000_000, help="Số security event giả lập")
+    parser.add_argument('--days', type=int, default=90, help="Khoảng thời gian dữ liệu trải ra (ngày)")
+    parser.add_argument('--runs', type=int, default=5, help="Số lần chạy mỗi truy vấn, lấy median")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workdir', default=None, help="Thư mục tạo DB (cần vài GB cho 10 triệu dòng)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('monitoring_queries', results, args.output, args.label)
+
+    dataset = results['dataset']
+    print(f"🔎 Monitoring query benchmark ({dataset['security_events']:,} event, "
+          f"{dataset['performance_stats']:,} mẫu hiệu năng, DB {results['db_mb']} MB)")
+    print(f"   Tạo dữ liệu {dataset['build_s']} s, migration {results['migration_s']} s")
+    print(f"   {'truy vấn':22s} {'trước ms':>10s} {'sau ms':>10s} {'speedup':>9s}  plan")
+    for name in LEGACY_QUERIES:
+        row = results[name]
+        print(f"   {name:22s} {row['before_ms']:>10.2f} {row['after_ms']:>10.2f} {row['speedup'] or 0:>8.1f}x  "
+              f"{'✅' if row['plan_ok'] else '⚠️'} {' | '.join(row['plan'])}")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
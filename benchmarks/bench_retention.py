@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monitoring retention benchmark
+So sánh cách dọn dữ liệu cũ kiểu cũ (một transaction DELETE trên cả bốn bảng
+thô) với RetentionScheduler (xóa theo đoạn keyset + incremental vacuum) trên
+cùng một monitoring.db giả lập, trong khi một thread ghi thăm dò liên tục đo độ
+trễ ghi (chờ lock + commit).
+
+Ví dụ:
+    python benchmarks/bench_retention.py --rows 2000000 --days 30 --keep-days 7
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+import statistics
+
+from bench_common import add_src_to_path, write_results, compare_results, percentile
+from bench_monitoring_queries import build_database
+
+RAW_TABLES = ('system_metrics', 'performance_stats', 'security_events', 'update_logs')
+MODES = ('single_transaction', 'chunked')
+PROBE_INSERT = '''
+    INSERT INTO system_metrics (metric_type, metric_name, metric_value, client_id, additional_data)
+    VALUES ('probe', 'write_latency', 0, NULL, NULL)
+'''
+
+
+def run_mode(mode, db_file, args):
+    from monitoring_db import MonitoringDatabase, RetentionScheduler
+    import monitoring_queries
+
+    db = MonitoringDatabase(db_file)
+    cutoff = monitoring_queries.since(args.keep_days * 86400)
+    size_before = os.path.getsize(db_file)
+    latencies = []
+    stop = threading.Event()
+
+    def probe():
+        while not stop.is_set():
+            start = time.perf_counter()
+            with db.write() as cursor:
+                cursor.execute(PROBE_INSERT)
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.005)
+
+    prober = threading.Thread(target=probe, daemon=True)
+    prober.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    if mode == 'single_transaction':
+        # Như cleanup_old_data cũ: một transaction, giữ lock ghi đến khi xóa xong
+        with db.write() as cursor:
+            lock_started = time.perf_counter()
+            purged = 0
+            for table in RAW_TABLES:
+                cursor.execute(f'DELETE FROM {table} WHERE timestamp < ?', (cutoff,))
+                purged += cursor.rowcount
+        lock_ms_max = (time.perf_counter() - lock_started) * 1000
+        pages_freed = 0
+    else:
+        scheduler = RetentionScheduler(db, lambda: [(table, 'timestamp', cutoff) for table in RAW_TABLES],
+                                       chunk_rows=args.chunk_rows, pause=args.pause)
+        run = scheduler.run_once()
+        purged, lock_ms_max, pages_freed = run['rows_purged'], run['lock_ms_max'], run['pages_freed']
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    db.checkpoint('TRUNCATE')
+    db.close()
+    return {
+        'rows_purged': purged,
+        'elapsed_s': round(elapsed, 3),
+        'lock_ms_max': round(lock_ms_max, 3),
+        'pages_freed': pages_freed,
+        'probe_writes': len(latencies),
+        'probe_p50_ms': round(statistics.median(latencies), 3),
+        'probe_p99_ms': round(percentile(latencies, 0.99), 3),
+        'probe_max_ms': round(max(latencies), 3),
+        'db_mb_before': round(size_before / 1024 / 1024, 1),
+        'db_mb_after': round(os.path.getsize(db_file) / 1024 / 1024, 1),
+    }
+
+
+def run_benchmark(args):
+    sandbox = tempfile.mkdtemp(prefix='xmlprot_retention_', dir=args.workdir)
+    os.environ['APPDATA'] = sandbox
+    add_src_to_path()
+    import monitoring_queries
+
+    template = os.path.join(sandbox, 'template.db')
+    try:
+        results = {'config': {'rows': args.rows, 'days': args.days, 'keep_days': args.keep_days,
+                              'chunk_rows': args.chunk_rows, 'pause': args.pause},
+                   'dataset': build_database(template, args)}
+        conn = sqlite3.connect(template)
+        conn.execute('BEGIN')
+        monitoring_queries.migrate(conn.cursor())
+        conn.commit()
+        conn.close()
+        for mode in MODES:
+            db_file = os.path.join(sandbox, f'{mode}.db')
+            shutil.copyfile(template, db_file)
+            results[mode] = run_mode(mode, db_file, args)
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retention: một transaction DELETE vs xóa theo đoạn")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Số security event giả lập")
+    parser.add_argument('--days', type=int, default=30, help="Khoảng thời gian dữ liệu trải ra (ngày)")
+    parser.add_argument('--keep-days', type=int, default=7, help="Số ngày dữ liệu thô được giữ")
+    parser.add_argument('--chunk-rows', type=int, default=2000, help="Số dòng mỗi đoạn xóa")
+    parser.add_argument('--pause', type=float, default=0.05, help="Thời gian nghỉ giữa các đoạn (giây)")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workdir', default=None, help="Thư mục tạo DB")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('retention', results, args.output, args.label)
+
+    print(f"🧹 Retention benchmark ({args.rows:,} event / {args.days} ngày, giữ {args.keep_days} ngày)")
+    print(f"   {'chế độ':20s} {'dòng xóa':>10s} {'giây':>8s} {'lock max ms':>12s} {'ghi p99 ms':>11s} "
+          f"{'ghi max ms':>11s} {'DB MB':>13s}")
+    for mode in MODES:
+        row = results[mode]
+        print(f"   {mode:20s} {row['rows_purged']:>10,} {row['elapsed_s']:>8.2f} {row['lock_ms_max']:>12.2f} "
+              f"{row['probe_p99_ms']:>11.2f} {row['probe_max_ms']:>11.2f} "
+              f"{row['db_mb_before']:>6} -> {row['db_mb_after']:<6}")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
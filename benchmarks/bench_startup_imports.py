@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup import benchmark
+Đo thời gian import xml_protector_runtime bằng ``python -X importtime`` (process mới
+mỗi lần) và liệt kê các module tốn thời gian nhất, có thể so với một git ref cũ.
+Đo thêm đường khởi động thật của main() sau import: tạo XMLProtectorRuntime và
+start_metrics_exporter() (mặc định bật), kèm các module nặng và thread đã có.
+
+Ví dụ:
+    python benchmarks/bench_startup_imports.py --runs 10
+    python benchmarks/bench_startup_imports.py --ref HEAD~1 --top 15
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+from bench_common import REPO_DIR, SRC_DIR, write_results, compare_results
+
+MODULE = 'xml_protector_runtime'
+# Module nặng không nên được nạp lúc boot
+HEAVY_MODULES = ('monitoring_system', 'psutil', 'requests', 'sqlite3', 'cryptography')
+
+# Đường khởi động của main() (bỏ watchdog observer): in JSON thời gian + module + thread
+SERVICES_PROBE = r'''
+import sys, json, time, threading
+import xml_protector_runtime as runtime
+start = time.perf_counter()
+protector = runtime.XMLProtectorRuntime()
+created = time.perf_counter()
+protector.start_metrics_exporter()
+exporter = time.perf_counter()
+print(json.dumps({'runtime_init_ms': (created - start) * 1000, 'metrics_exporter_ms': (exporter - created) * 1000,
+                  'heavy_modules': [name for name in HEAVY if name in sys.modules],
+                  'threads': threading.active_count()}))
+protector.metrics_exporter.stop_event.set()
+'''
+
+
+def parse_importtime(stderr):
+    """Parse output ``-X importtime`` -> {module: (self_us, cumulative_us)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return modules
+
+
+def measure_once(src_dir, appdata):
+    env = dict(os.environ, APPDATA=str(appdata), PYTHONDONTWRITEBYTECODE='')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {MODULE}'],
+                            cwd=src_dir, env=env, capture_output=True, text=True, timeout=120)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Import {MODULE} thất bại:\n{result.stderr[-2000:]}")
+    return wall_ms, parse_importtime(result.stderr)
+
+
+def measure_services_once(src_dir, appdata):
+    code = SERVICES_PROBE.replace('HEAVY', repr(HEAVY_MODULES))
+    env = dict(os.environ, APPDATA=str(appdata), XML_PROTECTOR_CONTROL='0')
+    result = subprocess.run([sys.executable, '-c', code], cwd=src_dir, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"Khởi động runtime thất bại:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_services(src_dir, runs):
+    appdata = Path(tempfile.mkdtemp(prefix='xmlprot_services_'))
+    try:
+        samples = [measure_services_once(src_dir, appdata) for _ in range(runs)]
+    finally:
+        shutil.rmtree(appdata, ignore_errors=True)
+    return {
+        'runtime_init_ms': round(statistics.median(s['runtime_init_ms'] for s in samples), 2),
+        'metrics_exporter_ms': round(statistics.median(s['metrics_exporter_ms'] for s in samples), 2),
+        'heavy_modules': samples[-1]['heavy_modules'],
+        'threads': samples[-1]['threads'],
+    }
+
+
+def measure(src_dir, runs):
+    """Chạy ``runs`` lần (lần đầu để warm cache .pyc), trả về median."""
+    appdata = Path(tempfile.mkdtemp(prefix='xmlprot_import_'))
+    try:
+        measure_once(src_dir, appdata)
+        samples = [measure_once(src_dir, appdata) for _ in range(runs)]
+    finally:
+        shutil.rmtree(appdata, ignore_errors=True)
+
+    walls = [wall for wall, _ in samples]
+    cumulative = {}
+    for _, modules in samples:
+        for name, (self_us, cum_us) in modules.items():
+            cumulative.setdefault(name, []).append((self_us, cum_us))
+    per_module = {name: (statistics.median(s for s, _ in values), statistics.median(c for _, c in values))
+                  for name, values in cumulative.items()}
+    return {
+        'wall_ms_median': round(statistics.median(walls), 1),
+        'wall_ms_min': round(min(walls), 1),
+        'import_ms': round(per_module.get(MODULE, (0, 0))[1] / 1000, 1),
+        'modules_loaded': round(statistics.median(len(modules) for _, modules in samples)),
+    }, per_module
+
+
+def top_level_costs(per_module, top):
+    """Chi phí cumulative của các package top-level (requests, cryptography, ...)."""
+    packages = {}
+    for name, (self_us, _) in per_module.items():
+        root = name.split('.')[0]
+        packages[root] = packages.get(root, 0) + self_us
+    ordered = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {name: round(us / 1000, 2) for name, us in ordered}
+
+
+def export_ref(ref, target):
+    """Xuất src/ của một git ref ra thư mục tạm để đo baseline."""
+    archive = target / 'src.tar'
+    subprocess.run(['git', 'archive', '--format=tar', '-o', str(archive), ref, 'src'],
+                   cwd=REPO_DIR, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return target / 'src'
+
+
+def print_report(title, summary, packages):
+    print(f"⏱️ {title}")
+    print(f"   import {MODULE}: {summary['import_ms']} ms | process: {summary['wall_ms_median']} ms "
+          f"(min {summary['wall_ms_min']}) | {summary['modules_loaded']} module")
+    services = summary['services']
+    print(f"   XMLProtectorRuntime(): {services['runtime_init_ms']} ms | start_metrics_exporter(): "
+          f"{services['metrics_exporter_ms']} ms | {services['threads']} thread | "
+          f"module nặng: {', '.join(services['heavy_modules']) or 'không'}")
+    for name, ms in packages.items():
+        print(f"     {name:30s} {ms:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark thời gian import lúc khởi động runtime")
+    parser.add_argument('--runs', type=int, default=7, help="Số lần đo (process mới mỗi lần)")
+    parser.add_argument('--top', type=int, default=12, help="Số package tốn thời gian nhất để in ra")
+    parser.add_argument('--ref', default=None, help="Git ref để đo baseline (vd: HEAD~1)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    summary, per_module = measure(SRC_DIR, args.runs)
+    summary['services'] = measure_services(SRC_DIR, args.runs)
+    packages = top_level_costs(per_module, args.top)
+    results = {'current': summary, 'top_packages_ms': packages}
+    print_report('Startup imports (worktree)', summary, packages)
+
+    if args.ref:
+        workdir = Path(tempfile.mkdtemp(prefix='xmlprot_ref_'))
+        try:
+            ref_src = export_ref(args.ref, workdir)
+            ref_summary, ref_modules = measure(ref_src, args.runs)
+            ref_summary['services'] = measure_services(ref_src, args.runs)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        ref_packages = top_level_costs(ref_modules, args.top)
+        results['baseline'] = dict(ref_summary, ref=args.ref)
+        results['baseline_top_packages_ms'] = ref_packages
+        print_report(f'Startup imports ({args.ref})', ref_summary, ref_packages)
+        saved = ref_summary['import_ms'] - summary['import_ms']
+        print(f"   🚀 Giảm {saved:.1f} ms import ({saved / ref_summary['import_ms'] * 100:.0f}%)"
+              if ref_summary['import_ms'] else "")
+
+    output = write_results('startup_imports', results, args.output, args.label)
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stream encryption benchmark
+Throughput (MB/s) và bộ nhớ đỉnh của mã hóa chunk AES-GCM (secure_stream) so với
+đường Fernet + base64 hiện tại của SecurityManager.encrypt_config, cùng độ trễ đọc
+ngẫu nhiên một vùng nhỏ trong file mã hóa.
+
+Ví dụ:
+    python benchmarks/bench_stream_crypto.py --sizes 1 16 64 --chunk-kb 1024
+"""
+
+import os
+import time
+import base64
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from bench_common import add_src_to_path, tmpfs_dir, write_results, compare_results, percentile
+
+
+def measure(func):
+    """Chạy func, trả về (giây, bộ nhớ Python đỉnh MB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def write_random_file(path, size_mb):
+    block = os.urandom(1024 * 1024)
+    with open(path, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def run_benchmark(args):
+    add_src_to_path()
+    import secure_stream
+    from cryptography.fernet import Fernet
+
+    workdir = Path(tempfile.mkdtemp(prefix='xmlprot_stream_', dir=args.workdir or tmpfs_dir()))
+    master_key = os.urandom(32)
+    fernet = Fernet(base64.urlsafe_b64encode(master_key))
+    chunk_size = args.chunk_kb * 1024
+    rng = random.Random(args.seed)
+    results = {'config': {'chunk_kb': args.chunk_kb, 'sizes_mb': args.sizes, 'workdir': str(workdir.parent)}}
+    try:
+        for size_mb in args.sizes:
+            plain = workdir / f'plain_{size_mb}.bin'
+            encrypted = workdir / f'plain_{size_mb}.xpenc'
+            restored = workdir / f'restored_{size_mb}.bin'
+            write_random_file(plain, size_mb)
+
+            enc_s, enc_peak = measure(lambda: secure_stream.encrypt_file(master_key, plain, encrypted, chunk_size))
+            dec_s, dec_peak = measure(lambda: secure_stream.decrypt_file(master_key, encrypted, restored))
+
+            def fernet_encrypt():
+                # Giống encrypt_config: Fernet trong RAM rồi base64 thêm một lần
+                data = plain.read_bytes()
+                (workdir / 'fernet.enc').write_bytes(base64.urlsafe_b64encode(fernet.encrypt(data)))
+
+            def fernet_decrypt():
+                token = base64.urlsafe_b64decode((workdir / 'fernet.enc').read_bytes())
+                (workdir / 'fernet.out').write_bytes(fernet.decrypt(token))
+
+            fenc_s, fenc_peak = measure(fernet_encrypt)
+            fdec_s, fdec_peak = measure(fernet_decrypt)
+
+            with secure_stream.EncryptedFileReader(master_key, encrypted) as reader:
+                latencies = []
+                for _ in range(args.random_reads):
+                    offset = rng.randrange(0, max(1, reader.size - 4096))
+                    start = time.perf_counter()
+                    reader.read(offset, 4096)
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+            results[f'{size_mb}MB'] = {
+                'stream': {
+                    'encrypt_mb_s': round(size_mb / enc_s, 1),
+                    'decrypt_mb_s': round(size_mb / dec_s, 1),
+                    'encrypt_peak_mb': round(enc_peak, 2),
+                    'decrypt_peak_mb': round(dec_peak, 2),
+                    'size_overhead_pct': round((encrypted.stat().st_size / plain.stat().st_size - 1) * 100, 3),
+                },
+                'fernet': {
+                    'encrypt_mb_s': round(size_mb / fenc_s, 1),
+                    'decrypt_mb_s': round(size_mb / fdec_s, 1),
+                    'encrypt_peak_mb': round(fenc_peak, 2),
+                    'decrypt_peak_mb': round(fdec_peak, 2),
+                    'size_overhead_pct': round(((workdir / 'fernet.enc').stat().st_size / plain.stat().st_size - 1) * 100, 3),
+                },
+                'random_read_4k_ms': {
+                    'p50': round(percentile(latencies, 0.50), 3),
+                    'p99': round(percentile(latencies, 0.99), 3),
+                },
+            }
+            for path in workdir.iterdir():
+                path.unlink()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mã hóa chunk AES-GCM so với Fernet")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 64], help="Kích thước file (MB)")
+    parser.add_argument('--chunk-kb', type=int, default=1024, help="Kích thước chunk (KB)")
+    parser.add_argument('--random-reads', type=int, default=200, help="Số lần đọc ngẫu nhiên 4 KB")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workdir', default=None, help="Thư mục làm việc (mặc định tmpfs nếu có)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('stream_crypto', results, args.output, args.label)
+
+    print(f"🔒 Stream encryption benchmark (chunk {args.chunk_kb} KB)")
+    print(f"   {'size':>6s} {'':8s} {'enc MB/s':>10s} {'dec MB/s':>10s} {'peak enc MB':>12s} {'peak dec MB':>12s}")
+    for size_mb in args.sizes:
+        row = results[f'{size_mb}MB']
+        for name in ('stream', 'fernet'):
+            r = row[name]
+            print(f"   {size_mb:>4d}MB {name:8s} {r['encrypt_mb_s']:>10.1f} {r['decrypt_mb_s']:>10.1f} "
+                  f"{r['encrypt_peak_mb']:>12.2f} {r['decrypt_peak_mb']:>12.2f}")
+        print(f"   {'':6s} đọc ngẫu nhiên 4 KB: p50 {row['random_read_4k_ms']['p50']} ms, "
+              f"p99 {row['random_read_4k_ms']['p99']} ms")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
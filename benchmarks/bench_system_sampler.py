@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+System sampler benchmark
+Chi phí mỗi tick thu thập system metrics: cách cũ (cpu_percent(interval=1) +
+process_iter trên mọi process) so với SystemSampler (CPU theo delta, cache PID,
+chỉ đọc process mới). Sinh thêm process con cho đủ --processes process trên
+máy (một phần mang tên chứa "xml"), mỗi tick thay --churn process để có PID
+xuất hiện/thoát như thực tế.
+
+Ví dụ:
+    python benchmarks/bench_system_sampler.py --processes 500 --ticks 50
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+from bench_common import add_src_to_path, write_results, compare_results, percentile
+
+
+def legacy_sample(psutil, block):
+    """collect_system_metrics trước đây (block=False: bỏ phần ngủ 1 giây, chỉ đo phần quét)."""
+    cpu_percent = psutil.cpu_percent(interval=1 if block else None)
+    psutil.virtual_memory()
+    psutil.disk_usage(os.path.abspath(os.sep))
+    psutil.net_io_counters()
+    xml_processes = []
+    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+        try:
+            if 'xml' in proc.info['name'].lower() or 'protector' in proc.info['name'].lower():
+                xml_processes.append(proc.info)
+        except Exception:
+            continue
+    return cpu_percent, len(xml_processes)
+
+
+class ProcessFarm:
+    """Các process con ngủ dài; tên process lấy theo tên file thực thi (symlink)."""
+
+    def __init__(self, workdir, xml_every):
+        self.children = []
+        self.spawned = 0
+        self.xml_every = xml_every
+        self.commands = {}
+        sleeper = shutil.which('sleep')
+        for name in ('idle_worker', 'xml_worker'):
+            path = os.path.join(workdir, name)
+            if sleeper:
+                os.symlink(sleeper, path)
+                self.commands[name] = [path, '3600']
+            else:
+                self.commands[name] = [sys.executable, '-c', 'import time; time.sleep(3600)']
+
+    def spawn(self, count):
+        for _ in range(count):
+            name = 'xml_worker' if self.spawned % self.xml_every == 0 else 'idle_worker'
+            self.children.append(subprocess.Popen(self.commands[name]))
+            self.spawned += 1
+
+    def churn(self, count):
+        for proc in self.children[:count]:
+            proc.kill()
+            proc.wait()
+        del self.children[:count]
+        self.spawn(count)
+
+    def close(self):
+        for proc in self.children:
+            proc.kill()
+            proc.wait()
+
+
+def summary(samples):
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def run_benchmark(args):
+    add_src_to_path()
+    import psutil
+    from monitoring_system import SystemSampler
+
+    workdir = tempfile.mkdtemp(prefix='xmlprot_sampler_')
+    farm = ProcessFarm(workdir, args.xml_every)
+    try:
+        farm.spawn(max(0, args.processes - len(psutil.pids())))
+        time.sleep(0.5)
+        results = {'config': {'processes': len(psutil.pids()), 'ticks': args.ticks, 'churn': args.churn}}
+
+        sampler = SystemSampler()
+        legacy, sampled = [], []
+        for _ in range(args.ticks):
+            farm.churn(args.churn)
+            start = time.perf_counter()
+            legacy_sample(psutil, block=False)
+            legacy.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            sample = sampler.sample()
+            sampled.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        legacy_sample(psutil, block=True)
+        results['legacy_blocking_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        results['legacy_scan'] = summary(legacy)
+        results['sampler'] = summary(sampled)
+        results['sampler'].update(tracked=len(sample['processes']), **{
+            key: value for key, value in sampler.stats().items() if key in ('rescans', 'processes_inspected')})
+    finally:
+        farm.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lấy mẫu system metrics: cũ vs SystemSampler")
+    parser.add_argument('--processes', type=int, default=500, help="Tổng số process trên máy khi đo")
+    parser.add_argument('--ticks', type=int, default=50, help="Số tick đo")
+    parser.add_argument('--churn', type=int, default=5, help="Số process thay mới trước mỗi tick")
+    parser.add_argument('--xml-every', type=int, default=25, help="Cứ N process con thì một process tên xml_worker")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('system_sampler', results, args.output, args.label)
+
+    print(f"🖥️ System sampler benchmark ({results['config']['processes']} process, {args.ticks} tick, "
+          f"thay {args.churn} process mỗi tick)")
+    print(f"   Cách cũ gồm cpu_percent(interval=1): {results['legacy_blocking_ms']:.1f} ms mỗi tick")
+    print(f"   {'cách đo':14s} {'p50 ms':>9s} {'p95 ms':>9s} {'max ms':>9s}")
+    for name in ('legacy_scan', 'sampler'):
+        row = results[name]
+        print(f"   {name:14s} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['max_ms']:>9.2f}")
+    row = results['sampler']
+    print(f"   SystemSampler: theo dõi {row['tracked']} process, {row['rescans']} lần có PID mới/thoát, "
+          f"đọc tên {row['processes_inspected']} process")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Template bundle benchmark
+So sánh thời gian khởi động XMLProtectorRuntime và RSS giữa thư mục template rời
+(glob + parse từng file) và template bundle .xpb (chỉ nạp index), cùng độ trễ
+lần đầu giải mã một template khi cần khôi phục.
+
+Ví dụ:
+    python benchmarks/bench_template_bundle.py --templates 500 --runs 5
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+from bench_common import SRC_DIR, add_src_to_path, tmpfs_dir, write_results, compare_results
+import htkk_corpus
+
+# Chạy trong process mới: đo khởi động runtime, RSS và lần đọc template đầu tiên
+PROBE = r'''
+import json, time, logging, psutil
+logging.disable(logging.WARNING)
+import xml_protector_runtime as runtime
+process = psutil.Process()
+rss_before = process.memory_info().rss
+start = time.perf_counter()
+protector = runtime.XMLProtectorRuntime()
+boot_ms = (time.perf_counter() - start) * 1000
+rss_after = process.memory_info().rss
+template = next(iter(protector.templates.values()))
+start = time.perf_counter()
+protector.template_bytes(template)
+first_read_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({'boot_ms': boot_ms, 'templates': len(protector.template_index.by_file),
+                  'rss_mb': rss_after / 1024 / 1024, 'rss_delta_mb': (rss_after - rss_before) / 1024 / 1024,
+                  'first_read_ms': first_read_ms, 'source': protector.template_source}))
+'''
+
+
+def probe(workdir, appdata, bundle=None):
+    env = dict(os.environ, APPDATA=str(appdata), PYTHONPATH=str(SRC_DIR))
+    env.pop('XML_PROTECTOR_TEMPLATE_BUNDLE', None)
+    if bundle:
+        env['XML_PROTECTOR_TEMPLATE_BUNDLE'] = str(bundle)
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env,
+                            capture_output=True, text=True, timeout=600)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    return {
+        'boot_ms': round(statistics.median(s['boot_ms'] for s in samples), 1),
+        'rss_mb': round(statistics.median(s['rss_mb'] for s in samples), 1),
+        'rss_delta_mb': round(statistics.median(s['rss_delta_mb'] for s in samples), 2),
+        'first_read_ms': round(statistics.median(s['first_read_ms'] for s in samples), 3),
+        'templates': samples[0]['templates'],
+    }
+
+
+def run_benchmark(args):
+    sandbox = Path(tempfile.mkdtemp(prefix='xmlprot_bundle_', dir=args.workdir or tmpfs_dir()))
+    try:
+        base = htkk_corpus.load_base_declaration()
+        declarations = htkk_corpus.generate_templates(args.templates, seed=args.seed, base=base)
+        loose_dir = sandbox / 'loose'
+        htkk_corpus.write_templates(declarations, loose_dir / 'templates')
+
+        add_src_to_path()
+        import template_bundle
+        bundle_dir = sandbox / 'bundle'
+        bundle_dir.mkdir()
+        bundle_path = bundle_dir / template_bundle.BUNDLE_NAME
+        key = template_bundle.generate_bundle_key() if args.encrypt else None
+        build_stats = template_bundle.build_bundle_from_dir(loose_dir / 'templates', bundle_path, key)
+        if key:
+            # Key đi qua env như khi được cấp bởi deployment (không để file .key cạnh bundle)
+            os.environ['XML_PROTECTOR_BUNDLE_KEY'] = key
+
+        loose, bundle = [], []
+        for _ in range(args.runs):
+            appdata = Path(tempfile.mkdtemp(dir=sandbox))
+            loose.append(probe(loose_dir, appdata))
+            bundle.append(probe(bundle_dir, appdata, bundle_path))
+        return {
+            'config': {'templates': args.templates, 'runs': args.runs, 'encrypted': args.encrypt},
+            'bundle_file': build_stats,
+            'loose_folder': summarize(loose),
+            'bundle': summarize(bundle),
+        }
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark khởi động runtime: thư mục template rời vs bundle")
+    parser.add_argument('--templates', type=int, default=300, help="Số tờ khai gốc")
+    parser.add_argument('--runs', type=int, default=5, help="Số process đo cho mỗi layout")
+    parser.add_argument('--no-encrypt', dest='encrypt', action='store_false', help="Bundle chỉ nén, không mã hóa")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workdir', default=None, help="Thư mục làm việc (mặc định tmpfs nếu có)")
+    parser.add_argument('--output', default=None, help="File JSON kết quả")
+    parser.add_argument('--label', default=None, help="Nhãn phiên bản/cấu hình để so sánh")
+    parser.add_argument('--compare', default=None, help="So sánh với file kết quả trước đó")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    output = write_results('template_bundle', results, args.output, args.label)
+
+    size = results['bundle_file']
+    print(f"📦 Template bundle benchmark ({args.templates} template, median {args.runs} lần)")
+    print(f"   Bundle: {size['raw_bytes']:,} -> {size['bundle_bytes']:,} bytes (index {size['index_bytes']:,})")
+    print(f"   {'':14s} {'boot ms':>10s} {'RSS MB':>10s} {'ΔRSS MB':>10s} {'đọc đầu ms':>11s}")
+    for key, title in (('loose_folder', 'Thư mục rời'), ('bundle', 'Bundle .xpb')):
+        row = results[key]
+        print(f"   {title:14s} {row['boot_ms']:>10.1f} {row['rss_mb']:>10.1f} "
+              f"{row['rss_delta_mb']:>10.2f} {row['first_read_ms']:>11.3f}")
+    print(f"   💾 Kết quả: {output}")
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
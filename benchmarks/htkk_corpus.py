@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic HTKK Corpus
+Sinh tờ khai GTGT HTKK giả lập (dựa trên templates/ETAX*.xml) và XML nhiễu
+"""
+
+import re
+import random
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BASE_TEMPLATE_GLOB = 'ETAX*.xml'
+
+AMOUNT_TAGS = ['ct22', 'ct23', 'ct24', 'ct27', 'ct28', 'ct32', 'ct33', 'ct34', 'ct35', 'ct36', 'ct40', 'ct40a']
+COMPANY_PREFIXES = ['Công ty TNHH', 'Công ty Cổ phần', 'Doanh nghiệp tư nhân', 'Công ty TNHH MTV']
+COMPANY_WORDS = ['Bình Nguyễn', 'Hạ Long', 'Minh Phát', 'Thành Công', 'An Khang', 'Hưng Thịnh',
+                 'Việt Tiến', 'Phú Quý', 'Decor', 'Thương Mại', 'Xây Dựng', 'Dịch Vụ']
+
+
+def load_base_declaration(path=None):
+    """Đọc tờ khai mẫu làm khung cho corpus."""
+    if path is None:
+        path = sorted((REPO_DIR / 'templates').glob(BASE_TEMPLATE_GLOB))[0]
+    return Path(path).read_text(encoding='utf-8')
+
+
+def replace_tag(xml_text, tag, value):
+    """Thay giá trị của mọi thẻ <ns:tag>...</ns:tag>."""
+    pattern = re.compile(rf'(<(?:\w+:)?{tag}>)[^<]*(</(?:\w+:)?{tag}>)')
+    return pattern.sub(lambda m: f"{m.group(1)}{value}{m.group(2)}", xml_text)
+
+
+def random_mst(rng):
+    return ''.join(str(rng.randrange(10)) for _ in range(10))
+
+
+def random_company(rng):
+    return f"{rng.choice(COMPANY_PREFIXES)} {' '.join(rng.sample(COMPANY_WORDS, 2))}"
+
+
+def random_period(rng):
+    return f"{rng.randint(1, 4)}/{rng.randint(2022, 2026)}"
+
+
+def make_declaration(base, mst, company_name, period, amounts, padding=0):
+    """Tạo một tờ khai từ khung mẫu."""
+    xml_text = replace_tag(base, 'mst', mst)
+    xml_text = replace_tag(xml_text, 'tenNNT', company_name)
+    xml_text = replace_tag(xml_text, 'kyKKhai', period)
+    for tag, value in amounts.items():
+        xml_text = replace_tag(xml_text, tag, value)
+    if padding > 0:
+        # Phần đệm nằm trong comment để thay đổi kích thước mà không đổi nội dung tờ khai
+        filler = ''.join(random.Random(len(xml_text)).choices('abcdefghij ', k=padding))
+        closing = xml_text.rstrip().rfind('</')
+        xml_text = f"{xml_text[:closing]}<!-- {filler} -->\n{xml_text[closing:]}"
+    return xml_text
+
+
+def random_amounts(rng):
+    return {tag: rng.randrange(1_000_000, 50_000_000_000) for tag in AMOUNT_TAGS}
+
+
+def generate_templates(count, seed=2025, base=None, max_padding=64 * 1024):
+    """Sinh ``count`` tờ khai gốc với MST, kỳ, số tiền và kích thước khác nhau."""
+    rng = random.Random(seed)
+    base = base or load_base_declaration()
+    declarations = []
+    used_msts = set()
+    for index in range(count):
+        mst = random_mst(rng)
+        while mst in used_msts:
+            mst = random_mst(rng)
+        used_msts.add(mst)
+        declaration = {
+            'name': f"ETAX_SYN_{index:05d}.xml",
+            'mst': mst,
+            'company_name': random_company(rng),
+            'period': random_period(rng),
+            'amounts': random_amounts(rng),
+            'padding': rng.choice([0, 0, 1024, 8 * 1024, max_padding]),
+        }
+        declaration['xml'] = make_declaration(base, declaration['mst'], declaration['company_name'],
+                                              declaration['period'], declaration['amounts'],
+                                              declaration['padding'])
+        declarations.append(declaration)
+    return declarations
+
+
+def make_tampered(declaration, rng, base=None):
+    """Bản giả mạo: cùng MST/tên/kỳ nhưng số tiền bị sửa."""
+    base = base or load_base_declaration()
+    amounts = dict(declaration['amounts'])
+    for tag in rng.sample(AMOUNT_TAGS, 3):
+        amounts[tag] = rng.randrange(1_000_000, 50_000_000_000)
+    return make_declaration(base, declaration['mst'], declaration['company_name'],
+                            declaration['period'], amounts, declaration['padding'])
+
+
+def make_noise_xml(rng, size=None):
+    """XML không liên quan (không có MST) để kiểm tra đường lọc."""
+    size = size or rng.choice([256, 4 * 1024, 32 * 1024])
+    items = []
+    total = 0
+    while total < size:
+        item = f"  <item id=\"{rng.randrange(10**6)}\" value=\"{rng.random():.6f}\">{rng.choice(COMPANY_WORDS)}</item>\n"
+        items.append(item)
+        total += len(item)
+    return f"<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<catalog>\n{''.join(items)}</catalog>\n"
+
+
+def write_templates(declarations, target_dir):
+    """Ghi các tờ khai gốc vào thư mục template."""
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    for declaration in declarations:
+        (target_dir / declaration['name']).write_text(declaration['xml'], encoding='utf-8')
+
+
+if __name__ == '__main__':
+    import sys
+    out_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('synthetic_templates')
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    write_templates(generate_templates(count), out_dir)
+    print(f"✅ Đã sinh {count} tờ khai vào {out_dir}")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Compliance Export
+Xuất toàn bộ security event trong một khung thời gian ra JSON Lines hoặc CSV
+(tùy chọn gzip), đọc theo trang keyset và ghi dần nên bộ nhớ không tăng theo
+số dòng
+"""
+
+import os
+import csv
+import gzip
+import json
+import time
+import logging
+from pathlib import Path
+
+import monitoring_queries
+
+log = logging.getLogger('xml_protector.monitoring')
+
+EXPORT_COLUMNS = ('id', 'timestamp', 'event_type', 'event_category', 'severity', 'client_id', 'source_ip',
+                  'description', 'raw_data')
+EXPORT_FORMATS = ('jsonl', 'csv')
+DEFAULT_PAGE_SIZE = 5000
+# Log tiến độ mỗi N dòng (callback progress vẫn được gọi sau mỗi trang)
+LOG_EVERY_ROWS = 500_000
+
+
+def export_format(path, fmt=None):
+    """(định dạng, có gzip) theo tham số hoặc đuôi file: .jsonl/.ndjson/.csv, thêm .gz để nén."""
+    name = str(path).lower()
+    compressed = name.endswith('.gz')
+    if compressed:
+        name = name[:-3]
+    if fmt is None:
+        fmt = 'csv' if name.endswith('.csv') else 'jsonl'
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Định dạng export không hỗ trợ: {fmt} (chỉ {', '.join(EXPORT_FORMATS)})")
+    return fmt, compressed
+
+
+def open_export(path, compressed):
+    """Mở file export để ghi text; newline='' cho csv.writer tự quản lý xuống dòng."""
+    if compressed:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def jsonl_line(row):
+    record = dict(zip(EXPORT_COLUMNS, row))
+    # raw_data là JSON do record_security_event ghi: nhúng dạng object thay vì chuỗi escape
+    raw = record['raw_data']
+    if raw:
+        try:
+            record['raw_data'] = json.loads(raw)
+        except ValueError:
+            pass
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_security_events(db, output_path, since_time, until_time, fmt=None, page_size=DEFAULT_PAGE_SIZE,
+                           progress=None, total=None):
+    """Ghi security event có since_time <= timestamp <= until_time ra output_path.
+
+    Mỗi trang là một lần mượn connection đọc ngắn (không giữ snapshot suốt
+    lượt export, không chặn checkpoint WAL); dòng ghi thêm trong lúc export
+    vẫn vào đúng vị trí vì trang sau tiếp tục từ khóa (timestamp, id) cuối.
+    Ghi ra file .tmp rồi đổi tên khi xong, nên file đích không bao giờ dở dang.
+    ``progress(stats)`` nhận done/total/rate/ETA sau mỗi trang; ``total`` chỉ
+    là ước lượng (từ rollup) để tính ETA.
+    """
+    output_path = Path(output_path)
+    fmt, compressed = export_format(output_path, fmt)
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    started = time.perf_counter()
+    done = pages = 0
+    last_key = (since_time, 0)
+    next_log = LOG_EVERY_ROWS
+    try:
+        with open_export(tmp_path, compressed) as f:
+            writer = csv.writer(f) if fmt == 'csv' else None
+            if writer:
+                writer.writerow(EXPORT_COLUMNS)
+            while True:
+                with db.read() as cursor:
+                    rows = monitoring_queries.fetch(cursor, 'export_events_page', last_key[0], until_time,
+                                                    last_key[0], last_key[1], page_size)
+                if not rows:
+                    break
+                if writer:
+                    writer.writerows(rows)
+                else:
+                    f.writelines(jsonl_line(row) for row in rows)
+                done += len(rows)
+                pages += 1
+                last_key = (rows[-1][1], rows[-1][0])
+                stats = export_stats(done, total, started)
+                if progress:
+                    progress(stats)
+                if done >= next_log:
+                    next_log += LOG_EVERY_ROWS
+                    log.info(f"📤 Export security events: {done:,} dòng, {stats['rows_per_s']:,}/s")
+                if len(rows) < page_size:
+                    break
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    result = dict(export_stats(done, total, started), path=str(output_path), format=fmt, compressed=compressed,
+                  pages=pages, since=since_time, until=until_time, bytes=output_path.stat().st_size)
+    log.info(f"✅ Đã export {done:,} security event ra {output_path} ({result['bytes']:,} bytes, "
+             f"{result['elapsed_s']}s)")
+    return result
+
+
+def export_stats(done, total, started):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    remaining = max(total - done, 0) if total is not None else None
+    return dict(done=done, total=total, elapsed_s=round(elapsed, 3), rows_per_s=round(rate, 1),
+                eta_s=round(remaining / rate, 1) if remaining is not None and rate else None)
+
+
+# Dòng lệnh:
+#   python compliance_export.py OUTPUT [--days 90] [--format jsonl|csv] [--page-size 5000]
+# OUTPUT: .jsonl / .csv, thêm .gz để nén; dùng monitoring.db trong %APPDATA%/XMLProtectorMonitoring
+if __name__ == '__main__':
+    import argparse
+    from monitoring_db import MonitoringDatabase
+
+    parser = argparse.ArgumentParser(description="Xuất security event cho audit (JSON Lines / CSV, tùy chọn gzip)")
+    parser.add_argument('output')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default=None)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--db', default=None, help="Đường dẫn monitoring.db (mặc định trong APPDATA)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s')
+    db_file = args.db or Path(os.getenv('APPDATA', Path.home())) / 'XMLProtectorMonitoring' / 'monitoring.db'
+    db = MonitoringDatabase(db_file)
+    since_time, until_time = monitoring_queries.since(args.days * 86400), monitoring_queries.since(0)
+    with db.read() as cursor:
+        estimate = monitoring_queries.fetch_rollup(cursor, 'rollup_event_overview', since_time)[0][0]
+
+    def print_progress(stats):
+        print(f"   {stats['done']:,}/{stats['total'] or '?'} | {stats['rows_per_s']:,}/s | ETA {stats['eta_s']}s")
+
+    try:
+        summary = export_security_events(db, args.output, since_time, until_time, fmt=args.format,
+                                         page_size=args.page_size, progress=print_progress, total=estimate)
+    finally:
+        db.close()
+    print(json.dumps(summary, indent=2))
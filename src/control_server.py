@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Control Server
+Endpoint điều khiển & thống kê cục bộ cho runtime đang chạy
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import secrets
+import logging
+import threading
+import socketserver
+from pathlib import Path
+
+CONTROL_PROTOCOL_VERSION = 1
+MAX_REQUEST_BYTES = 64 * 1024
+DEFAULT_APP_DIR = Path(os.getenv('APPDATA', Path.home())) / 'XMLProtectorRuntime'
+
+log = logging.getLogger('xml_protector.control')
+
+
+class ControlRequestHandler(socketserver.StreamRequestHandler):
+    """Xử lý request JSON (mỗi dòng một lệnh) từ client điều khiển."""
+
+    def handle(self):
+        while True:
+            raw = self.rfile.readline(MAX_REQUEST_BYTES)
+            if not raw:
+                break
+            response = self.server.control.handle_raw_request(raw)
+            self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:
+    _ThreadingUnixServer = None
+
+
+class ControlServer:
+    """Server điều khiển runtime qua Unix socket hoặc localhost TCP.
+
+    Mỗi request là một dòng JSON ``{"cmd": ..., "token": ..., ...}``, response
+    cũng là một dòng JSON. Server chạy trong thread riêng nên không chặn
+    pipeline bảo vệ. Địa chỉ và token được ghi vào ``control.json`` trong
+    thư mục ứng dụng để client cục bộ đọc.
+    """
+
+    def __init__(self, protector, app_dir=None, transport=None, port=0):
+        self.protector = protector
+        self.app_dir = Path(app_dir) if app_dir else DEFAULT_APP_DIR
+        self.control_file = self.app_dir / 'control.json'
+        self.socket_path = self.app_dir / 'control.sock'
+        self.transport = transport or self.default_transport()
+        self.port = port
+        self.token = secrets.token_hex(16)
+        self.server = None
+        self.thread = None
+        self.requests_served = 0
+        self.commands = {
+            'ping': self.cmd_ping,
+            'status': self.cmd_status,
+            'stats': self.cmd_stats,
+            'templates': self.cmd_templates,
+            'reload-templates': self.cmd_reload_templates,
+            'pause': self.cmd_pause,
+            'resume': self.cmd_resume,
+            'sweep': self.cmd_sweep,
+            'log-level': self.cmd_log_level,
+        }
+
+    @staticmethod
+    def default_transport():
+        """Ưu tiên Unix socket, Windows dùng localhost TCP."""
+        if _ThreadingUnixServer is not None and os.name != 'nt':
+            return 'unix'
+        return 'tcp'
+
+    def start(self):
+        """Khởi động server trong daemon thread."""
+        self.app_dir.mkdir(parents=True, exist_ok=True)
+        if self.transport == 'unix':
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            self.server = _ThreadingUnixServer(str(self.socket_path), ControlRequestHandler)
+            os.chmod(self.socket_path, 0o600)
+            address = {'path': str(self.socket_path)}
+        else:
+            self.server = _ThreadingTCPServer(('127.0.0.1', self.port), ControlRequestHandler)
+            self.port = self.server.server_address[1]
+            address = {'host': '127.0.0.1', 'port': self.port}
+        self.server.control = self
+
+        self.write_control_file(address)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name='xml-protector-control', daemon=True)
+        self.thread.start()
+        log.info(f"🎛️ Control server đang chạy ({self.transport}: {address})")
+
+    def stop(self):
+        """Dừng server và dọn file điều khiển."""
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        for path in (self.control_file, self.socket_path):
+            try:
+                if path.exists():
+                    path.unlink()
+            except OSError:
+                pass
+        log.info("⏹️ Control server đã dừng")
+
+    def write_control_file(self, address):
+        """Ghi địa chỉ + token để client cục bộ kết nối."""
+        info = {
+            'version': CONTROL_PROTOCOL_VERSION,
+            'transport': self.transport,
+            'pid': os.getpid(),
+            'token': self.token,
+            'started_at': time.time(),
+        }
+        info.update(address)
+        tmp_file = self.control_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        try:
+            os.chmod(tmp_file, 0o600)
+        except OSError:
+            pass
+        os.replace(tmp_file, self.control_file)
+
+    def handle_raw_request(self, raw):
+        """Parse, xác thực và dispatch một request."""
+        self.requests_served += 1
+        try:
+            request = json.loads(raw.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError) as e:
+            return {'ok': False, 'error': f'invalid request: {e}'}
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': 'request must be a JSON object'}
+        if not secrets.compare_digest(str(request.get('token', '')), self.token):
+            return {'ok': False, 'error': 'unauthorized'}
+
+        command = request.get('cmd')
+        handler = self.commands.get(command)
+        if not handler:
+            return {'ok': False, 'error': f'unknown command: {command}',
+                    'commands': sorted(self.commands)}
+        try:
+            return {'ok': True, 'cmd': command, 'result': handler(request)}
+        except Exception as e:
+            log.error(f"❌ Lỗi xử lý lệnh control '{command}': {e}")
+            return {'ok': False, 'cmd': command, 'error': str(e)}
+
+    # --- Commands --- #
+
+    def cmd_ping(self, request):
+        return {'pong': True, 'pid': os.getpid()}
+
+    def cmd_status(self, request):
+        status = self.protector.get_status()
+        status['control'] = {
+            'transport': self.transport,
+            'requests_served': self.requests_served,
+        }
+        return status
+
+    def cmd_stats(self, request):
+        return {
+            'queues': self.protector.get_queue_depths(),
+            'metrics': self.protector.get_metrics(),
+        }
+
+    def cmd_templates(self, request):
+        return self.protector.get_template_stats()
+
+    def cmd_reload_templates(self, request):
+        return self.protector.reload_templates()
+
+    def cmd_pause(self, request):
+        self.protector.pause()
+        return {'paused': True}
+
+    def cmd_resume(self, request):
+        self.protector.resume()
+        return {'paused': False}
+
+    def cmd_sweep(self, request):
+        return self.protector.request_sweep(request.get('paths'))
+
+    def cmd_log_level(self, request):
+        """Xem hoặc đổi log level theo stage: {"stage": "matcher", "level": "DEBUG"}."""
+        from log_pipeline import set_stage_level, get_stage_levels, get_log_stats
+        if request.get('stage'):
+            set_stage_level(request['stage'], request.get('level', 'NOTSET'))
+            log.info(f"🔧 Log level {request['stage']} -> {request.get('level', 'NOTSET')}")
+        return {'levels': get_stage_levels(), 'pipeline': get_log_stats()}
+
+
+def send_control_command(command, app_dir=None, timeout=5.0, **params):
+    """Gửi một lệnh tới runtime đang chạy và trả về response dict."""
+    control_file = (Path(app_dir) if app_dir else DEFAULT_APP_DIR) / 'control.json'
+    with open(control_file, 'r', encoding='utf-8') as f:
+        info = json.load(f)
+
+    if info['transport'] == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = info['path']
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = (info['host'], info['port'])
+
+    request = dict(params, cmd=command, token=info['token'])
+    with sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("Control server đóng kết nối")
+    return json.loads(line.decode('utf-8'))
+
+
+# Client dòng lệnh: python control_server.py status | pause | resume | sweep [path...] | log-level [stage level]
+if __name__ == '__main__':
+    args = sys.argv[1:] or ['status']
+    params = {}
+    if args[0] == 'sweep' and len(args) > 1:
+        params['paths'] = args[1:]
+    if args[0] == 'log-level' and len(args) > 1:
+        params['stage'] = args[1]
+        params['level'] = args[2] if len(args) > 2 else 'NOTSET'
+    try:
+        response = send_control_command(args[0], **params)
+    except (OSError, ValueError) as e:
+        print(f"❌ Không kết nối được runtime: {e}")
+        sys.exit(1)
+    print(json.dumps(response, indent=2, ensure_ascii=False))
+    sys.exit(0 if response.get('ok') else 1)
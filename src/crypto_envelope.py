@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Crypto Envelope
+Định dạng mã hóa có version: header nhỏ ghi thuật toán AEAD và tham số KDF
+(salt, số vòng PBKDF2), hỗ trợ AES-256-GCM, ChaCha20-Poly1305 và Fernet cũ
+"""
+
+import os
+import base64
+import struct
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.exceptions import InvalidTag
+
+ENVELOPE_MAGIC = b'XPE'
+ENVELOPE_VERSION = 1
+TEXT_PREFIX = 'xpe1.'
+NONCE_SIZE = 12
+
+KDF_PBKDF2_SHA256 = 1
+
+# Tên thuật toán -> (id trong header, lớp AEAD). Fernet không có id: payload cũ không có header.
+ALGORITHMS = {
+    'aes-256-gcm': (1, AESGCM),
+    'chacha20-poly1305': (2, ChaCha20Poly1305),
+}
+ALGORITHM_NAMES = {algorithm_id: name for name, (algorithm_id, _) in ALGORITHMS.items()}
+LEGACY_ALGORITHM = 'fernet'
+DEFAULT_ALGORITHM = 'aes-256-gcm'
+
+# magic | version | algorithm | kdf | iterations | salt_length
+HEADER_FORMAT = '>3sBBBIB'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+class EnvelopeError(Exception):
+    """Envelope hỏng, sai key hoặc thuật toán không hỗ trợ."""
+
+
+def algorithm_key(master_key, algorithm):
+    """Tách key riêng cho từng thuật toán từ company key 32 byte (HKDF)."""
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'xpe1/' + algorithm.encode('ascii'))
+    return hkdf.derive(master_key)
+
+
+def seal(master_key, plaintext, algorithm=DEFAULT_ALGORITHM, salt=b'', iterations=0):
+    """Mã hóa ``plaintext`` -> envelope bytes. ``salt``/``iterations`` là tham số KDF đã tạo ra ``master_key``."""
+    if algorithm not in ALGORITHMS:
+        raise EnvelopeError(f"Thuật toán không hỗ trợ: {algorithm} (hỗ trợ: {', '.join(ALGORITHMS)})")
+    if len(salt) > 255:
+        raise EnvelopeError("Salt quá dài (tối đa 255 byte)")
+    algorithm_id, aead_class = ALGORITHMS[algorithm]
+    header = struct.pack(HEADER_FORMAT, ENVELOPE_MAGIC, ENVELOPE_VERSION, algorithm_id,
+                         KDF_PBKDF2_SHA256, iterations, len(salt)) + salt
+    nonce = os.urandom(NONCE_SIZE)
+    ciphertext = aead_class(algorithm_key(master_key, algorithm)).encrypt(nonce, plaintext, header)
+    return header + nonce + ciphertext
+
+
+def parse_header(envelope):
+    """Đọc header -> (tên thuật toán, salt, số vòng, độ dài header)."""
+    if len(envelope) < HEADER_SIZE or envelope[:3] != ENVELOPE_MAGIC:
+        raise EnvelopeError("Không phải crypto envelope của XML Protector")
+    _, version, algorithm_id, kdf_id, iterations, salt_length = struct.unpack(HEADER_FORMAT, envelope[:HEADER_SIZE])
+    if version != ENVELOPE_VERSION or kdf_id != KDF_PBKDF2_SHA256:
+        raise EnvelopeError(f"Không hỗ trợ envelope version {version} / KDF {kdf_id}")
+    if algorithm_id not in ALGORITHM_NAMES:
+        raise EnvelopeError(f"Thuật toán không hỗ trợ: id {algorithm_id}")
+    header_length = HEADER_SIZE + salt_length
+    salt = envelope[HEADER_SIZE:header_length]
+    return ALGORITHM_NAMES[algorithm_id], salt, iterations, header_length
+
+
+def unseal(envelope, key_for):
+    """Giải mã envelope bytes. ``key_for(salt, iterations)`` trả về company key 32 byte.
+
+    Salt/số vòng lấy từ header chưa được xác thực: ``key_for`` phải tự giới
+    hạn số vòng trước khi chạy KDF (xem SecurityManager.check_header_iterations).
+    """
+    algorithm, salt, iterations, header_length = parse_header(envelope)
+    nonce = envelope[header_length:header_length + NONCE_SIZE]
+    aead = ALGORITHMS[algorithm][1](algorithm_key(key_for(salt, iterations), algorithm))
+    try:
+        return aead.decrypt(nonce, envelope[header_length + NONCE_SIZE:], envelope[:header_length])
+    except InvalidTag:
+        raise EnvelopeError("Sai key hoặc dữ liệu đã bị sửa")
+
+
+def to_text(envelope):
+    """Envelope -> chuỗi ASCII (lưu trong file .enc / JSON)."""
+    return TEXT_PREFIX + base64.urlsafe_b64encode(envelope).decode('ascii').rstrip('=')
+
+
+def from_text(text):
+    data = text[len(TEXT_PREFIX):]
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def is_envelope_text(text):
+    """Phân biệt envelope với payload Fernet + base64 cũ."""
+    return text.startswith(TEXT_PREFIX)
+
+
+def text_algorithm(text):
+    """Thuật toán của payload dạng text (``fernet`` cho payload cũ)."""
+    if not is_envelope_text(text):
+        return LEGACY_ALGORITHM
+    return parse_header(from_text(text))[0]
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Event Trace
+Ghi lại luồng sự kiện watchdog ra NDJSON và replay lại vào pipeline
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import queue
+import logging
+import platform
+import threading
+from pathlib import Path, PurePosixPath, PureWindowsPath
+
+TRACE_FORMAT = 'xml-protector-events'
+TRACE_VERSION = 1
+
+# Ký hiệu ngắn cho loại sự kiện (trace gọn hơn)
+EVENT_CODES = {
+    'created': 'c',
+    'modified': 'm',
+    'deleted': 'd',
+    'moved': 'v',
+    'closed': 'w',
+    'closed_no_write': 'n',
+    'opened': 'o',
+}
+EVENT_TYPES = {code: name for name, code in EVENT_CODES.items()}
+
+log = logging.getLogger('xml_protector.trace')
+
+
+def open_trace(path, mode):
+    """Mở file trace, tự nén gzip nếu đuôi .gz."""
+    path = str(path)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class EventTraceRecorder:
+    """Ghi sự kiện filesystem thô (thời điểm, loại, path, size) ra NDJSON.
+
+    Mỗi dòng: ``{"t": giây từ lúc bắt đầu, "e": mã sự kiện, "p": path,
+    "d": dest_path?, "s": size?, "D": 1 nếu là thư mục}``. Dòng đầu là header.
+    ``record()`` chạy trên thread dispatch của observer nên chỉ lấy thời điểm
+    và xếp hàng; stat lấy size, serialize và ghi file làm trên thread writer.
+    """
+
+    def __init__(self, path, roots=None, flush_interval=1.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open_trace(self.path, 'w')
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+        self.started = time.perf_counter()
+        self.flush_interval = flush_interval
+        self.last_flush = self.started
+        self.events_recorded = 0
+        self.write_line({
+            'trace': TRACE_FORMAT,
+            'version': TRACE_VERSION,
+            'started_at': time.time(),
+            'host': platform.node(),
+            'roots': [str(r) for r in (roots or [])],
+        })
+        self.writer = threading.Thread(target=self.write_loop, name='xml-protector-trace', daemon=True)
+        self.writer.start()
+
+    def write_line(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def record(self, event):
+        """Ghi một sự kiện watchdog (gọi từ thread observer): chỉ lấy thời điểm rồi xếp hàng."""
+        if not self.closed:
+            self.queue.put((time.perf_counter(), event))
+
+    def write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            now, event = item
+            record = {'t': round(now - self.started, 6), 'e': EVENT_CODES.get(event.event_type, event.event_type),
+                      'p': event.src_path}
+            dest_path = getattr(event, 'dest_path', None)
+            if dest_path:
+                record['d'] = dest_path
+            if event.is_directory:
+                record['D'] = 1
+            elif event.event_type != 'deleted':
+                try:
+                    record['s'] = os.stat(dest_path or event.src_path).st_size
+                except OSError:
+                    pass
+            self.write_line(record)
+            self.events_recorded += 1
+            if now - self.last_flush >= self.flush_interval:
+                self.file.flush()
+                self.last_flush = now
+        self.file.close()
+
+    def close(self):
+        """Ghi nốt các sự kiện đang xếp hàng rồi đóng file."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.writer.join()
+        log.info(f"🎞️ Đã ghi {self.events_recorded} sự kiện vào trace {self.path}")
+
+
+def pure_path(original):
+    """Path thuần theo đúng hệ điều hành ghi trace (trace Windows replay được trên Linux)."""
+    if re.match(r'^([A-Za-z]:[\\/]|\\\\)', original):
+        return PureWindowsPath(original)
+    return PurePosixPath(original)
+
+
+def read_trace(path):
+    """Đọc trace, trả về (header, list sự kiện)."""
+    with open_trace(path, 'r') as f:
+        header = json.loads(f.readline())
+        if header.get('trace') != TRACE_FORMAT:
+            raise ValueError(f"{path} không phải trace của XML Protector")
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+
+class EventTraceReplayer:
+    """Replay trace vào handler của runtime trên một thư mục sandbox.
+
+    Path gốc được ánh xạ vào ``sandbox_dir`` (giữ cấu trúc thư mục, ổ đĩa thành thư mục con).
+    ``speed``: 1.0 = đúng tốc độ ghi, 2.0 = nhanh gấp đôi, 0 = nhanh nhất có thể.
+    Sự kiện được đưa qua một hàng đợi và một thread dispatch giống Observer.
+    """
+
+    def __init__(self, trace_path, handler, sandbox_dir, speed=1.0, materialize=True, content_dir=None):
+        self.trace_path = trace_path
+        self.handler = handler
+        self.sandbox_dir = Path(sandbox_dir)
+        self.speed = speed
+        self.materialize = materialize
+        self.content_dir = Path(content_dir) if content_dir else None
+        self.header, self.events = read_trace(trace_path)
+        self.event_queue = queue.Queue()
+        self.lags = []
+        self.max_queue_depth = 0
+
+    def map_path(self, original):
+        path = pure_path(original)
+        relative = list(path.parts[1:] if path.anchor else path.parts)
+        if path.drive:
+            # Giữ ổ đĩa thành thư mục con để C:\\a và D:\\a không trùng nhau
+            relative.insert(0, re.sub(r'[^A-Za-z0-9]+', '_', path.drive).strip('_'))
+        return str(self.sandbox_dir.joinpath(*relative))
+
+    def materialize_file(self, path, size, original):
+        """Tạo file trong sandbox nếu chưa có (nội dung từ content_dir hoặc XML đệm)."""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if self.content_dir:
+            source = self.content_dir / pure_path(original).name
+            if source.is_file():
+                target.write_bytes(source.read_bytes())
+                return
+        if not target.exists() or target.stat().st_size != (size or 0):
+            body = 'x' * max(0, (size or 0) - 64)
+            target.write_text(f'<?xml version="1.0" encoding="utf-8"?>\n<trace-placeholder>{body}</trace-placeholder>\n',
+                              encoding='utf-8')
+
+    def build_event(self, record):
+        from watchdog import events as wd
+
+        event_type = EVENT_TYPES.get(record['e'], record['e'])
+        src_path = self.map_path(record['p'])
+        is_dir = bool(record.get('D'))
+        if self.materialize and not is_dir and event_type in ('created', 'modified', 'closed'):
+            self.materialize_file(src_path, record.get('s'), record['p'])
+        if event_type == 'moved':
+            dest_path = self.map_path(record['d'])
+            if self.materialize and not is_dir:
+                self.materialize_file(dest_path, record.get('s'), record['d'])
+            return (wd.DirMovedEvent if is_dir else wd.FileMovedEvent)(src_path, dest_path)
+        classes = {
+            'created': (wd.FileCreatedEvent, wd.DirCreatedEvent),
+            'modified': (wd.FileModifiedEvent, wd.DirModifiedEvent),
+            'deleted': (wd.FileDeletedEvent, wd.DirDeletedEvent),
+            'closed': (wd.FileClosedEvent, None),
+            'closed_no_write': (getattr(wd, 'FileClosedNoWriteEvent', None), None),
+            'opened': (getattr(wd, 'FileOpenedEvent', None), None),
+        }
+        event_class = classes.get(event_type, (None, None))[1 if is_dir else 0]
+        return event_class(src_path) if event_class else None
+
+    def dispatch_loop(self):
+        while True:
+            item = self.event_queue.get()
+            if item is None:
+                break
+            try:
+                self.handler.dispatch(item)
+            except Exception as e:
+                log.error(f"❌ Lỗi dispatch sự kiện replay: {e}")
+
+    def run(self):
+        """Replay toàn bộ trace, trả về thống kê."""
+        self.sandbox_dir.mkdir(parents=True, exist_ok=True)
+        dispatcher = threading.Thread(target=self.dispatch_loop, name='xml-protector-replay', daemon=True)
+        dispatcher.start()
+
+        started = time.perf_counter()
+        skipped = 0
+        for record in self.events:
+            if self.speed > 0:
+                scheduled = started + record['t'] / self.speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self.lags.append(time.perf_counter() - scheduled)
+            event = self.build_event(record)
+            if event is None:
+                skipped += 1
+                continue
+            self.event_queue.put(event)
+            self.max_queue_depth = max(self.max_queue_depth, self.event_queue.qsize())
+        feed_done = time.perf_counter()
+
+        self.event_queue.put(None)
+        dispatcher.join()
+        # XMLFileHandler kiểm tra file trên thread settle riêng: chờ xong mới tính là replay xong
+        drain = getattr(self.handler, 'drain', None)
+        if drain:
+            drain()
+        finished = time.perf_counter()
+
+        lags_ms = sorted(lag * 1000 for lag in self.lags)
+        return {
+            'events': len(self.events),
+            'skipped': skipped,
+            'speed': self.speed,
+            'recorded_duration_s': round(self.events[-1]['t'], 3) if self.events else 0,
+            'feed_duration_s': round(feed_done - started, 3),
+            'drain_duration_s': round(finished - started, 3),
+            'max_queue_depth': self.max_queue_depth,
+            'schedule_lag_p50_ms': round(lags_ms[len(lags_ms) // 2], 3) if lags_ms else 0,
+            'schedule_lag_p99_ms': round(lags_ms[int(len(lags_ms) * 0.99)], 3) if lags_ms else 0,
+        }
+
+
+# Dòng lệnh:
+#   python event_trace.py info trace.ndjson.gz
+#   python event_trace.py replay trace.ndjson.gz SANDBOX_DIR [speed|max] [content_dir]
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('info', 'replay'):
+        print("Usage: event_trace.py info TRACE | replay TRACE SANDBOX_DIR [speed|max] [content_dir]")
+        sys.exit(2)
+
+    if sys.argv[1] == 'info':
+        header, events = read_trace(sys.argv[2])
+        counts = {}
+        for record in events:
+            name = EVENT_TYPES.get(record['e'], record['e'])
+            counts[name] = counts.get(name, 0) + 1
+        duration = events[-1]['t'] if events else 0
+        print(json.dumps({'header': header, 'events': len(events), 'duration_s': duration,
+                          'rate_per_s': round(len(events) / duration, 1) if duration else None,
+                          'by_type': counts}, indent=2, ensure_ascii=False))
+        sys.exit(0)
+
+    from xml_protector_runtime import XMLProtectorRuntime, XMLFileHandler
+
+    speed_arg = sys.argv[4] if len(sys.argv) > 4 else '1'
+    replayer = EventTraceReplayer(
+        sys.argv[2],
+        XMLFileHandler(XMLProtectorRuntime()),
+        sys.argv[3],
+        speed=0 if speed_arg == 'max' else float(speed_arg),
+        content_dir=sys.argv[5] if len(sys.argv) > 5 else None,
+    )
+    print(json.dumps(replayer.run(), indent=2))
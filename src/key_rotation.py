@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Key Rotation
+Giải mã và mã hóa lại hàng loạt secure_config.enc / deployment package với tham số
+mới (salt, số vòng PBKDF2, machine binding, hạn dùng), song song và tiếp tục được
+sau khi bị ngắt
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from pathlib import Path
+
+import crypto_envelope
+from security_manager import SecurityManager, KDF_SALT, CONFIG_EXPIRY_DAYS, default_kdf_iterations
+
+log = logging.getLogger('xml_protector.config')
+
+_rotation_managers = None
+
+
+def key_params(salt=None, iterations=None, machine_id=None, expiry_days=CONFIG_EXPIRY_DAYS, cipher=None):
+    """Tham số key dạng dict (truyền được sang worker process)."""
+    return {
+        'salt': (salt or KDF_SALT).hex(),
+        'iterations': iterations or default_kdf_iterations(),
+        'machine_id': machine_id,
+        'expiry_days': expiry_days,
+        'cipher': cipher,
+    }
+
+
+def manager_for(params):
+    return SecurityManager(kdf_iterations=params['iterations'], kdf_salt=bytes.fromhex(params['salt']),
+                           machine_id=params.get('machine_id'), config_expiry_days=params['expiry_days'],
+                           cipher=params.get('cipher'))
+
+
+def _init_rotation_worker(old_params, new_params):
+    global _rotation_managers
+    _rotation_managers = (manager_for(old_params), manager_for(new_params))
+
+
+def write_text_atomic(path, text):
+    tmp_path = Path(path).with_name(Path(path).name + '.rotating')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def rotated_already(new, blob, company_mst, company_name):
+    """Envelope đã mang đúng thuật toán/salt/số vòng mới và giải mã được bằng key mới.
+
+    Envelope tự ghi tham số KDF trong header nên ``old.decrypt_config`` vẫn mở
+    được blob đã xoay vòng; phải so header trước khi thử giải mã bằng key cũ.
+    """
+    if not crypto_envelope.is_envelope_text(blob):
+        return False
+    algorithm, salt, iterations, _ = crypto_envelope.parse_header(crypto_envelope.from_text(blob))
+    if (algorithm, salt, iterations) != (new.cipher, new.kdf_salt, new.kdf_iterations):
+        return False
+    try:
+        new.decrypt_config(blob, company_mst, company_name)
+        return True
+    except Exception:
+        # Cùng tham số nhưng khác machine binding: chưa xoay vòng
+        return False
+
+
+def rotate_blob(old, new, blob, company_mst, company_name):
+    """Mã hóa lại một blob; trả về (blob mới, đã xoay vòng từ trước hay chưa)."""
+    if rotated_already(new, blob, company_mst, company_name):
+        return blob, True
+    try:
+        data = old.decrypt_config(blob, company_mst, company_name)
+    except Exception as old_error:
+        # Payload Fernet: lần chạy trước có thể đã ghi file nhưng chưa kịp checkpoint
+        try:
+            new.decrypt_config(blob, company_mst, company_name)
+            return blob, True
+        except Exception:
+            raise old_error
+    return new.encrypt_config(data, company_mst, company_name), False
+
+
+def item_managers(item, managers):
+    """Manager cũ/mới cho item; ``old_machine_id``/``new_machine_id`` của item (nếu có) thay machine binding."""
+    old, new = managers
+    if item.get('old_machine_id'):
+        old = SecurityManager(**dict(old.worker_settings(), machine_id=item['old_machine_id']))
+    if item.get('new_machine_id'):
+        new = SecurityManager(**dict(new.worker_settings(), machine_id=item['new_machine_id']))
+    return old, new
+
+
+def sync_deployment_info(item, path, new):
+    """Ghi salt/số vòng mới vào deployment_info.json cạnh secure_config.enc.
+
+    Runtime dùng hai trường này để derive key cho payload Fernet (không có
+    header), nên phải khớp với file .enc vừa ghi. Trả về path nếu có cập nhật.
+    """
+    info_path = Path(item.get('deployment_info') or path.with_name('deployment_info.json'))
+    if not info_path.exists():
+        return None
+    with open(info_path, 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    if info.get('company_mst') not in (None, item['company_mst']):
+        return None
+    if info.get('kdf_salt') == new.kdf_salt.hex() and info.get('kdf_iterations') == new.kdf_iterations:
+        return None
+    info['kdf_salt'] = new.kdf_salt.hex()
+    info['kdf_iterations'] = new.kdf_iterations
+    write_text_atomic(info_path, json.dumps(info, indent=2, ensure_ascii=False))
+    return str(info_path)
+
+
+def rotate_item(item, managers=None):
+    """Xoay vòng key cho một file (chạy trong worker process)."""
+    old, new = item_managers(item, managers or _rotation_managers)
+    path = Path(item['path'])
+    started = time.perf_counter()
+    result = {'path': str(path)}
+    try:
+        if item.get('kind', 'package') == 'package':
+            with open(path, 'r', encoding='utf-8') as f:
+                package = json.load(f)
+            package['encrypted_config'], already = rotate_blob(
+                old, new, package['encrypted_config'], package['company_mst'], package.get('company_name', ''))
+            if not already:
+                package['kdf_iterations'] = new.kdf_iterations
+                package['kdf_salt'] = new.kdf_salt.hex()
+                package['rotated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                write_text_atomic(path, json.dumps(package, indent=2, ensure_ascii=False))
+        else:
+            blob, already = rotate_blob(old, new, path.read_text(encoding='utf-8').strip(),
+                                        item['company_mst'], item.get('company_name', ''))
+            if not already:
+                write_text_atomic(path, blob)
+            # Cả khi đã xoay vòng từ trước: lần chạy trước có thể bị ngắt giữa hai lần ghi
+            info_path = sync_deployment_info(item, path, new)
+            if info_path:
+                result['deployment_info'] = info_path
+        result['status'] = 'skipped' if already else 'rotated'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+class KeyRotationJob:
+    """Job xoay vòng key có checkpoint.
+
+    ``items``: iterable các dict ``{"path", "kind": "package"|"config",
+    "company_mst"?, "company_name"?, "old_machine_id"?, "new_machine_id"?,
+    "deployment_info"?}`` (config ``.enc`` cần MST/tên DN, package tự chứa;
+    machine ID của item thay machine binding chung của job; deployment_info
+    mặc định là file cạnh ``.enc``). Kết quả từng file được ghi nối vào ``state_file`` (JSONL); chạy
+    lại với cùng state file sẽ bỏ qua các file đã xử lý xong.
+    ``progress(stats)`` nhận done/total/rate/ETA sau mỗi file.
+    """
+
+    def __init__(self, items, old_params, new_params, state_file, workers=None, progress=None,
+                 retry_failed=False):
+        self.items = items
+        self.old_params = old_params
+        self.new_params = new_params
+        self.state_file = Path(state_file)
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = progress
+        self.retry_failed = retry_failed
+        self.counts = {'rotated': 0, 'skipped': 0, 'failed': 0, 'resumed': 0}
+
+    def load_state(self):
+        """Các path đã xong ở lần chạy trước (failed chỉ được chạy lại khi retry_failed)."""
+        finished = set()
+        if not self.state_file.exists():
+            return finished
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Dòng cuối dở dang do bị ngắt
+                if record.get('status') == 'failed' and self.retry_failed:
+                    finished.discard(record['path'])
+                elif 'path' in record:
+                    finished.add(record['path'])
+        return finished
+
+    def pending_items(self, finished):
+        for item in self.items:
+            if str(Path(item['path'])) in finished:
+                self.counts['resumed'] += 1
+                continue
+            yield item
+
+    def run(self):
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+        finished = self.load_state()
+        total = len(self.items) if hasattr(self.items, '__len__') else None
+        started = time.perf_counter()
+        done = 0
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.state_file, 'a', encoding='utf-8') as state:
+            def record(result):
+                nonlocal done
+                done += 1
+                self.counts[result['status']] += 1
+                state.write(json.dumps(result, ensure_ascii=False) + '\n')
+                state.flush()
+                if result['status'] == 'failed':
+                    log.warning(f"⚠️ Không xoay vòng được {result['path']}: {result['error']}")
+                if self.progress:
+                    self.progress(self.stats(done, total, started))
+
+            if self.workers == 1:
+                managers = (manager_for(self.old_params), manager_for(self.new_params))
+                for item in self.pending_items(finished):
+                    record(rotate_item(item, managers))
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_rotation_worker,
+                                         initargs=(self.old_params, self.new_params)) as pool:
+                    pending = set()
+                    for item in self.pending_items(finished):
+                        pending.add(pool.submit(rotate_item, item))
+                        if len(pending) >= self.workers * 4:
+                            completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in completed:
+                                record(future.result())
+                    while pending:
+                        completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in completed:
+                            record(future.result())
+            os.fsync(state.fileno())
+
+        summary = self.stats(done, total, started)
+        log.info(f"🔑 Xoay vòng key xong: {summary}")
+        return summary
+
+    def stats(self, done, total, started):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        remaining = None if total is None else max(0, total - self.counts['resumed'] - done)
+        return dict(self.counts, done=done, total=total, elapsed_s=round(elapsed, 2),
+                    items_per_s=round(rate, 2),
+                    eta_s=round(remaining / rate, 1) if remaining is not None and rate else None)
+
+
+# Dòng lệnh:
+#   python key_rotation.py MANIFEST.jsonl STATE.jsonl [--new-iterations N] [--new-salt HEX]
+#                          [--old-iterations N] [--old-salt HEX] [--old-machine-id ID] [--new-machine-id ID]
+#                          [--workers N] [--retry-failed]
+# MANIFEST: mỗi dòng một item {"path": ..., "kind": "package"|"config", "company_mst": ..., "company_name": ...,
+#           "old_machine_id"?: ..., "new_machine_id"?: ...}
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Xoay vòng key cho secure config / deployment package")
+    parser.add_argument('manifest')
+    parser.add_argument('state')
+    parser.add_argument('--old-iterations', type=int, default=None)
+    parser.add_argument('--old-salt', default=None, help="Salt cũ (hex), mặc định salt hiện hành")
+    parser.add_argument('--new-iterations', type=int, default=None)
+    parser.add_argument('--new-salt', default=None, help="Salt mới (hex), 'random' để sinh ngẫu nhiên")
+    parser.add_argument('--old-machine-id', default=None, help="Machine ID mà config đang gắn (mặc định máy này)")
+    parser.add_argument('--new-machine-id', default=None, help="Machine ID mới để gắn config (vd. máy thay thế)")
+    parser.add_argument('--expiry-days', type=int, default=CONFIG_EXPIRY_DAYS)
+    parser.add_argument('--cipher', default=None, help="Thuật toán mới: aes-256-gcm | chacha20-poly1305 | fernet")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--retry-failed', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s')
+    with open(args.manifest, 'r', encoding='utf-8') as f:
+        manifest_items = [json.loads(line) for line in f if line.strip()]
+    new_salt = os.urandom(16) if args.new_salt == 'random' else (bytes.fromhex(args.new_salt) if args.new_salt else None)
+    if new_salt and args.new_salt == 'random':
+        print(f"🧂 Salt mới: {new_salt.hex()} (cần cấu hình cho runtime)")
+
+    def print_progress(stats):
+        if stats['done'] % 25 == 0 or stats['done'] == stats['total']:
+            print(f"   {stats['done']}/{stats['total']} | {stats['items_per_s']}/s | ETA {stats['eta_s']}s")
+
+    job = KeyRotationJob(
+        manifest_items,
+        key_params(bytes.fromhex(args.old_salt) if args.old_salt else None, args.old_iterations,
+                   machine_id=args.old_machine_id),
+        key_params(new_salt, args.new_iterations, machine_id=args.new_machine_id, expiry_days=args.expiry_days,
+                   cipher=args.cipher),
+        args.state, workers=args.workers, progress=print_progress, retry_failed=args.retry_failed,
+    )
+    summary = job.run()
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary['failed'] else 0)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Log Pipeline
+Logging bất đồng bộ (QueueHandler/QueueListener), xoay vòng file theo dung lượng
+và thời gian có nén gzip, log level riêng cho từng stage
+"""
+
+import os
+import copy
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from pathlib import Path
+
+LOG_FORMAT = '[%(asctime)s] %(levelname)s - %(message)s'
+ROOT_LOGGER = 'xml_protector'
+
+# Logger theo stage của pipeline: xml_protector.<stage>
+LOG_STAGES = ('watcher', 'matcher', 'restore', 'notify', 'templates', 'config', 'control', 'metrics', 'trace')
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def stage_logger(stage):
+    """Logger của một stage, ví dụ ``stage_logger('restore')``."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{stage}")
+
+
+class CompressedRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """File handler xoay vòng khi vượt ``max_bytes`` hoặc sau ``interval`` giây.
+
+    File cũ được đổi tên theo thời điểm xoay vòng, nén gzip và chỉ giữ
+    ``backup_count`` bản mới nhất. Handler chạy trong thread listener nên
+    việc nén không chặn pipeline bảo vệ.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, interval=24 * 3600,
+                 backup_count=14, compress=True, encoding='utf-8'):
+        super().__init__(filename, 'a', encoding=encoding, delay=False)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backup_count = backup_count
+        self.compress = compress
+        self.rollover_at = time.time() + interval if interval else None
+        self.rollovers = 0
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        if self.rollover_at and time.time() >= self.rollover_at:
+            return True
+        return bool(self.max_bytes) and self.stream.tell() >= self.max_bytes
+
+    def archive_name(self):
+        base = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}"
+        name, counter = base, 1
+        while os.path.exists(name) or os.path.exists(name + '.gz'):
+            name = f"{base}.{counter}"
+            counter += 1
+        return name
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            archive = self.archive_name()
+            os.replace(self.baseFilename, archive)
+            if self.compress:
+                import gzip
+                import shutil
+                with open(archive, 'rb') as source, gzip.open(archive + '.gz', 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(archive)
+            self.rollovers += 1
+            self.delete_old_archives()
+        self.stream = self._open()
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+    def delete_old_archives(self):
+        log_path = Path(self.baseFilename)
+        archives = sorted(log_path.parent.glob(log_path.name + '.*'), key=lambda p: p.stat().st_mtime)
+        for old in archives[:-self.backup_count] if self.backup_count else []:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler chỉ ghép message; format (asctime, level...) để listener làm."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.records_enqueued = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self.records_enqueued += 1
+        self.queue.put_nowait(record)
+
+
+class CountingQueueListener(logging.handlers.QueueListener):
+    """QueueListener đếm số record đã ghi và thời gian xử lý."""
+
+    def __init__(self, log_queue, *handlers):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.records_written = 0
+        self.busy_seconds = 0.0
+
+    def handle(self, record):
+        start = time.perf_counter()
+        super().handle(record)
+        self.busy_seconds += time.perf_counter() - start
+        self.records_written += 1
+
+
+class LogPipeline:
+    """Gom queue, handler và listener của logging runtime."""
+
+    def __init__(self, log_file, level=logging.INFO, console=True, max_bytes=10 * 1024 * 1024,
+                 interval=24 * 3600, backup_count=14):
+        self.started_at = time.time()
+        self.queue = queue.SimpleQueue()
+        formatter = logging.Formatter(LOG_FORMAT)
+
+        self.file_handler = CompressedRotatingFileHandler(log_file, max_bytes, interval, backup_count)
+        self.file_handler.setFormatter(formatter)
+        handlers = [self.file_handler]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            handlers.append(console_handler)
+
+        self.queue_handler = DeferredQueueHandler(self.queue)
+        self.listener = CountingQueueListener(self.queue, *handlers)
+
+        root = logging.getLogger()
+        root.addHandler(self.queue_handler)
+        root.setLevel(level)
+        self.listener.start()
+
+    def stop(self):
+        logging.getLogger().removeHandler(self.queue_handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+
+    def stats(self):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {
+            'queue_depth': self.queue.qsize(),
+            'records_enqueued': self.queue_handler.records_enqueued,
+            'records_written': self.listener.records_written,
+            'records_per_s': round(self.listener.records_written / elapsed, 2),
+            'listener_busy_ms': round(self.listener.busy_seconds * 1000, 1),
+            'file_rollovers': self.file_handler.rollovers,
+        }
+
+
+def parse_stage_levels(spec):
+    """``"matcher=DEBUG,notify=WARNING"`` -> {'matcher': 'DEBUG', 'notify': 'WARNING'}."""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            stage, level = item.split('=', 1)
+            levels[stage.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_runtime_logging(log_file, level=None):
+    """Cài đặt log pipeline một lần cho cả process (gọi lại không có tác dụng)."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            return _pipeline
+        level = level or os.getenv('XML_PROTECTOR_LOG_LEVEL', 'INFO').upper()
+        _pipeline = LogPipeline(
+            log_file,
+            level=level,
+            max_bytes=int(float(os.getenv('XML_PROTECTOR_LOG_MAX_MB', '10')) * 1024 * 1024),
+            interval=int(float(os.getenv('XML_PROTECTOR_LOG_ROTATE_HOURS', '24')) * 3600),
+            backup_count=int(os.getenv('XML_PROTECTOR_LOG_BACKUPS', '14')),
+        )
+        for stage, stage_level in parse_stage_levels(os.getenv('XML_PROTECTOR_STAGE_LEVELS')).items():
+            set_stage_level(stage, stage_level)
+        atexit.register(shutdown_runtime_logging)
+        return _pipeline
+
+
+def shutdown_runtime_logging():
+    """Dừng listener và flush toàn bộ log còn trong queue."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+            _pipeline = None
+
+
+def set_stage_level(stage, level):
+    """Đổi log level của một stage lúc đang chạy ('NOTSET' = theo root)."""
+    if stage not in LOG_STAGES:
+        raise ValueError(f"Stage không hợp lệ: {stage} (hợp lệ: {', '.join(LOG_STAGES)})")
+    level_name = str(level).upper()
+    if not isinstance(logging.getLevelName(level_name), int):
+        raise ValueError(f"Log level không hợp lệ: {level}")
+    stage_logger(stage).setLevel(level_name)
+
+
+def get_stage_levels():
+    """Log level hiện hành của từng stage."""
+    return {stage: logging.getLevelName(stage_logger(stage).getEffectiveLevel()) for stage in LOG_STAGES}
+
+
+def get_log_stats():
+    """Thống kê throughput và độ sâu queue của log pipeline."""
+    return _pipeline.stats() if _pipeline else None
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Metrics HTTP Endpoint
+Endpoint OpenMetrics/Prometheus cục bộ (GET /metrics) cho runtime và monitoring,
+trả lời từ snapshot trong bộ nhớ, không truy vấn SQLite
+"""
+
+import time
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from runtime_metrics import openmetrics_family
+
+log = logging.getLogger('xml_protector.metrics')
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+DEFAULT_METRICS_HOST = '127.0.0.1'
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """GET /metrics -> OpenMetrics text; đường dẫn khác -> 404."""
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.endpoint.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(f"metrics endpoint {self.address_string()} {format % args}")
+
+
+class MetricsHTTPServer:
+    """HTTP server nhỏ (stdlib) chỉ nghe trên localhost.
+
+    Mỗi collector là một hàm trả về danh sách dòng OpenMetrics dựng từ dữ
+    liệu trong bộ nhớ (counter, ring buffer, stats hàng đợi). Kết quả được
+    giữ lại ``cache_seconds`` giây để nhiều scraper cùng lúc không dựng lại.
+    Collector lỗi bị bỏ qua (có log) thay vì làm hỏng cả lần scrape.
+    """
+
+    def __init__(self, collectors, port, host=DEFAULT_METRICS_HOST, cache_seconds=1.0):
+        self.collectors = list(collectors)
+        self.host = host
+        self.port = port
+        self.cache_seconds = cache_seconds
+        self.lock = threading.Lock()
+        self.cached_text = None
+        self.cached_at = 0.0
+        self.counts = {'scrapes': 0, 'renders': 0, 'collector_errors': 0}
+        self.last_render_s = 0.0
+        self.server = None
+        self.thread = None
+
+    def add_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+            self.cached_text = None
+
+    def render(self):
+        with self.lock:
+            self.counts['scrapes'] += 1
+            now = time.monotonic()
+            if self.cached_text is not None and now - self.cached_at < self.cache_seconds:
+                return self.cached_text
+            started = time.perf_counter()
+            lines = []
+            for collector in self.collectors:
+                try:
+                    lines.extend(collector())
+                except Exception as e:
+                    self.counts['collector_errors'] += 1
+                    log.warning(f"⚠️ Lỗi collector metrics {getattr(collector, '__qualname__', collector)}: {e}")
+            self.last_render_s = time.perf_counter() - started
+            self.counts['renders'] += 1
+            lines += self.self_metrics()
+            lines.append("# EOF")
+            self.cached_text = "\n".join(lines) + "\n"
+            self.cached_at = now
+            return self.cached_text
+
+    def self_metrics(self):
+        return (
+            openmetrics_family('xml_protector_metrics_scrapes', 'counter', [(None, self.counts['scrapes'])],
+                               "Scrapes served by the metrics endpoint")
+            + openmetrics_family('xml_protector_metrics_render_seconds', 'gauge',
+                                 [(None, round(self.last_render_s, 6))], "Time spent building the last response")
+        )
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.server.endpoint = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name='xml-protector-metrics', daemon=True)
+        self.thread.start()
+        log.info(f"📈 Metrics endpoint: http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+
+    def stats(self):
+        return dict(self.counts, host=self.host, port=self.port, last_render_ms=round(self.last_render_s * 1000, 3))
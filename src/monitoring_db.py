@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Monitoring Database
+Lớp kết nối SQLite cho monitoring: một connection ghi sống lâu ở chế độ WAL,
+một pool nhỏ connection chỉ đọc cho truy vấn báo cáo, hàng đợi ghi theo lô và
+bộ lập lịch retention xóa theo từng đoạn nhỏ
+"""
+
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+log = logging.getLogger('xml_protector.monitoring')
+
+DEFAULT_READ_POOL_SIZE = 4
+DEFAULT_CACHE_SIZE_KB = 8192
+BUSY_TIMEOUT_MS = 5000
+
+
+class MonitoringDatabase:
+    """Connection layer cho monitoring.db.
+
+    Đảm bảo thread-safety: mỗi connection chỉ được một thread dùng tại một
+    thời điểm. Connection ghi được bảo vệ bởi lock (``write()`` chạy trong
+    một transaction BEGIN IMMEDIATE, lỗi thì rollback); connection đọc được
+    mượn độc quyền từ pool qua ``read()`` và trả lại khi xong. Nhờ WAL, đọc
+    không chặn ghi và ngược lại.
+    """
+
+    def __init__(self, db_file, read_pool_size=None, synchronous='NORMAL', cache_size_kb=DEFAULT_CACHE_SIZE_KB):
+        self.db_file = str(db_file)
+        self.read_pool_size = read_pool_size or int(os.getenv('XML_PROTECTOR_MONITORING_READERS',
+                                                               DEFAULT_READ_POOL_SIZE))
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.write_lock = threading.Lock()
+        self.readers = queue.LifoQueue()
+        self.readers_lock = threading.Lock()
+        self.readers_opened = 0
+        self.closed = False
+        self.counts = {'write_transactions': 0, 'read_checkouts': 0, 'read_waits': 0}
+        self.writer = self.connect()
+        # Chỉ có hiệu lực với DB mới (chưa có bảng); DB cũ giữ auto_vacuum=NONE, trang trống vẫn được tái sử dụng
+        self.writer.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self.auto_vacuum = ('none', 'full', 'incremental')[self.writer.execute('PRAGMA auto_vacuum').fetchone()[0]]
+        self.journal_mode = self.writer.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        if self.journal_mode.lower() != 'wal':
+            log.warning(f"⚠️ monitoring.db không bật được WAL (journal_mode={self.journal_mode})")
+
+    def connect(self, read_only=False):
+        if read_only:
+            conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, check_same_thread=False,
+                                   timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute('PRAGMA query_only=ON')
+        else:
+            # isolation_level=None: transaction do write() tự quản lý
+            conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None,
+                                   timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        return conn
+
+    @contextmanager
+    def write(self):
+        """Cursor trên connection ghi, trong một transaction (commit khi thoát, rollback nếu lỗi)."""
+        with self.write_lock:
+            if self.closed:
+                raise sqlite3.ProgrammingError("Monitoring database đã đóng")
+            cursor = self.writer.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                self.writer.rollback()
+                raise
+            else:
+                self.writer.commit()
+                self.counts['write_transactions'] += 1
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def read(self, timeout=30):
+        """Cursor trên một connection chỉ đọc mượn từ pool."""
+        conn = self.checkout(timeout)
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            if self.closed:
+                conn.close()
+            else:
+                self.readers.put(conn)
+
+    def checkout(self, timeout):
+        if self.closed:
+            raise sqlite3.ProgrammingError("Monitoring database đã đóng")
+        with self.readers_lock:
+            self.counts['read_checkouts'] += 1
+            can_open = self.readers.empty() and self.readers_opened < self.read_pool_size
+            if can_open:
+                self.readers_opened += 1
+            elif self.readers.empty():
+                self.counts['read_waits'] += 1
+        if can_open:
+            return self.connect(read_only=True)
+        return self.readers.get(timeout=timeout)
+
+    def checkpoint(self, mode='PASSIVE'):
+        """Chép WAL về file chính (TRUNCATE để thu nhỏ file -wal)."""
+        with self.write_lock:
+            return self.writer.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+
+    def incremental_vacuum(self, pages):
+        """Trả tối đa ``pages`` trang trống về hệ điều hành; trả về số trang đã giải phóng."""
+        with self.write_lock:
+            if self.closed:
+                raise sqlite3.ProgrammingError("Monitoring database đã đóng")
+            before = self.writer.execute('PRAGMA freelist_count').fetchone()[0]
+            # execute() chỉ step một lần (giải phóng 1 trang); executescript chạy PRAGMA đến hết
+            self.writer.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+            return before - self.writer.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def stats(self):
+        return dict(self.counts, journal_mode=self.journal_mode, auto_vacuum=self.auto_vacuum,
+                    readers_open=self.readers_opened, readers_idle=self.readers.qsize())
+
+    def close(self):
+        """Đóng mọi connection (connection đọc đang được mượn sẽ đóng khi trả về)."""
+        with self.write_lock:
+            if self.closed:
+                return
+            self.closed = True
+            while True:
+                try:
+                    self.readers.get_nowait().close()
+                except queue.Empty:
+                    break
+            # Connection đóng cuối cùng sẽ checkpoint và xóa file -wal/-shm
+            try:
+                self.writer.execute('PRAGMA optimize')
+                self.writer.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except sqlite3.Error as e:
+                log.warning(f"⚠️ Lỗi checkpoint monitoring.db khi đóng: {e}")
+            self.writer.close()
+
+
+class BatchWriter:
+    """Write-behind: caller chỉ đưa câu lệnh vào hàng đợi, một thread ghi gom theo lô.
+
+    Mỗi lô được ghi bằng ``executemany`` trong một transaction. Lô được
+    flush khi đủ ``batch_size`` dòng hoặc sau tối đa ``flush_interval`` giây;
+    ``flush()`` chờ đến khi mọi dòng đã đưa vào trước đó được ghi xong.
+    Hàng đợi đầy (``max_queue``) thì caller phải chờ (backpressure), không
+    bỏ event. ``on_batch(cursor, grouped)`` (nếu có) chạy trong cùng
+    transaction với lô, nhận ``{câu lệnh: [params]}`` (vd. để cập nhật rollup).
+    """
+
+    def __init__(self, db, batch_size=None, flush_interval=None, max_queue=100000, on_batch=None):
+        self.db = db
+        self.on_batch = on_batch
+        self.batch_size = batch_size or int(os.getenv('XML_PROTECTOR_MONITORING_BATCH', '500'))
+        self.flush_interval = flush_interval or int(os.getenv('XML_PROTECTOR_MONITORING_FLUSH_MS', '200')) / 1000
+        self.max_queue = max_queue
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.enqueued = 0
+        self.written = 0
+        self.counts = {'batches': 0, 'failed_rows': 0, 'backpressure_waits': 0}
+        self.flush_ms = deque(maxlen=256)
+        self.max_flush_ms = 0.0
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name='monitoring-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, statement, params):
+        """Đưa một dòng vào hàng đợi (O(1))."""
+        with self.condition:
+            while len(self.pending) >= self.max_queue and not self.stopping:
+                self.counts['backpressure_waits'] += 1
+                self.condition.notify_all()
+                self.condition.wait()
+            self.pending.append((statement, params))
+            self.enqueued += 1
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify_all()
+
+    def submit_many(self, statement, rows):
+        for params in rows:
+            self.submit(statement, params)
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.stopping and len(self.pending) < self.batch_size:
+                    self.condition.wait(self.flush_interval)
+                if not self.pending:
+                    if self.stopping:
+                        return
+                    continue
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.max_queue))]
+                self.condition.notify_all()
+            self.write_batch(batch)
+
+    def write_batch(self, batch):
+        started = time.perf_counter()
+        # Gom theo câu lệnh: mỗi bảng một executemany, cả lô chung một transaction
+        grouped = {}
+        for statement, params in batch:
+            grouped.setdefault(statement, []).append(params)
+        try:
+            with self.db.write() as cursor:
+                for statement, rows in grouped.items():
+                    cursor.executemany(statement, rows)
+                if self.on_batch:
+                    self.on_batch(cursor, grouped)
+        except Exception as e:
+            self.counts['failed_rows'] += len(batch)
+            log.error(f"❌ Lỗi ghi lô {len(batch)} dòng vào monitoring.db: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self.condition:
+            self.written += len(batch)
+            self.counts['batches'] += 1
+            self.flush_ms.append(elapsed_ms)
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self.condition.notify_all()
+
+    def flush(self, timeout=30):
+        """Chờ ghi xong mọi dòng đã đưa vào trước lời gọi này; False nếu quá timeout."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            target = self.enqueued
+            self.condition.notify_all()
+            while self.written < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.thread.is_alive():
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self, timeout=30):
+        """Flush phần còn lại rồi dừng thread ghi."""
+        with self.condition:
+            if self.stopping:
+                return
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join(timeout)
+        atexit.unregister(self.close)
+
+    def stats(self):
+        with self.condition:
+            recent = sorted(self.flush_ms)
+            return dict(
+                self.counts,
+                queue_depth=len(self.pending),
+                enqueued=self.enqueued,
+                written=self.written,
+                flush_ms_last=round(self.flush_ms[-1], 3) if self.flush_ms else None,
+                flush_ms_p95=round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else None,
+                flush_ms_max=round(self.max_flush_ms, 3),
+            )
+
+
+class RetentionScheduler:
+    """Dọn dữ liệu cũ định kỳ mà không chặn luồng ghi.
+
+    ``plan()`` trả về ``[(bảng, cột khóa, mốc cắt)]``; các dòng có khóa nhỏ
+    hơn mốc cắt bị xóa theo từng đoạn khoảng ``chunk_rows`` dòng, phân trang
+    theo khóa (keyset: đoạn sau bắt đầu sau khóa cuối của đoạn trước), mỗi
+    đoạn một transaction ngắn và nghỉ ``pause`` giây giữa các đoạn để
+    BatchWriter chen vào. Sau đó trả trang trống về hệ điều hành bằng
+    incremental vacuum, cũng theo từng bước nhỏ.
+    """
+
+    def __init__(self, db, plan, interval=None, chunk_rows=None, pause=0.05, vacuum_pages=256, delay=60):
+        self.db = db
+        self.plan = plan
+        self.interval = interval or int(os.getenv('XML_PROTECTOR_RETENTION_INTERVAL', '3600'))
+        self.chunk_rows = chunk_rows or int(os.getenv('XML_PROTECTOR_RETENTION_CHUNK', '2000'))
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.delay = delay
+        self.run_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.last_run = None
+        self.counts = {'runs': 0, 'rows_purged': 0, 'pages_freed': 0, 'errors': 0}
+        self.thread = None
+
+    def start(self):
+        """Thread nền: lượt đầu sau ``delay`` giây (không tranh với lúc khởi động), sau đó mỗi ``interval`` giây."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.loop, name='monitoring-retention', daemon=True)
+            self.thread.start()
+        return self
+
+    def loop(self):
+        self.wakeup.wait(self.delay)
+        while not self.stopping:
+            try:
+                self.run_once()
+            except Exception as e:
+                self.counts['errors'] += 1
+                log.error(f"❌ Lỗi retention monitoring.db: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def run_once(self, plan=None):
+        """Một lượt dọn dẹp (``plan`` thay cho plan mặc định); trả về thống kê (số dòng theo bảng, thời gian giữ lock ghi)."""
+        with self.run_lock:
+            started = time.perf_counter()
+            run = {'rows': {}, 'chunks': 0, 'lock_ms_total': 0.0, 'lock_ms_max': 0.0, 'pages_freed': 0}
+            for table, key, cutoff in (plan or self.plan)():
+                if self.stopping:
+                    break
+                run['rows'][table] = self.purge(table, key, cutoff, run)
+            if self.db.auto_vacuum == 'incremental':
+                while not self.stopping:
+                    lock_started = time.perf_counter()
+                    freed = self.db.incremental_vacuum(self.vacuum_pages)
+                    self.record_lock(run, lock_started)
+                    run['pages_freed'] += freed
+                    if freed < self.vacuum_pages:
+                        break
+                    time.sleep(self.pause)
+            run['rows_purged'] = sum(run['rows'].values())
+            run['duration_s'] = round(time.perf_counter() - started, 3)
+            run['lock_ms_total'] = round(run['lock_ms_total'], 3)
+            run['lock_ms_max'] = round(run['lock_ms_max'], 3)
+            run['finished_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            self.counts['runs'] += 1
+            self.counts['rows_purged'] += run['rows_purged']
+            self.counts['pages_freed'] += run['pages_freed']
+            self.last_run = run
+            if run['rows_purged'] or run['pages_freed']:
+                log.info(f"🧹 Retention: xóa {run['rows_purged']} dòng trong {run['chunks']} đoạn, "
+                         f"giải phóng {run['pages_freed']} trang, lock tối đa {run['lock_ms_max']} ms")
+            return run
+
+    def purge(self, table, key, cutoff, run):
+        """Xóa các dòng ``key < cutoff`` của một bảng theo từng đoạn; trả về số dòng đã xóa."""
+        purged = 0
+        last_key = None
+        while not self.stopping:
+            after = '' if last_key is None else f' AND {key} > ?'
+            bounds = (cutoff,) if last_key is None else (cutoff, last_key)
+            # Khóa của dòng cuối đoạn (đọc qua index, không giữ lock ghi)
+            with self.db.read() as cursor:
+                row = cursor.execute(f'SELECT {key} FROM {table} WHERE {key} < ?{after} '
+                                     f'ORDER BY {key} LIMIT 1 OFFSET ?', bounds + (self.chunk_rows - 1,)).fetchone()
+            with self.db.write() as cursor:
+                lock_started = time.perf_counter()
+                if row is None:
+                    cursor.execute(f'DELETE FROM {table} WHERE {key} < ?{after}', bounds)
+                else:
+                    cursor.execute(f'DELETE FROM {table} WHERE {key} <= ? AND {key} < ?{after}',
+                                   (row[0],) + bounds)
+                purged += cursor.rowcount
+            self.record_lock(run, lock_started)
+            run['chunks'] += 1
+            if row is None:
+                return purged
+            last_key = row[0]
+            time.sleep(self.pause)
+        return purged
+
+    @staticmethod
+    def record_lock(run, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        run['lock_ms_total'] += elapsed_ms
+        run['lock_ms_max'] = max(run['lock_ms_max'], elapsed_ms)
+
+    def stats(self):
+        return dict(self.counts, interval_s=self.interval, chunk_rows=self.chunk_rows, last_run=self.last_run)
+
+    def close(self, timeout=30):
+        """Dừng sau đoạn đang xóa (phần còn lại để lượt sau)."""
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Monitoring Queries
+Migration schema (PRAGMA user_version), bảng rollup theo phút/giờ/ngày, chính
+sách retention và các truy vấn theo khung thời gian của monitoring.db, kèm kiểm
+tra EXPLAIN QUERY PLAN để chắc chắn không quét toàn bảng
+"""
+
+import os
+import time
+import logging
+from collections import defaultdict
+
+log = logging.getLogger('xml_protector.monitoring')
+
+# Nhóm event chuẩn hóa (thay cho event_type LIKE '%xml%' không dùng được index)
+EVENT_CATEGORY_RULES = (
+    ('xml', 'xml'),
+    ('auto_update', 'update'),
+)
+DEFAULT_EVENT_CATEGORY = 'other'
+
+
+def event_category(event_type):
+    """Nhóm của một event_type (cùng quy tắc với backfill SQL trong migration)."""
+    event_type = (event_type or '').lower()
+    for needle, category in EVENT_CATEGORY_RULES:
+        if needle in event_type:
+            return category
+    return DEFAULT_EVENT_CATEGORY
+
+
+def event_category_sql(column='event_type'):
+    cases = ' '.join(f"WHEN lower({column}) LIKE '%{needle}%' THEN '{category}'"
+                     for needle, category in EVENT_CATEGORY_RULES)
+    return f"CASE {cases} ELSE '{DEFAULT_EVENT_CATEGORY}' END"
+
+
+# Độ mịn rollup -> độ dài prefix của timestamp 'YYYY-MM-DD HH:MM:SS' dùng làm bucket
+ROLLUP_GRANULARITIES = (('minute', 16), ('hour', 13), ('day', 10))
+
+# Rollup theo (loại, mức độ); chiều client tách sang client_activity: gộp chung ba chiều
+# thì gần như mỗi event một dòng rollup (hàng trăm client x loại x mức độ mỗi bucket)
+EVENT_ROLLUP_COLUMNS = 'event_type, severity, event_category'
+PERFORMANCE_ROLLUP_FIELDS = (
+    # (cột rollup, biểu thức gộp khi upsert, biểu thức khi backfill từ performance_stats)
+    ('samples', 'samples + excluded.samples', 'COUNT(*)'),
+    ('cpu_sum', 'cpu_sum + excluded.cpu_sum', 'SUM(cpu_percent)'),
+    ('cpu_max', 'MAX(cpu_max, excluded.cpu_max)', 'MAX(cpu_percent)'),
+    ('memory_sum', 'memory_sum + excluded.memory_sum', 'SUM(memory_percent)'),
+    ('memory_max', 'MAX(memory_max, excluded.memory_max)', 'MAX(memory_percent)'),
+    ('disk_sum', 'disk_sum + excluded.disk_sum', 'SUM(disk_usage)'),
+    ('disk_max', 'MAX(disk_max, excluded.disk_max)', 'MAX(disk_usage)'),
+    ('connections_max', 'MAX(connections_max, excluded.connections_max)', 'MAX(active_connections)'),
+)
+# Số liệu xử lý XML trong mỗi tick lấy mẫu (schema v3): cột performance_stats, rollup cộng dồn cùng tên
+THROUGHPUT_COLUMNS = ('events_seen', 'files_parsed', 'matches', 'restores', 'bytes_read', 'bytes_written')
+THROUGHPUT_ROLLUP_FIELDS = tuple((column, f'{column} + excluded.{column}', f'SUM({column})')
+                                 for column in THROUGHPUT_COLUMNS)
+
+
+def rollup_schema():
+    """Bảng rollup (WITHOUT ROWID, khóa chính bắt đầu bằng bucket) + backfill từ dữ liệu thô."""
+    statements = []
+    perf_columns = ', '.join(f'{name} REAL' for name, _, _ in PERFORMANCE_ROLLUP_FIELDS)
+    for granularity, length in ROLLUP_GRANULARITIES:
+        statements += [
+            f'''CREATE TABLE IF NOT EXISTS event_rollup_{granularity} (
+                bucket TEXT NOT NULL, event_type TEXT NOT NULL, severity TEXT NOT NULL,
+                event_category TEXT, count INTEGER NOT NULL,
+                PRIMARY KEY (bucket, event_type, severity)) WITHOUT ROWID''',
+            f'''INSERT INTO event_rollup_{granularity} (bucket, {EVENT_ROLLUP_COLUMNS}, count)
+                SELECT substr(timestamp, 1, {length}), event_type, COALESCE(severity, ''), event_category, COUNT(*)
+                FROM security_events GROUP BY 1, 2, 3''',
+            f'''CREATE TABLE IF NOT EXISTS performance_rollup_{granularity} (
+                bucket TEXT PRIMARY KEY, {perf_columns}) WITHOUT ROWID''',
+            f'''INSERT INTO performance_rollup_{granularity}
+                SELECT substr(timestamp, 1, {length}), {', '.join(expr for _, _, expr in PERFORMANCE_ROLLUP_FIELDS)}
+                FROM performance_stats GROUP BY 1''',
+        ]
+    # Khung báo cáo luôn kết thúc ở hiện tại: client có event trong khung <=> last_seen >= mốc bắt đầu
+    statements += [
+        '''CREATE TABLE IF NOT EXISTS client_activity (
+            client_id TEXT PRIMARY KEY, first_seen TEXT NOT NULL, last_seen TEXT NOT NULL,
+            events INTEGER NOT NULL)''',
+        '''INSERT INTO client_activity (client_id, first_seen, last_seen, events)
+            SELECT client_id, MIN(timestamp), MAX(timestamp), COUNT(*)
+            FROM security_events WHERE client_id IS NOT NULL GROUP BY client_id''',
+        'CREATE INDEX IF NOT EXISTS idx_client_activity_last_seen ON client_activity(last_seen)',
+    ]
+    return tuple(statements)
+
+
+# Mỗi migration: (version, danh sách câu lệnh). Chạy lần lượt trong transaction ghi.
+MIGRATIONS = (
+    (1, (
+        'ALTER TABLE security_events ADD COLUMN event_category TEXT',
+        f'UPDATE security_events SET event_category = {event_category_sql()}',
+        'CREATE INDEX IF NOT EXISTS idx_security_events_ts_severity ON security_events(timestamp, severity)',
+        'CREATE INDEX IF NOT EXISTS idx_security_events_type_ts ON security_events(event_type, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_security_events_category_ts ON security_events(event_category, timestamp)',
+        # Covering index cho dashboard và báo cáo hiệu năng (không phải đọc bảng)
+        'CREATE INDEX IF NOT EXISTS idx_performance_stats_ts ON performance_stats'
+        '(timestamp, cpu_percent, memory_percent, disk_usage, active_connections)',
+        'CREATE INDEX IF NOT EXISTS idx_system_metrics_ts ON system_metrics(timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_update_logs_ts ON update_logs(timestamp)',
+        'ANALYZE',
+    )),
+    (2, rollup_schema()),
+    (3, tuple(f'ALTER TABLE performance_stats ADD COLUMN {column} INTEGER' for column in THROUGHPUT_COLUMNS)
+        + tuple(f'ALTER TABLE performance_rollup_{granularity} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0'
+                for granularity, _ in ROLLUP_GRANULARITIES for column in THROUGHPUT_COLUMNS)),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(cursor):
+    """Áp dụng các migration còn thiếu; trả về (version cũ, version mới)."""
+    current = cursor.execute('PRAGMA user_version').fetchone()[0]
+    for version, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f'PRAGMA user_version = {version}')
+        log.info(f"🗄️ Monitoring schema v{version} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+    return current, max(current, SCHEMA_VERSION)
+
+
+def since(seconds):
+    """Mốc thời gian cùng định dạng với CURRENT_TIMESTAMP (UTC, 'YYYY-MM-DD HH:MM:SS')."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - seconds))
+
+
+def update_rollups(cursor, events=(), performance=()):
+    """Cộng dồn một lô dòng thô vào các bảng rollup (gọi trong transaction ghi của lô).
+
+    ``events``: (timestamp, event_type, event_category, severity, client_id, ...)
+    ``performance``: (timestamp, cpu, memory, disk, network_io, active_connections,
+    xml_files_processed, *THROUGHPUT_COLUMNS)
+    """
+    performance_fields = PERFORMANCE_ROLLUP_FIELDS + THROUGHPUT_ROLLUP_FIELDS
+    clients = {}
+    for timestamp, _, _, _, client_id, *_ in events:
+        if client_id is not None:
+            first, last, count = clients.get(client_id, (timestamp, timestamp, 0))
+            clients[client_id] = (min(first, timestamp), max(last, timestamp), count + 1)
+    if clients:
+        cursor.executemany('''
+            INSERT INTO client_activity (client_id, first_seen, last_seen, events) VALUES (?, ?, ?, ?)
+            ON CONFLICT (client_id) DO UPDATE SET first_seen = MIN(first_seen, excluded.first_seen),
+                last_seen = MAX(last_seen, excluded.last_seen), events = events + excluded.events
+        ''', [(client_id,) + values for client_id, values in clients.items()])
+
+    for granularity, length in ROLLUP_GRANULARITIES:
+        if events:
+            counts = defaultdict(int)
+            for timestamp, event_type, category, severity, *_ in events:
+                counts[(timestamp[:length], event_type, severity or '', category)] += 1
+            cursor.executemany(f'''
+                INSERT INTO event_rollup_{granularity} (bucket, {EVENT_ROLLUP_COLUMNS}, count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (bucket, event_type, severity) DO UPDATE SET count = count + excluded.count
+            ''', [key + (count,) for key, count in counts.items()])
+        if performance:
+            buckets = {}
+            for timestamp, cpu, memory, disk, _, connections, _, *throughput in performance:
+                values = (1, cpu, cpu, memory, memory, disk, disk, connections) + tuple(
+                    value or 0 for value in throughput)
+                current = buckets.get(timestamp[:length])
+                if current is None:
+                    buckets[timestamp[:length]] = list(values)
+                    continue
+                for index, (name, _, _) in enumerate(performance_fields):
+                    if name.endswith('_max'):
+                        current[index] = max(current[index], values[index])
+                    else:
+                        current[index] += values[index]
+            names = ', '.join(name for name, _, _ in performance_fields)
+            updates = ', '.join(f'{name} = {merge}' for name, merge, _ in performance_fields)
+            cursor.executemany(f'''
+                INSERT INTO performance_rollup_{granularity} (bucket, {names})
+                VALUES (?{', ?' * len(performance_fields)})
+                ON CONFLICT (bucket) DO UPDATE SET {updates}
+            ''', [(bucket,) + tuple(values) for bucket, values in buckets.items()])
+
+
+def rollup_start_granularity(since_time, kind='event'):
+    """Bảng rollup mịn nhất (minute/hour/day) còn giữ bucket chứa since_time theo retention hiện tại."""
+    days = retention_days()
+    for granularity, _ in ROLLUP_GRANULARITIES[:2]:
+        keep = days.get(f'{kind}_rollup_{granularity}')
+        if keep is None or since_time >= since(keep * 86400):
+            return granularity
+    return 'day'
+
+
+def rollup_window_start(since_time, kind='event'):
+    """Mốc bắt đầu thực tế của rollup_ranges: since_time làm tròn xuống theo bucket đầu tiên."""
+    length = dict(ROLLUP_GRANULARITIES)[rollup_start_granularity(since_time, kind)]
+    return since_time[:length] + '0000-00-00 00:00:00'[length:]
+
+
+def rollup_ranges(since_time, kind='event'):
+    """Chia [since_time, hiện tại] thành các khoảng trên bảng thô nhất có thể.
+
+    Các ngày sau ngày bắt đầu đọc từ bảng ngày, các giờ còn lại của ngày bắt
+    đầu từ bảng giờ, các phút còn lại của giờ bắt đầu từ bảng phút (độ phân
+    giải nhỏ nhất là một phút). Khi bảng phút/giờ đã bị retention dọn tới
+    mốc bắt đầu, phần đầu lấy nguyên bucket giờ/ngày chứa mốc đó (xem
+    rollup_window_start). Trả về [(bảng, điều kiện bucket, tham số)].
+    """
+    minute, hour, day = since_time[:16], since_time[:13], since_time[:10]
+    start = rollup_start_granularity(since_time, kind)
+    if start == 'day':
+        return (('day', 'bucket >= ?', (day,)),)
+    if start == 'hour':
+        return (
+            ('day', 'bucket > ?', (day,)),
+            ('hour', 'bucket >= ? AND bucket < ?', (hour, day + ' 99')),
+        )
+    return (
+        ('day', 'bucket > ?', (day,)),
+        ('hour', 'bucket > ? AND bucket < ?', (hour, day + ' 99')),
+        ('minute', 'bucket >= ? AND bucket < ?', (minute, hour + ':99')),
+    )
+
+
+def rollup_source(kind, columns, since_time):
+    """(SQL con UNION ALL trên các bảng rollup, tham số) cho khung thời gian bắt đầu từ since_time."""
+    if kind == 'client':
+        # client_activity không chia bucket: last_seen đủ để lọc, chính xác tới từng giây
+        return 'SELECT client_id FROM client_activity WHERE last_seen >= ?', (since_time,)
+    parts, params = [], []
+    for granularity, condition, values in rollup_ranges(since_time, kind):
+        parts.append(f'SELECT {columns} FROM {kind}_rollup_{granularity} WHERE {condition}')
+        params.extend(values)
+    return ' UNION ALL '.join(parts), tuple(params)
+
+
+def trend_granularity(seconds):
+    """Bảng thô nhất vẫn cho đủ điểm trên biểu đồ (ít nhất ~2 bucket)."""
+    if seconds >= 2 * 86400:
+        return 'day'
+    if seconds >= 2 * 3600:
+        return 'hour'
+    return 'minute'
+
+
+# Số ngày giữ mặc định theo bảng (None = giữ mãi), ghi đè bằng XML_PROTECTOR_RETENTION_<BẢNG>_DAYS.
+# Rollup phút/giờ bị xóa trước thì báo cáo dài bắt đầu từ đầu giờ/ngày chứa mốc (rollup_window_start).
+RETENTION_DAYS = {
+    'security_events': 30,
+    'performance_stats': 7,
+    'system_metrics': 7,
+    'update_logs': 90,
+    'event_rollup_minute': 3,
+    'performance_rollup_minute': 3,
+    'event_rollup_hour': 90,
+    'performance_rollup_hour': 90,
+    'event_rollup_day': None,
+    'performance_rollup_day': None,
+}
+# Bảng thô -> rollup ngày chứa số liệu của nó (được cập nhật cùng transaction khi ghi)
+ROLLED_UP_INTO = {'security_events': 'event_rollup_day', 'performance_stats': 'performance_rollup_day'}
+
+
+def retention_days():
+    days = {}
+    for table, default in RETENTION_DAYS.items():
+        value = os.getenv(f'XML_PROTECTOR_RETENTION_{table.upper()}_DAYS')
+        if value is None:
+            days[table] = default
+        else:
+            days[table] = int(value) if value.strip().lower() not in ('', 'none', '0') else None
+    return days
+
+
+def retention_plan(overrides=None):
+    """[(bảng, cột khóa thời gian, mốc cắt)] cho lần dọn dẹp hiện tại; khóa < mốc cắt thì bị xóa.
+
+    Bảng thô chỉ được dọn khi rollup ngày của nó giữ lâu hơn, để số liệu báo
+    cáo không mất cùng với dữ liệu thô. ``overrides``: {bảng: số ngày} thay
+    cho cấu hình của lượt này.
+    """
+    days = retention_days()
+    days.update(overrides or {})
+    lengths = dict(ROLLUP_GRANULARITIES)
+    plan = []
+    for table, keep in days.items():
+        if keep is None:
+            continue
+        rollup = ROLLED_UP_INTO.get(table)
+        if rollup and days[rollup] is not None and days[rollup] < keep:
+            log.warning(f"⚠️ Bỏ qua retention {table}: {rollup} chỉ giữ {days[rollup]} ngày (< {keep})")
+            continue
+        cutoff = since(keep * 86400)
+        if '_rollup_' in table:
+            # Cắt theo bucket đầy đủ: bucket chứa mốc cắt vẫn còn dữ liệu mới hơn
+            plan.append((table, 'bucket', cutoff[:lengths[table.rsplit('_', 1)[1]]]))
+        else:
+            plan.append((table, 'timestamp', cutoff))
+    return plan
+
+
+# Tên truy vấn -> (SQL, index phải được dùng)
+QUERIES = {
+    'recent_performance': ('''
+        SELECT timestamp, cpu_percent, memory_percent, disk_usage, active_connections
+        FROM performance_stats
+        WHERE timestamp > ?
+        ORDER BY timestamp DESC
+        LIMIT 100
+    ''', 'idx_performance_stats_ts'),
+    'severity_counts': ('''
+        SELECT severity, COUNT(*) AS count
+        FROM security_events
+        WHERE timestamp > ?
+        GROUP BY severity
+        ORDER BY count DESC
+    ''', 'idx_security_events_ts_severity'),
+    'category_count': ('''
+        SELECT COUNT(*)
+        FROM security_events
+        WHERE event_category = ? AND timestamp > ?
+    ''', 'idx_security_events_category_ts'),
+    'event_overview': ('''
+        SELECT COUNT(*) AS total_events, COUNT(DISTINCT client_id) AS unique_clients
+        FROM security_events
+        WHERE timestamp > ?
+    ''', 'idx_security_events_ts_severity'),
+    'top_event_types': ('''
+        SELECT event_type, COUNT(*) AS count
+        FROM security_events
+        WHERE timestamp > ?
+        GROUP BY event_type
+        ORDER BY count DESC
+        LIMIT 10
+    ''', 'idx_security_events_type_ts'),
+    'performance_summary': ('''
+        SELECT AVG(cpu_percent), AVG(memory_percent), AVG(disk_usage), MAX(active_connections)
+        FROM performance_stats
+        WHERE timestamp > ?
+    ''', 'idx_performance_stats_ts'),
+    # Keyset theo (timestamp, id): mỗi trang bắt đầu tìm trong index từ dòng cuối của trang trước,
+    # không OFFSET nên trang thứ N tốn như trang đầu
+    'export_events_page': ('''
+        SELECT id, timestamp, event_type, event_category, severity, client_id, source_ip, description, raw_data
+        FROM security_events
+        WHERE timestamp >= ? AND timestamp <= ? AND (timestamp > ? OR id > ?)
+        ORDER BY timestamp, id
+        LIMIT ?
+    ''', 'idx_security_events_ts_severity'),
+}
+
+# Báo cáo dài ngày đọc từ rollup: mỗi {N} trong SQL là UNION ALL các bảng phút/giờ/ngày
+# của nguồn thứ N (rollup_source)
+EVENT_SOURCE = ('event', EVENT_ROLLUP_COLUMNS + ', count')
+CLIENT_SOURCE = ('client', 'client_id')
+PERFORMANCE_SOURCE = ('performance', 'samples, cpu_sum, memory_sum, disk_sum, connections_max')
+THROUGHPUT_SOURCE = ('performance', ', '.join(THROUGHPUT_COLUMNS))
+
+ROLLUP_QUERIES = {
+    'rollup_event_overview': ((EVENT_SOURCE, CLIENT_SOURCE), '''
+        SELECT (SELECT SUM(count) FROM ({0})), (SELECT COUNT(*) FROM ({1}))
+    '''),
+    'rollup_severity_counts': ((EVENT_SOURCE,), '''
+        SELECT severity, SUM(count) AS total FROM ({0}) GROUP BY severity ORDER BY total DESC
+    '''),
+    'rollup_top_event_types': ((EVENT_SOURCE,), '''
+        SELECT event_type, SUM(count) AS total FROM ({0}) GROUP BY event_type ORDER BY total DESC LIMIT 10
+    '''),
+    'rollup_category_count': ((EVENT_SOURCE,), '''
+        SELECT COALESCE(SUM(count), 0) FROM ({0}) WHERE event_category = ?
+    '''),
+    'rollup_performance_summary': ((PERFORMANCE_SOURCE,), '''
+        SELECT SUM(cpu_sum) / SUM(samples), SUM(memory_sum) / SUM(samples), SUM(disk_sum) / SUM(samples),
+               MAX(connections_max)
+        FROM ({0})
+    '''),
+    'rollup_throughput_totals': ((THROUGHPUT_SOURCE,), f'''
+        SELECT {', '.join(f'COALESCE(SUM({column}), 0)' for column in THROUGHPUT_COLUMNS)} FROM ({{0}})
+    '''),
+}
+
+# Tham số mẫu cho EXPLAIN QUERY PLAN
+SAMPLE_PARAMS = {'category_count': ('xml', '1970-01-01 00:00:00'), 'rollup_category_count': ('xml',),
+                 'export_events_page': ('1970-01-01 00:00:00', '9999-12-31 23:59:59', '1970-01-01 00:00:00', 0, 5000)}
+
+
+def fetch(cursor, name, *params):
+    cursor.execute(QUERIES[name][0], params)
+    return cursor.fetchall()
+
+
+def rollup_sql(name, since_time):
+    sources, template = ROLLUP_QUERIES[name]
+    subqueries, params = [], ()
+    for kind, columns in sources:
+        source, source_params = rollup_source(kind, columns, since_time)
+        subqueries.append(source)
+        params += source_params
+    return template.format(*subqueries), params
+
+
+def fetch_rollup(cursor, name, since_time, *params):
+    """Chạy truy vấn báo cáo trên rollup cho khung thời gian bắt đầu từ since_time."""
+    sql, range_params = rollup_sql(name, since_time)
+    cursor.execute(sql, range_params + params)
+    return cursor.fetchall()
+
+
+def fetch_trend(cursor, kind, seconds):
+    """Chuỗi theo thời gian trên bảng rollup thô nhất phù hợp với độ dài khung."""
+    granularity = trend_granularity(seconds)
+    start = since(seconds)[:dict(ROLLUP_GRANULARITIES)[granularity]]
+    if kind == 'event':
+        sql = f'''SELECT bucket, SUM(count), SUM(CASE WHEN severity IN ('high', 'critical') THEN count ELSE 0 END)
+                  FROM event_rollup_{granularity} WHERE bucket >= ? GROUP BY bucket ORDER BY bucket'''
+    else:
+        sql = f'''SELECT bucket, cpu_sum / samples, memory_sum / samples, disk_sum / samples, connections_max,
+                         {', '.join(THROUGHPUT_COLUMNS)}
+                  FROM performance_rollup_{granularity} WHERE bucket >= ? ORDER BY bucket'''
+    return granularity, cursor.execute(sql, (start,)).fetchall()
+
+
+def explain(cursor, name):
+    """Các dòng chi tiết của EXPLAIN QUERY PLAN cho một truy vấn."""
+    sample_since = '1970-01-01 00:00:00'
+    if name in ROLLUP_QUERIES:
+        sql, params = rollup_sql(name, sample_since)
+        params += SAMPLE_PARAMS.get(name, ())
+    else:
+        sql = QUERIES[name][0]
+        params = SAMPLE_PARAMS.get(name, (sample_since,))
+    return [row[-1] for row in cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+
+
+def check_query_plans(cursor):
+    """Kiểm tra mọi truy vấn dùng đúng index; trả về {tên: {'ok', 'plan'}} và log cảnh báo nếu quét bảng."""
+    report = {}
+    # Bảng rollup WITHOUT ROWID: tìm theo khóa chính (bucket)
+    expected = dict({name: index_name for name, (_, index_name) in QUERIES.items()},
+                    **{name: 'PRIMARY KEY' for name in ROLLUP_QUERIES})
+    for name, index_name in expected.items():
+        plan = explain(cursor, name)
+        # "SCAN (subquery-N)"/"SCAN CONSTANT ROW" chỉ là duyệt kết quả trung gian, không phải quét bảng
+        ok = any(index_name in detail for detail in plan) and not any(
+            detail.startswith('SCAN ') and not detail.startswith(('SCAN (', 'SCAN CONSTANT ROW'))
+            and 'INDEX' not in detail for detail in plan)
+        report[name] = {'ok': ok, 'plan': plan}
+        if not ok:
+            log.warning(f"⚠️ Truy vấn monitoring '{name}' không dùng {index_name}: {' | '.join(plan)}")
+    return report
@@ -9,103 +9,257 @@ import os
 import sys
 import json
 import time
-import sqlite3
 import logging
-import requests
 import threading
 import psutil
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 from collections import defaultdict, deque
 
+import monitoring_queries
+from monitoring_db import MonitoringDatabase, BatchWriter, RetentionScheduler
+from runtime_metrics import TimeSeriesRing, CounterDelta, openmetrics_family
+from compliance_export import export_security_events
+
 try:
     from security_manager import SecurityManager
 except ImportError:
     SecurityManager = None
 
+# Timestamp do caller gán (UTC, cùng định dạng CURRENT_TIMESTAMP) để dòng thô và rollup khớp nhau
+INSERT_PERFORMANCE_STATS = f'''
+    INSERT INTO performance_stats
+    (timestamp, cpu_percent, memory_percent, disk_usage, network_io, active_connections, xml_files_processed,
+     {', '.join(monitoring_queries.THROUGHPUT_COLUMNS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?{', ?' * len(monitoring_queries.THROUGHPUT_COLUMNS)})
+'''
+
+INSERT_SECURITY_EVENT = '''
+    INSERT INTO security_events
+    (timestamp, event_type, event_category, severity, client_id, description, raw_data)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_SYSTEM_METRIC = '''
+    INSERT INTO system_metrics
+    (metric_type, metric_name, metric_value, client_id, additional_data)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# Process được theo dõi: tên chứa một trong các chuỗi này
+TRACKED_PROCESS_NAMES = ('xml', 'protector')
+
+# Cột throughput của performance_stats -> counter của runtime (MetricsRegistry)
+THROUGHPUT_COUNTERS = {
+    'events_seen': 'events_seen',
+    'files_parsed': 'files_parsed',
+    'matches': 'matches',
+    'restores': 'files_protected',
+    'bytes_read': 'bytes_read',
+    'bytes_written': 'bytes_written',
+}
+
+# Các cột của ring buffer real-time metrics
+REALTIME_METRIC_FIELDS = ('cpu_percent', 'memory_percent', 'disk_usage', 'active_connections',
+                          'own_cpu_percent', 'own_rss_mb', 'sample_ms') + tuple(THROUGHPUT_COUNTERS)
+
+
+class SystemSampler:
+    """Lấy mẫu system metrics không chặn.
+
+    CPU lấy theo delta giữa hai lần gọi (``cpu_percent(None)``) thay vì ngủ
+    1 giây. Mỗi tick chỉ liệt kê PID; chỉ PID mới xuất hiện mới bị đọc tên
+    để xét có theo dõi không, PID đã thoát thì bỏ khỏi cache. Process của
+    chính XML Protector được đo trực tiếp qua ``psutil.Process()``.
+    """
+
+    def __init__(self, names=TRACKED_PROCESS_NAMES, disk_path=None):
+        self.names = tuple(name.lower() for name in names)
+        self.disk_path = disk_path or os.path.abspath(os.sep)
+        self.known_pids = set()
+        self.tracked = {}  # pid -> psutil.Process (giữ trạng thái delta CPU giữa các tick)
+        self.own = psutil.Process()
+        self.sample_ms = deque(maxlen=256)
+        self.max_sample_ms = 0.0
+        self.counts = {'ticks': 0, 'rescans': 0, 'processes_inspected': 0}
+        # Lần gọi đầu của cpu_percent(None) luôn trả 0: mồi trước để tick đầu có số liệu thật
+        psutil.cpu_percent(interval=None)
+        self.own.cpu_percent(interval=None)
+        self.refresh_processes()
+
+    def matches(self, name):
+        name = (name or '').lower()
+        return any(needle in name for needle in self.names)
+
+    def refresh_processes(self):
+        """Cập nhật tập process theo dõi nếu có PID xuất hiện/thoát."""
+        pids = set(psutil.pids())
+        if pids == self.known_pids:
+            return
+        self.counts['rescans'] += 1
+        for pid in self.known_pids - pids:
+            self.tracked.pop(pid, None)
+        for pid in pids - self.known_pids:
+            self.counts['processes_inspected'] += 1
+            try:
+                proc = psutil.Process(pid)
+                if pid != self.own.pid and self.matches(proc.name()):
+                    proc.cpu_percent(interval=None)
+                    self.tracked[pid] = proc
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+        self.known_pids = pids
+
+    def sample(self):
+        started = time.perf_counter()
+        self.refresh_processes()
+        processes = []
+        for pid, proc in list(self.tracked.items()):
+            try:
+                with proc.oneshot():
+                    processes.append({'pid': pid, 'name': proc.name(), 'cpu_percent': proc.cpu_percent(None),
+                                      'memory_percent': proc.memory_percent()})
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                self.tracked.pop(pid, None)
+        with self.own.oneshot():
+            own = {'pid': self.own.pid, 'cpu_percent': self.own.cpu_percent(None),
+                   'rss_mb': round(self.own.memory_info().rss / 1024 / 1024, 2),
+                   'threads': self.own.num_threads()}
+        net_io = psutil.net_io_counters()
+        sample = {
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': psutil.virtual_memory().percent,
+            'disk_usage': psutil.disk_usage(self.disk_path).percent,
+            'network': {
+                'bytes_sent': net_io.bytes_sent,
+                'bytes_recv': net_io.bytes_recv,
+                'packets_sent': net_io.packets_sent,
+                'packets_recv': net_io.packets_recv
+            } if net_io else {},
+            'processes': processes,
+            'own_process': own,
+        }
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.counts['ticks'] += 1
+        self.sample_ms.append(elapsed_ms)
+        self.max_sample_ms = max(self.max_sample_ms, elapsed_ms)
+        sample['sample_ms'] = round(elapsed_ms, 3)
+        return sample
+
+    def stats(self):
+        recent = sorted(self.sample_ms)
+        return dict(
+            self.counts,
+            tracked_processes=len(self.tracked),
+            known_pids=len(self.known_pids),
+            sample_ms_last=round(self.sample_ms[-1], 3) if self.sample_ms else None,
+            sample_ms_p95=round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else None,
+            sample_ms_max=round(self.max_sample_ms, 3),
+        )
+
+
 class AdvancedMonitoringSystem:
     """Hệ thống giám sát nâng cao cho XML Protector."""
     
-    def __init__(self):
+    def __init__(self, metrics=None):
         self.app_dir = Path(os.getenv('APPDATA', Path.home())) / 'XMLProtectorMonitoring'
         self.app_dir.mkdir(parents=True, exist_ok=True)
         
         self.db_file = self.app_dir / 'monitoring.db'
-        self.metrics_buffer = deque(maxlen=1000)  # Buffer cho real-time metrics
+        # Ring buffer real-time metrics (mặc định 2880 mẫu = 24 giờ với tick 30 giây)
+        self.metrics_buffer = TimeSeriesRing(REALTIME_METRIC_FIELDS,
+                                             int(os.getenv('XML_PROTECTOR_METRICS_SAMPLES', '2880')))
         self.alert_queue = deque(maxlen=100)      # Queue cho alerts
+        # Số security event theo (loại, mức độ) từ lúc khởi động, cho endpoint metrics (không đọc DB)
+        self.event_counts = defaultdict(int)
+        self.event_counts_lock = threading.Lock()
         self.running = True
         
+        # Một connection ghi (WAL) + pool connection chỉ đọc, dùng chung cho mọi method
+        self.db = MonitoringDatabase(self.db_file)
         self.init_database()
         self.init_logging()
+        # Ghi write-behind: caller chỉ xếp hàng, một thread ghi theo lô
+        self.ingest = BatchWriter(self.db, on_batch=self.update_rollups)
+        # Retention theo từng bảng, xóa từng đoạn nhỏ trong thread riêng
+        self.retention = RetentionScheduler(self.db, monitoring_queries.retention_plan).start()
+        self.sampler = SystemSampler()
+        # Counter xử lý XML của runtime (MetricsRegistry): mỗi tick ghi phần tăng thêm
+        # Tính từ 0: runtime có thể tạo monitoring muộn (lần xuất metrics đầu tiên), counter đã chạy từ lúc boot
+        self.throughput = CounterDelta(metrics, THROUGHPUT_COUNTERS.values(), from_zero=True) if metrics else None
         
     def init_database(self):
         """Khởi tạo database cho monitoring."""
         try:
-            conn = sqlite3.connect(str(self.db_file))
-            cursor = conn.cursor()
-            
-            # Bảng system metrics
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS system_metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    metric_type TEXT NOT NULL,
-                    metric_name TEXT NOT NULL,
-                    metric_value REAL,
-                    client_id TEXT,
-                    additional_data TEXT
-                )
-            ''')
-            
-            # Bảng performance stats
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS performance_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    cpu_percent REAL,
-                    memory_percent REAL,
-                    disk_usage REAL,
-                    network_io TEXT,
-                    active_connections INTEGER,
-                    xml_files_processed INTEGER
-                )
-            ''')
-            
-            # Bảng security events
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS security_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    event_type TEXT NOT NULL,
-                    severity TEXT DEFAULT 'info',
-                    client_id TEXT,
-                    source_ip TEXT,
-                    description TEXT,
-                    raw_data TEXT
-                )
-            ''')
-            
-            # Bảng auto-update logs
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS update_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    update_type TEXT NOT NULL,
-                    client_id TEXT,
-                    old_version TEXT,
-                    new_version TEXT,
-                    status TEXT,
-                    error_message TEXT
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
-            logging.info("✅ Monitoring database initialized")
+            with self.db.write() as cursor:
+                self.create_tables(cursor)
+                _, schema_version = monitoring_queries.migrate(cursor)
+            # Cảnh báo sớm nếu truy vấn dashboard/báo cáo quay về quét toàn bảng
+            with self.db.read() as cursor:
+                self.query_plans = monitoring_queries.check_query_plans(cursor)
+            logging.info(f"✅ Monitoring database initialized (schema v{schema_version})")
             
         except Exception as e:
             logging.error(f"❌ Error initializing monitoring database: {e}")
     
+    @staticmethod
+    def create_tables(cursor):
+        """Tạo các bảng monitoring nếu chưa có."""
+        # Bảng system metrics
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS system_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                metric_type TEXT NOT NULL,
+                metric_name TEXT NOT NULL,
+                metric_value REAL,
+                client_id TEXT,
+                additional_data TEXT
+            )
+        ''')
+        
+        # Bảng performance stats
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS performance_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                cpu_percent REAL,
+                memory_percent REAL,
+                disk_usage REAL,
+                network_io TEXT,
+                active_connections INTEGER,
+                xml_files_processed INTEGER
+            )
+        ''')
+        
+        # Bảng security events
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS security_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                event_type TEXT NOT NULL,
+                severity TEXT DEFAULT 'info',
+                client_id TEXT,
+                source_ip TEXT,
+                description TEXT,
+                raw_data TEXT
+            )
+        ''')
+        
+        # Bảng auto-update logs
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS update_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                update_type TEXT NOT NULL,
+                client_id TEXT,
+                old_version TEXT,
+                new_version TEXT,
+                status TEXT,
+                error_message TEXT
+            )
+        ''')
+    
     def init_logging(self):
         """Khởi tạo logging cho monitoring system."""
         log_file = self.app_dir / 'monitoring.log'
@@ -119,58 +273,39 @@ class AdvancedMonitoringSystem:
         )
     
     def collect_system_metrics(self):
-        """Thu thập system metrics."""
+        """Thu thập system metrics (không chặn, CPU theo delta từ tick trước)."""
         try:
-            # CPU và Memory
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            # Network I/O
-            net_io = psutil.net_io_counters()
-            network_data = {
-                'bytes_sent': net_io.bytes_sent,
-                'bytes_recv': net_io.bytes_recv,
-                'packets_sent': net_io.packets_sent,
-                'packets_recv': net_io.packets_recv
-            }
-            
-            # Active processes
-            xml_processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-                try:
-                    if 'xml' in proc.info['name'].lower() or 'protector' in proc.info['name'].lower():
-                        xml_processes.append(proc.info)
-                except:
-                    continue
+            sample = self.sampler.sample()
+            timestamp = monitoring_queries.since(0)
+            deltas = self.throughput.take() if self.throughput else {}
+            throughput = {column: deltas.get(counter, 0) for column, counter in THROUGHPUT_COUNTERS.items()}
             
             # Lưu vào database
-            conn = sqlite3.connect(str(self.db_file))
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO performance_stats 
-                (cpu_percent, memory_percent, disk_usage, network_io, active_connections, xml_files_processed)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                cpu_percent,
-                memory.percent,
-                disk.percent,
-                json.dumps(network_data),
-                len(xml_processes),
-                0  # Will be updated by XML processing stats
+            self.ingest.submit(INSERT_PERFORMANCE_STATS, (
+                timestamp,
+                sample['cpu_percent'],
+                sample['memory_percent'],
+                sample['disk_usage'],
+                json.dumps(sample['network']),
+                len(sample['processes']),
+                throughput['files_parsed'],
+                *(throughput[column] for column in monitoring_queries.THROUGHPUT_COLUMNS)
             ))
-            
-            conn.commit()
-            conn.close()
+            own = sample['own_process']
+            self.ingest.submit_many(INSERT_SYSTEM_METRIC, [
+                ('own_process', name, own[name], None, None) for name in ('cpu_percent', 'rss_mb', 'threads')])
             
             # Add to real-time buffer
             metric = {
                 'timestamp': datetime.now(),
-                'cpu_percent': cpu_percent,
-                'memory_percent': memory.percent,
-                'disk_usage': disk.percent,
-                'active_connections': len(xml_processes)
+                'cpu_percent': sample['cpu_percent'],
+                'memory_percent': sample['memory_percent'],
+                'disk_usage': sample['disk_usage'],
+                'active_connections': len(sample['processes']),
+                'own_cpu_percent': own['cpu_percent'],
+                'own_rss_mb': own['rss_mb'],
+                'sample_ms': sample['sample_ms'],
+                **throughput
             }
             self.metrics_buffer.append(metric)
             
@@ -183,17 +318,11 @@ class AdvancedMonitoringSystem:
     def record_security_event(self, event_type, severity, client_id=None, description="", raw_data=None):
         """Ghi lại security event."""
         try:
-            conn = sqlite3.connect(str(self.db_file))
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO security_events 
-                (event_type, severity, client_id, description, raw_data)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (event_type, severity, client_id, description, json.dumps(raw_data) if raw_data else None))
-            
-            conn.commit()
-            conn.close()
+            self.ingest.submit(INSERT_SECURITY_EVENT, (
+                monitoring_queries.since(0), event_type, monitoring_queries.event_category(event_type),
+                severity, client_id, description, json.dumps(raw_data) if raw_data else None))
+            with self.event_counts_lock:
+                self.event_counts[(event_type, severity)] += 1
             
             # Add to alert queue nếu severity cao
             if severity in ['high', 'critical']:
@@ -206,127 +335,139 @@ class AdvancedMonitoringSystem:
                 }
                 self.alert_queue.append(alert)
                 
-            logging.info(f"🚨 Security event recorded: {event_type} ({severity})")
+            logging.debug(f"🚨 Security event queued: {event_type} ({severity})")
             
         except Exception as e:
             logging.error(f"❌ Error recording security event: {e}")
     
+    def record_runtime_metrics(self, snapshot, client_id=None):
+        """Ghi snapshot metrics của runtime (counters + latency theo stage) vào system_metrics."""
+        try:
+            rows = []
+            for name, value in snapshot.get('counters', {}).items():
+                rows.append(('runtime_counter', name, value, client_id, None))
+
+            for stage, hist in snapshot.get('histograms', {}).items():
+                if not hist.get('count'):
+                    continue
+                extra = json.dumps({'count': hist['count'], 'uptime_s': snapshot.get('uptime_s')})
+                for field in ('p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'mean_ms'):
+                    rows.append(('runtime_latency', f"{stage}_{field}", hist[field], client_id, extra))
+
+            self.ingest.submit_many(INSERT_SYSTEM_METRIC, rows)
+
+        except Exception as e:
+            logging.error(f"❌ Error recording runtime metrics: {e}")
+
     def get_real_time_stats(self, minutes=60):
         """Lấy thống kê real-time trong N phút gần nhất."""
         try:
-            conn = sqlite3.connect(str(self.db_file))
-            cursor = conn.cursor()
-            
-            since_time = datetime.now() - timedelta(minutes=minutes)
-            
-            # Performance stats
-            cursor.execute('''
-                SELECT timestamp, cpu_percent, memory_percent, disk_usage, active_connections
-                FROM performance_stats 
-                WHERE timestamp > ?
-                ORDER BY timestamp DESC
-                LIMIT 100
-            ''', (since_time,))
-            
-            perf_data = cursor.fetchall()
-            
-            # Security events
-            cursor.execute('''
-                SELECT COUNT(*) as count, severity
-                FROM security_events 
-                WHERE timestamp > ?
-                GROUP BY severity
-            ''', (since_time,))
-            
-            security_stats = dict(cursor.fetchall())
-            
-            # XML protection stats
-            cursor.execute('''
-                SELECT COUNT(*) as xml_events
-                FROM security_events 
-                WHERE timestamp > ? AND event_type LIKE '%xml%'
-            ''', (since_time,))
-            
-            xml_protection_count = cursor.fetchone()[0]
-            
-            conn.close()
+            since_time = monitoring_queries.since(minutes * 60)
+            with self.db.read() as cursor:
+                perf_data = monitoring_queries.fetch(cursor, 'recent_performance', since_time)
+                security_stats = dict(monitoring_queries.fetch(cursor, 'severity_counts', since_time))
+                xml_protection_count = monitoring_queries.fetch(cursor, 'category_count', 'xml', since_time)[0][0]
             
             return {
                 'performance_data': perf_data,
                 'security_stats': security_stats,
                 'xml_protection_count': xml_protection_count,
-                'real_time_metrics': list(self.metrics_buffer)[-20:],  # Last 20 metrics
-                'recent_alerts': list(self.alert_queue)[-10:]  # Last 10 alerts
+                'real_time_metrics': self.metrics_buffer.tail(20),  # Last 20 metrics
+                'metric_window': self.metrics_buffer.window_stats(minutes * 60),
+                'recent_alerts': list(self.alert_queue)[-10:],  # Last 10 alerts
+                'ingestion': self.get_ingestion_stats(),
+                'retention': self.get_retention_stats(),
+                'sampler': self.get_sampler_stats()
             }
             
         except Exception as e:
             logging.error(f"❌ Error getting real-time stats: {e}")
             return {}
     
+    @staticmethod
+    def update_rollups(cursor, grouped):
+        """Cập nhật rollup phút/giờ/ngày cho một lô (chạy trong transaction của lô)."""
+        monitoring_queries.update_rollups(cursor, grouped.get(INSERT_SECURITY_EVENT, ()),
+                                          grouped.get(INSERT_PERFORMANCE_STATS, ()))
+    
+    def get_ingestion_stats(self):
+        """Độ sâu hàng đợi ghi, số lô và độ trễ flush."""
+        return dict(self.ingest.stats(), db=self.db.stats())
+    
+    def get_sampler_stats(self):
+        """Chi phí mỗi tick lấy mẫu và số process đang theo dõi."""
+        return self.sampler.stats()
+    
+    def get_retention_stats(self):
+        """Số dòng đã xóa, trang đã giải phóng và thời gian giữ lock ghi của lượt retention gần nhất."""
+        return self.retention.stats()
+    
+    def openmetrics_lines(self):
+        """Metrics hệ thống, security event, hàng đợi ghi và retention dạng OpenMetrics (từ bộ nhớ)."""
+        lines = []
+        latest = self.metrics_buffer.tail(1)
+        if latest:
+            sample = latest[0]
+            for field, name, description in (
+                    ('cpu_percent', 'system_cpu_percent', "System CPU usage at the last sample"),
+                    ('memory_percent', 'system_memory_percent', "System memory usage at the last sample"),
+                    ('disk_usage', 'system_disk_usage_percent', "Disk usage at the last sample"),
+                    ('active_connections', 'tracked_processes', "Running XML/protector processes"),
+                    ('own_cpu_percent', 'process_cpu_percent', "CPU usage of this process")):
+                lines += openmetrics_family(f'xml_protector_{name}', 'gauge', [(None, sample[field])], description)
+            lines += openmetrics_family('xml_protector_process_resident_memory_bytes', 'gauge',
+                                        [(None, int(sample['own_rss_mb'] * 1024 * 1024))],
+                                        "Resident memory of this process")
+            lines += openmetrics_family('xml_protector_sampler_tick_seconds', 'gauge',
+                                        [(None, sample['sample_ms'] / 1000)], "Cost of the last system sample")
+
+        with self.event_counts_lock:
+            events = sorted(self.event_counts.items())
+        lines += openmetrics_family(
+            'xml_protector_security_events', 'counter',
+            [({'type': event_type, 'severity': severity or ''}, count) for (event_type, severity), count in events],
+            "Security events recorded since start")
+
+        ingest = self.ingest.stats()
+        lines += openmetrics_family('xml_protector_monitoring_queue_depth', 'gauge', [(None, ingest['queue_depth'])],
+                                    "Rows waiting for the monitoring DB writer")
+        lines += openmetrics_family('xml_protector_monitoring_rows_written', 'counter', [(None, ingest['written'])],
+                                    "Rows written to the monitoring DB")
+        lines += openmetrics_family('xml_protector_monitoring_rows_failed', 'counter',
+                                    [(None, ingest['failed_rows'])], "Rows lost in failed monitoring DB batches")
+        retention = self.retention.stats()
+        lines += openmetrics_family('xml_protector_retention_rows_purged', 'counter',
+                                    [(None, retention['rows_purged'])], "Rows deleted by monitoring retention")
+        return lines
+    
     def generate_compliance_report(self, days=30):
         """Tạo báo cáo compliance."""
         try:
-            conn = sqlite3.connect(str(self.db_file))
-            cursor = conn.cursor()
-            
-            since_date = datetime.now() - timedelta(days=days)
-            
-            # Tổng quan hoạt động
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_events,
-                    COUNT(DISTINCT client_id) as unique_clients
-                FROM security_events 
-                WHERE timestamp > ?
-            ''', (since_date,))
-            
-            overview = cursor.fetchone()
-            
-            # Events theo severity
-            cursor.execute('''
-                SELECT severity, COUNT(*) as count
-                FROM security_events 
-                WHERE timestamp > ?
-                GROUP BY severity
-                ORDER BY count DESC
-            ''', (since_date,))
-            
-            severity_breakdown = cursor.fetchall()
-            
-            # Top event types
-            cursor.execute('''
-                SELECT event_type, COUNT(*) as count
-                FROM security_events 
-                WHERE timestamp > ?
-                GROUP BY event_type
-                ORDER BY count DESC
-                LIMIT 10
-            ''', (since_date,))
-            
-            top_events = cursor.fetchall()
-            
-            # Performance summary
-            cursor.execute('''
-                SELECT 
-                    AVG(cpu_percent) as avg_cpu,
-                    AVG(memory_percent) as avg_memory,
-                    AVG(disk_usage) as avg_disk,
-                    MAX(active_connections) as max_connections
-                FROM performance_stats 
-                WHERE timestamp > ?
-            ''', (since_date,))
-            
-            performance_summary = cursor.fetchone()
-            
-            conn.close()
+            # Báo cáo phải gồm cả event còn trong hàng đợi
+            self.ingest.flush()
+            # Đọc từ rollup ngày/giờ/phút: chi phí không tăng theo số dòng thô
+            since_date = monitoring_queries.since(days * 86400)
+            with self.db.read() as cursor:
+                overview = monitoring_queries.fetch_rollup(cursor, 'rollup_event_overview', since_date)[0]
+                severity_breakdown = monitoring_queries.fetch_rollup(cursor, 'rollup_severity_counts', since_date)
+                top_events = monitoring_queries.fetch_rollup(cursor, 'rollup_top_event_types', since_date)
+                performance_summary = monitoring_queries.fetch_rollup(
+                    cursor, 'rollup_performance_summary', since_date)[0]
+                throughput = monitoring_queries.fetch_rollup(cursor, 'rollup_throughput_totals', since_date)[0]
             
             # Generate report
             report = {
                 'report_period': f"{days} days",
+                # Mốc thực tế (UTC) khi rollup phút/giờ của đầu khung đã bị retention dọn
+                'report_since': {
+                    'requested': since_date,
+                    'events': monitoring_queries.rollup_window_start(since_date, 'event'),
+                    'performance': monitoring_queries.rollup_window_start(since_date, 'performance'),
+                },
                 'generated_at': datetime.now().isoformat(),
                 'overview': {
-                    'total_events': overview[0] if overview else 0,
-                    'unique_clients': overview[1] if overview else 0
+                    'total_events': overview[0] or 0 if overview else 0,
+                    'unique_clients': overview[1] or 0 if overview else 0
                 },
                 'security': {
                     'severity_breakdown': dict(severity_breakdown),
@@ -337,7 +478,8 @@ class AdvancedMonitoringSystem:
                     'avg_memory_percent': round(performance_summary[1] or 0, 2),
                     'avg_disk_usage': round(performance_summary[2] or 0, 2),
                     'max_active_connections': performance_summary[3] or 0
-                }
+                },
+                'xml_processing': dict(zip(monitoring_queries.THROUGHPUT_COLUMNS, throughput))
             }
             
             # Save report
@@ -351,18 +493,57 @@ class AdvancedMonitoringSystem:
             logging.error(f"❌ Error generating compliance report: {e}")
             return None, None
     
+    def export_security_events(self, output_path=None, days=90, fmt=None, page_size=None, progress=None):
+        """Xuất mọi security event trong ``days`` ngày ra JSON Lines/CSV (gzip nếu đuôi .gz) cho audit.
+
+        Khác generate_compliance_report (chỉ tổng hợp top-10), file này có từng
+        dòng event; đọc theo trang keyset nên không giới hạn số dòng.
+        """
+        try:
+            self.ingest.flush()
+            if output_path is None:
+                output_path = self.app_dir / f"security_events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+            since_date, until_date = monitoring_queries.since(days * 86400), monitoring_queries.since(0)
+            # Ước lượng số dòng từ rollup (không đếm trên bảng thô) để tính ETA
+            with self.db.read() as cursor:
+                estimate = monitoring_queries.fetch_rollup(cursor, 'rollup_event_overview', since_date)[0][0]
+            page_size = page_size or int(os.getenv('XML_PROTECTOR_EXPORT_PAGE_SIZE', '5000'))
+            return export_security_events(self.db, output_path, since_date, until_date, fmt=fmt,
+                                          page_size=page_size, progress=progress, total=estimate)
+        except Exception as e:
+            logging.error(f"❌ Error exporting security events: {e}")
+            return None
+    
+    def get_trend_report(self, days=30):
+        """Xu hướng event và hiệu năng theo bucket (ngày/giờ/phút tùy độ dài khung)."""
+        try:
+            self.ingest.flush()
+            with self.db.read() as cursor:
+                granularity, events = monitoring_queries.fetch_trend(cursor, 'event', days * 86400)
+                _, performance = monitoring_queries.fetch_trend(cursor, 'performance', days * 86400)
+            return {
+                'period_days': days,
+                'granularity': granularity,
+                'events': [{'bucket': bucket, 'total': total, 'high_or_critical': severe}
+                           for bucket, total, severe in events],
+                'performance': [{'bucket': bucket, 'avg_cpu_percent': round(cpu or 0, 2),
+                                 'avg_memory_percent': round(memory or 0, 2), 'avg_disk_usage': round(disk or 0, 2),
+                                 'max_active_connections': connections or 0,
+                                 **dict(zip(monitoring_queries.THROUGHPUT_COLUMNS, throughput))}
+                                for bucket, cpu, memory, disk, connections, *throughput in performance],
+            }
+        except Exception as e:
+            logging.error(f"❌ Error generating trend report: {e}")
+            return {}
+    
     def start_monitoring(self):
         """Bắt đầu monitoring trong background thread."""
         def monitoring_loop():
             while self.running:
                 try:
-                    # Collect metrics mỗi 30 giây
+                    # Collect metrics mỗi 30 giây (retention chạy trong thread riêng)
                     self.collect_system_metrics()
                     
-                    # Cleanup old data (giữ lại 7 ngày)
-                    if int(time.time()) % 3600 == 0:  # Mỗi giờ
-                        self.cleanup_old_data(days=7)
-                    
                     time.sleep(30)
                     
                 except Exception as e:
@@ -373,31 +554,31 @@ class AdvancedMonitoringSystem:
         monitoring_thread.start()
         logging.info("✅ Advanced monitoring started")
     
-    def cleanup_old_data(self, days=7):
-        """Dọn dẹp data cũ."""
+    def cleanup_old_data(self, days=None):
+        """Chạy ngay một lượt retention (theo XML_PROTECTOR_RETENTION_<BẢNG>_DAYS).
+
+        ``days``: giữ security_events bao nhiêu ngày trong lượt này (tương thích lời gọi cũ).
+        """
         try:
-            conn = sqlite3.connect(str(self.db_file))
-            cursor = conn.cursor()
-            
-            cutoff_date = datetime.now() - timedelta(days=days)
-            
-            # Cleanup các bảng
-            tables = ['system_metrics', 'performance_stats', 'security_events', 'update_logs']
-            for table in tables:
-                cursor.execute(f'DELETE FROM {table} WHERE timestamp < ?', (cutoff_date,))
-            
-            conn.commit()
-            conn.close()
-            
-            logging.info(f"✅ Cleaned up data older than {days} days")
-            
+            plan = None
+            if days is not None:
+                plan = lambda: monitoring_queries.retention_plan({'security_events': days})
+            return self.retention.run_once(plan)
         except Exception as e:
             logging.error(f"❌ Error cleaning up old data: {e}")
+            return None
     
     def stop_monitoring(self):
         """Dừng monitoring."""
         self.running = False
         logging.info("⏹️ Advanced monitoring stopped")
+    
+    def close(self):
+        """Dừng monitoring, ghi nốt hàng đợi và đóng database (checkpoint WAL)."""
+        self.stop_monitoring()
+        self.retention.close()
+        self.ingest.close()
+        self.db.close()
 
 class AutoUpdateSystem:
     """Hệ thống auto-update cho XML Protector."""
@@ -559,5 +740,5 @@ if __name__ == '__main__':
             if stats.get('recent_alerts'):
                 print(f"🚨 Recent alerts: {len(stats['recent_alerts'])}")
     except KeyboardInterrupt:
-        monitoring.stop_monitoring()
+        monitoring.close()
         print("⏹️ Monitoring system stopped")
\ No newline at end of file
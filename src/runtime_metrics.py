@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Runtime Metrics
+Counters & histogram độ trễ theo stage cho pipeline bảo vệ, ring buffer chuỗi
+thời gian cho system metrics
+"""
+
+import os
+import json
+import math
+import time
+import logging
+import bisect
+import weakref
+import threading
+from array import array
+from datetime import datetime
+from pathlib import Path
+
+log = logging.getLogger('xml_protector.metrics')
+
+# Các stage của pipeline bảo vệ
+PIPELINE_STAGES = (
+    'event_receive',
+    'prefilter',
+    'settle',
+    'parse',
+    'match',
+    'backup',
+    'restore',
+    'notify',
+    'detect_to_restore',
+)
+
+# Histogram log-linear kiểu HDR: 16 sub-bucket cho mỗi lũy thừa của 2 (sai số ~6%)
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+MAX_TRACKABLE_US = (1 << 36) - 1  # ~19 giờ
+BUCKET_COUNT = (MAX_TRACKABLE_US.bit_length() - SUB_BUCKET_BITS + 1) * SUB_BUCKET_COUNT
+
+# Biên bucket (giây) khi xuất OpenMetrics
+EXPORT_BOUNDS_SECONDS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                         0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def bucket_index(value_us):
+    """Vị trí bucket của một giá trị (micro giây)."""
+    if value_us < SUB_BUCKET_COUNT:
+        return value_us
+    shift = value_us.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKET_COUNT + ((value_us >> shift) & (SUB_BUCKET_COUNT - 1))
+
+
+def bucket_bounds(index):
+    """Khoảng [lower, upper) của bucket (micro giây)."""
+    if index < SUB_BUCKET_COUNT:
+        return index, index + 1
+    shift = index // SUB_BUCKET_COUNT - 1
+    lower = (SUB_BUCKET_COUNT + index % SUB_BUCKET_COUNT) << shift
+    return lower, lower + (1 << shift)
+
+
+class _ShardOwner:
+    """Vật giữ chỗ trong threading.local: bị hủy khi thread kết thúc."""
+    __slots__ = ('__weakref__',)
+
+
+class _ShardedCells:
+    """Mảng số đếm chia shard theo thread.
+
+    Mỗi thread chỉ ghi vào shard của chính nó nên đường ghi không cần lock;
+    lock chỉ dùng khi thread đăng ký shard lần đầu. Đọc = cộng dồn các shard.
+    Khi thread kết thúc, shard của nó được gộp vào shard nền ``shards[0]``
+    (cột trong ``max_columns`` lấy max) nên số shard không tăng theo số thread
+    đã từng ghi (pool worker, thread kiểm tra ngắn hạn...).
+    """
+
+    def __init__(self, width, max_columns=()):
+        self.width = width
+        self.max_columns = frozenset(max_columns)
+        self.local = threading.local()
+        self.shards = [[0] * width]
+        self.lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = [0] * self.width
+            with self.lock:
+                self.shards.append(shard)
+            self.local.shard = shard
+            # threading.local xóa owner khi thread kết thúc -> finalizer gộp shard
+            self.local.owner = _ShardOwner()
+            weakref.finalize(self.local.owner, self.retire, shard)
+            return shard
+
+    def retire(self, shard):
+        with self.lock:
+            base = self.shards[0]
+            for index, value in enumerate(shard):
+                if index in self.max_columns:
+                    base[index] = max(base[index], value)
+                else:
+                    base[index] += value
+            self.shards.remove(shard)
+
+    def totals(self):
+        with self.lock:
+            shards = list(self.shards)
+        return [sum(column) for column in zip(*shards)]
+
+
+class Counter:
+    """Counter tăng dần, ghi không lock."""
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self.cells = _ShardedCells(1)
+
+    def inc(self, amount=1):
+        self.cells.shard()[0] += amount
+
+    def value(self):
+        return self.cells.totals()[0]
+
+
+class Histogram:
+    """Histogram độ trễ log-linear (đơn vị lưu: micro giây)."""
+
+    # Layout shard: [count, sum_us, max_us, bucket_0, bucket_1, ...]
+    HEADER = 3
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self.cells = _ShardedCells(self.HEADER + BUCKET_COUNT, max_columns=(2,))
+
+    def observe(self, seconds):
+        value_us = min(max(int(seconds * 1_000_000), 0), MAX_TRACKABLE_US)
+        shard = self.cells.shard()
+        shard[0] += 1
+        shard[1] += value_us
+        if value_us > shard[2]:
+            shard[2] = value_us
+        shard[self.HEADER + bucket_index(value_us)] += 1
+
+    def merged(self):
+        """(count, sum_us, max_us, buckets) gộp từ mọi shard."""
+        with self.cells.lock:
+            shards = list(self.cells.shards)
+        count = sum(s[0] for s in shards)
+        total = sum(s[1] for s in shards)
+        maximum = max(s[2] for s in shards)
+        buckets = [sum(column) for column in zip(*(s[self.HEADER:] for s in shards))]
+        return count, total, maximum, buckets
+
+    @staticmethod
+    def percentile_us(buckets, count, quantile):
+        if not count:
+            return 0
+        target = max(1, int(round(quantile * count)))
+        seen = 0
+        for index, bucket_count in enumerate(buckets):
+            seen += bucket_count
+            if seen >= target:
+                lower, upper = bucket_bounds(index)
+                return (lower + upper - 1) / 2
+        return 0
+
+    def snapshot(self):
+        count, total, maximum, buckets = self.merged()
+        return {
+            'count': count,
+            'sum_ms': round(total / 1000, 3),
+            'mean_ms': round(total / count / 1000, 3) if count else 0,
+            'p50_ms': round(self.percentile_us(buckets, count, 0.50) / 1000, 3),
+            'p90_ms': round(self.percentile_us(buckets, count, 0.90) / 1000, 3),
+            'p99_ms': round(self.percentile_us(buckets, count, 0.99) / 1000, 3),
+            'max_ms': round(maximum / 1000, 3),
+        }
+
+
+def openmetrics_family(name, metric_type, samples, description=""):
+    """Các dòng OpenMetrics của một metric family; ``samples``: [(labels dict hoặc None, giá trị)]."""
+    lines = [f"# TYPE {name} {metric_type}"]
+    if description:
+        lines.append(f"# HELP {name} {description}")
+    suffix = '_total' if metric_type == 'counter' else ''
+    for labels, value in samples:
+        if value is None:
+            continue
+        label_text = ''
+        if labels:
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                       for v in labels.values())
+            label_text = '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+        lines.append(f"{name}{suffix}{label_text} {value}")
+    return lines
+
+
+class CounterDelta:
+    """Lượng tăng của một nhóm counter kể từ lần ``take()`` trước.
+
+    Counter trong registry luôn tích lũy (exporter/OpenMetrics cần giá trị
+    tổng), nên "snapshot rồi reset" theo từng tick được làm bằng cách nhớ
+    giá trị lần trước, không xóa shard của thread đang ghi.
+    """
+
+    def __init__(self, registry, names, from_zero=False):
+        self.registry = registry
+        self.names = tuple(names)
+        # from_zero: lần take() đầu trả về toàn bộ giá trị tích lũy từ lúc tạo registry
+        self.last = {name: 0 if from_zero else registry.counter(name).value() for name in self.names}
+
+    def take(self):
+        deltas = {}
+        for name in self.names:
+            value = self.registry.counter(name).value()
+            deltas[name] = value - self.last[name]
+            self.last[name] = value
+        return deltas
+
+
+class TimeSeriesRing:
+    """Ring buffer chuỗi thời gian kích thước cố định: mỗi metric một ``array('d')``.
+
+    Mỗi mẫu tốn 8 byte cho mỗi metric cộng 8 byte timestamp monotonic, ghi
+    đè mẫu cũ nhất khi đầy và không giữ object Python nào cho từng mẫu.
+    Truy vấn theo khung thời gian tìm mẫu đầu tiên bằng bisect trên cột
+    timestamp (tăng dần), rồi tính trên slice array bằng hàm built-in
+    (min/max/sum/sorted chạy trong C).
+    """
+
+    def __init__(self, fields, capacity=2880):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.columns = {field: array('d', bytes(8 * capacity)) for field in self.fields}
+        self.head = 0  # vị trí ghi mẫu tiếp theo
+        self.count = 0
+        self.lock = threading.Lock()
+        # Đổi timestamp monotonic sang giờ hệ thống khi hiển thị
+        self.wall_offset = time.time() - time.monotonic()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, values, timestamp=None):
+        """Thêm một mẫu; ``values`` phải có đủ các metric trong ``fields``."""
+        with self.lock:
+            index = self.head
+            for field, column in self.columns.items():
+                column[index] = values[field]
+            self.timestamps[index] = time.monotonic() if timestamp is None else timestamp
+            self.head = (index + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+
+    def position(self, logical):
+        """Vị trí trong array của mẫu thứ ``logical`` (0 = cũ nhất)."""
+        return (self.head - self.count + logical) % self.capacity
+
+    def first_since(self, since):
+        """Mẫu cũ nhất có timestamp >= since (bisect trên hai đoạn đã sắp xếp của vòng)."""
+        oldest = self.position(0)
+        if oldest + self.count <= self.capacity:
+            return bisect.bisect_left(self.timestamps, since, oldest, oldest + self.count) - oldest
+        # Vòng bị gãy: [oldest, capacity) rồi [0, head)
+        if since <= self.timestamps[self.capacity - 1]:
+            return bisect.bisect_left(self.timestamps, since, oldest, self.capacity) - oldest
+        return self.capacity - oldest + bisect.bisect_left(self.timestamps, since, 0, self.head)
+
+    def slices(self, start):
+        """Các khoảng [a, b) trong array chứa mẫu ``start``..cuối (theo thứ tự thời gian)."""
+        size = self.count - start
+        if size <= 0:
+            return []
+        begin = self.position(start)
+        if begin + size <= self.capacity:
+            return [(begin, begin + size)]
+        return [(begin, self.capacity), (0, begin + size - self.capacity)]
+
+    def window(self, seconds=None, fields=None, now=None):
+        """{metric: array} các mẫu trong ``seconds`` giây tính tới ``now`` (None = toàn bộ), bản sao."""
+        with self.lock:
+            now = time.monotonic() if now is None else now
+            start = 0 if seconds is None else self.first_since(now - seconds)
+            ranges = self.slices(start)
+            result = {}
+            for field in ('timestamp',) + tuple(fields or self.fields):
+                column = self.timestamps if field == 'timestamp' else self.columns[field]
+                values = array('d')
+                for begin, end in ranges:
+                    values += column[begin:end]
+                result[field] = values
+            return result
+
+    def window_stats(self, seconds=None, fields=None, quantile=0.95, now=None):
+        """min/max/mean/p95 (nearest-rank) của từng metric trong khung thời gian."""
+        data = self.window(seconds, fields, now)
+        count = len(data.pop('timestamp'))
+        stats = {}
+        for field, values in data.items():
+            if not count:
+                stats[field] = {'count': 0, 'min': None, 'max': None, 'mean': None, 'p95': None}
+                continue
+            rank = max(1, math.ceil(round(quantile * count, 6)))
+            stats[field] = {
+                'count': count,
+                'min': min(values),
+                'max': max(values),
+                'mean': sum(values) / count,
+                'p95': sorted(values)[rank - 1],
+            }
+        return stats
+
+    def tail(self, limit=20):
+        """``limit`` mẫu mới nhất dạng dict (cũ -> mới), kèm timestamp giờ hệ thống."""
+        with self.lock:
+            start = max(0, self.count - limit)
+            samples = []
+            for logical in range(start, self.count):
+                index = self.position(logical)
+                sample = {'timestamp': datetime.fromtimestamp(self.timestamps[index] + self.wall_offset)}
+                for field, column in self.columns.items():
+                    sample[field] = column[index]
+                samples.append(sample)
+            return samples
+
+    def memory_bytes(self):
+        return self.timestamps.itemsize * self.capacity * (len(self.fields) + 1)
+
+
+class MetricsRegistry:
+    """Registry counters + histogram theo stage của runtime."""
+
+    def __init__(self, prefix='xml_protector'):
+        self.prefix = prefix
+        self.started_at = time.time()
+        self.counters = {}
+        self.histograms = {stage: Histogram(stage) for stage in PIPELINE_STAGES}
+        self.lock = threading.Lock()
+
+    def counter(self, name, description=""):
+        counter = self.counters.get(name)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(name, Counter(name, description))
+        return counter
+
+    def inc(self, name, amount=1):
+        self.counter(name).inc(amount)
+
+    def observe(self, stage, seconds):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(stage, Histogram(stage))
+        histogram.observe(seconds)
+
+    def snapshot(self):
+        """Snapshot dạng dict (dùng cho JSON, control server, DB)."""
+        return {
+            'timestamp': time.time(),
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'counters': {name: c.value() for name, c in sorted(self.counters.items())},
+            'histograms': {name: h.snapshot() for name, h in self.histograms.items()},
+        }
+
+    def openmetrics_lines(self):
+        """Các dòng OpenMetrics của counters + histogram (chưa có ``# EOF``)."""
+        lines = []
+        for name, counter in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            if counter.description:
+                lines.append(f"# HELP {metric} {counter.description}")
+            lines.append(f"{metric}_total {counter.value()}")
+
+        metric = f"{self.prefix}_stage_latency_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        lines.append(f"# HELP {metric} Latency of each protection pipeline stage")
+        for stage, histogram in self.histograms.items():
+            count, total, _, buckets = histogram.merged()
+            cumulative = 0
+            index = 0
+            for bound in EXPORT_BOUNDS_SECONDS:
+                bound_us = bound * 1_000_000
+                while index < BUCKET_COUNT and bucket_bounds(index)[1] <= bound_us:
+                    cumulative += buckets[index]
+                    index += 1
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {total / 1_000_000:.6f}')
+        return lines
+
+    def to_openmetrics(self):
+        """Xuất dạng OpenMetrics text."""
+        return "\n".join(self.openmetrics_lines() + ["# EOF"]) + "\n"
+
+
+class MetricsExporter:
+    """Xuất metrics định kỳ ra file JSON/OpenMetrics và DB monitoring."""
+
+    def __init__(self, registry, output_dir, interval=60, db_sink=None):
+        self.registry = registry
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self.db_sink = db_sink
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.exports = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='xml-protector-metrics', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.export()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.export()
+
+    def export(self):
+        """Ghi snapshot hiện tại (ghi file tạm rồi replace để tránh file dở dang)."""
+        try:
+            snapshot = self.registry.snapshot()
+            self.write_atomic(self.output_dir / 'metrics.json',
+                              json.dumps(snapshot, indent=2, ensure_ascii=False))
+            self.write_atomic(self.output_dir / 'metrics.prom', self.registry.to_openmetrics())
+            if self.db_sink:
+                self.db_sink(snapshot)
+            self.exports += 1
+        except Exception as e:
+            log.error(f"❌ Lỗi xuất metrics: {e}")
+
+    @staticmethod
+    def write_atomic(path, text):
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
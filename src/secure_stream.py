@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Secure Stream
+Mã hóa file lớn (template bundle, EXE) theo từng chunk AES-256-GCM với header
+có version, bộ nhớ cố định và giải mã ngẫu nhiên từng chunk
+"""
+
+import os
+import struct
+from pathlib import Path
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+
+STREAM_MAGIC = b'XPSTRM'
+STREAM_VERSION = 1
+ALGORITHM_AES_256_GCM = 1
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+TAG_SIZE = 16
+
+# magic | version | algorithm | chunk_size | nonce_prefix | salt
+HEADER_FORMAT = '>6sBBI8s16s'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+class StreamCryptoError(Exception):
+    """File mã hóa hỏng, bị cắt, sai key hoặc sai định dạng."""
+
+
+class StreamHeader:
+    """Header của file mã hóa; bytes của header là AAD cho mọi chunk."""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, nonce_prefix=None, salt=None,
+                 version=STREAM_VERSION, algorithm=ALGORITHM_AES_256_GCM):
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk_size không hợp lệ: {chunk_size}")
+        self.version = version
+        self.algorithm = algorithm
+        self.chunk_size = chunk_size
+        self.nonce_prefix = nonce_prefix or os.urandom(8)
+        self.salt = salt or os.urandom(16)
+
+    def to_bytes(self):
+        return struct.pack(HEADER_FORMAT, STREAM_MAGIC, self.version, self.algorithm,
+                           self.chunk_size, self.nonce_prefix, self.salt)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER_SIZE:
+            raise StreamCryptoError("File quá ngắn, thiếu header")
+        magic, version, algorithm, chunk_size, nonce_prefix, salt = struct.unpack(HEADER_FORMAT, data[:HEADER_SIZE])
+        if magic != STREAM_MAGIC:
+            raise StreamCryptoError("Không phải file mã hóa của XML Protector")
+        if version != STREAM_VERSION or algorithm != ALGORITHM_AES_256_GCM:
+            raise StreamCryptoError(f"Không hỗ trợ version {version} / thuật toán {algorithm}")
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise StreamCryptoError(f"chunk_size không hợp lệ trong header: {chunk_size}")
+        return cls(chunk_size, nonce_prefix, salt, version, algorithm)
+
+    @property
+    def frame_size(self):
+        return self.chunk_size + TAG_SIZE
+
+
+def derive_file_key(master_key, salt):
+    """Key riêng cho từng file (HKDF từ company key + salt ngẫu nhiên của file)."""
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b'xml-protector-stream-v1')
+    return hkdf.derive(master_key)
+
+
+def chunk_nonce(header, index):
+    return header.nonce_prefix + struct.pack('>I', index)
+
+
+def chunk_aad(header_bytes, index, final):
+    # Index + cờ chunk cuối trong AAD: đổi thứ tự hoặc cắt bớt chunk đều bị phát hiện
+    return header_bytes + struct.pack('>IB', index, 1 if final else 0)
+
+
+def read_full(source, size):
+    """Đọc đủ ``size`` byte (hoặc tới EOF) từ stream."""
+    data = source.read(size)
+    while data and len(data) < size:
+        more = source.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def encrypt_stream(master_key, source, target, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Mã hóa ``source`` vào ``target`` (file-like, binary). Trả về số byte plaintext."""
+    header = StreamHeader(chunk_size)
+    header_bytes = header.to_bytes()
+    aead = AESGCM(derive_file_key(master_key, header.salt))
+    target.write(header_bytes)
+
+    total = index = 0
+    chunk = read_full(source, chunk_size)
+    while True:
+        # Đọc trước một chunk để biết chunk hiện tại có phải chunk cuối không
+        next_chunk = read_full(source, chunk_size) if len(chunk) == chunk_size else b''
+        final = not next_chunk
+        target.write(aead.encrypt(chunk_nonce(header, index), chunk, chunk_aad(header_bytes, index, final)))
+        total += len(chunk)
+        if final:
+            return total
+        if index == 0xFFFFFFFF:
+            raise StreamCryptoError("File quá lớn cho chunk_size hiện tại")
+        chunk, index = next_chunk, index + 1
+
+
+def decrypt_stream(master_key, source, target):
+    """Giải mã ``source`` vào ``target``; lỗi nếu dữ liệu bị sửa, đổi thứ tự hoặc cắt."""
+    header_bytes = read_full(source, HEADER_SIZE)
+    header = StreamHeader.from_bytes(header_bytes)
+    aead = AESGCM(derive_file_key(master_key, header.salt))
+
+    total = index = 0
+    frame = read_full(source, header.frame_size)
+    while True:
+        next_frame = read_full(source, header.frame_size) if len(frame) == header.frame_size else b''
+        final = not next_frame
+        try:
+            chunk = aead.decrypt(chunk_nonce(header, index), frame, chunk_aad(header_bytes, index, final))
+        except InvalidTag:
+            raise StreamCryptoError(f"Chunk {index} không hợp lệ (sai key, bị sửa hoặc bị cắt)")
+        target.write(chunk)
+        total += len(chunk)
+        if final:
+            return total
+        frame, index = next_frame, index + 1
+
+
+def encrypt_file(master_key, source_path, target_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Mã hóa file, ghi atomic (file tạm + replace)."""
+    target_path = Path(target_path)
+    tmp_path = target_path.with_name(target_path.name + '.tmp')
+    with open(source_path, 'rb') as source, open(tmp_path, 'wb') as target:
+        total = encrypt_stream(master_key, source, target, chunk_size)
+    os.replace(tmp_path, target_path)
+    return total
+
+
+def decrypt_file(master_key, source_path, target_path):
+    """Giải mã file, chỉ thay file đích khi toàn bộ chunk hợp lệ."""
+    target_path = Path(target_path)
+    tmp_path = target_path.with_name(target_path.name + '.tmp')
+    try:
+        with open(source_path, 'rb') as source, open(tmp_path, 'wb') as target:
+            total = decrypt_stream(master_key, source, target)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, target_path)
+    return total
+
+
+class EncryptedFileReader:
+    """Đọc ngẫu nhiên file mã hóa: chỉ giải mã các chunk chứa vùng cần đọc."""
+
+    def __init__(self, master_key, path):
+        self.path = Path(path)
+        self.file = open(self.path, 'rb')
+        self.header_bytes = read_full(self.file, HEADER_SIZE)
+        self.header = StreamHeader.from_bytes(self.header_bytes)
+        self.aead = AESGCM(derive_file_key(master_key, self.header.salt))
+
+        body_size = os.fstat(self.file.fileno()).st_size - HEADER_SIZE
+        frame_size = self.header.frame_size
+        self.chunk_count = max(1, -(-body_size // frame_size))
+        last_frame = body_size - (self.chunk_count - 1) * frame_size
+        if last_frame < TAG_SIZE:
+            raise StreamCryptoError("File bị cắt (chunk cuối không đủ tag)")
+        self.size = (self.chunk_count - 1) * self.header.chunk_size + last_frame - TAG_SIZE
+
+    def read_chunk(self, index):
+        if not 0 <= index < self.chunk_count:
+            raise IndexError(f"Chunk {index} ngoài phạm vi (0..{self.chunk_count - 1})")
+        self.file.seek(HEADER_SIZE + index * self.header.frame_size)
+        frame = read_full(self.file, self.header.frame_size)
+        final = index == self.chunk_count - 1
+        try:
+            return self.aead.decrypt(chunk_nonce(self.header, index), frame,
+                                     chunk_aad(self.header_bytes, index, final))
+        except InvalidTag:
+            raise StreamCryptoError(f"Chunk {index} không hợp lệ (sai key, bị sửa hoặc bị cắt)")
+
+    def read(self, offset, size):
+        """Đọc ``size`` byte plaintext bắt đầu từ ``offset``."""
+        if offset < 0 or size < 0:
+            raise ValueError("offset/size phải >= 0")
+        end = min(offset + size, self.size)
+        chunk_size = self.header.chunk_size
+        parts = []
+        position = offset
+        while position < end:
+            index = position // chunk_size
+            chunk = self.read_chunk(index)
+            start = position - index * chunk_size
+            part = chunk[start:start + end - position]
+            parts.append(part)
+            position += len(part)
+        return b''.join(parts)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -7,50 +7,332 @@ Quản lý mã hóa, xác thực và bảo mật
 
 import os
 import sys
+import copy
 import json
 import uuid
 import hashlib
+import time
 import platform
 import base64
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+import crypto_envelope
+
+# --- KEY DERIVATION --- #
+KDF_SALT = b'xml_protector_salt_2025'
+DEFAULT_KDF_ITERATIONS = 100000
+MIN_KDF_ITERATIONS = 10000
+# Số vòng trong header envelope được chấp nhận tối đa gấp N lần số vòng cấu hình
+# (header do file cung cấp: không để file giả mạo bắt PBKDF2 chạy hàng tỷ vòng)
+MAX_HEADER_KDF_FACTOR = 4
+CONFIG_EXPIRY_DAYS = 365
+KDF_CACHE_VERSION = 1
+
+def default_kdf_iterations():
+    """Số vòng PBKDF2 mặc định (ghi đè bằng XML_PROTECTOR_KDF_ITERATIONS)."""
+    return max(MIN_KDF_ITERATIONS, int(os.getenv('XML_PROTECTOR_KDF_ITERATIONS', DEFAULT_KDF_ITERATIONS)))
+
+def calibrate_kdf_iterations(target_ms=250, minimum=DEFAULT_KDF_ITERATIONS, sample_iterations=20000):
+    """Đo tốc độ PBKDF2 trên máy hiện tại và trả về số vòng đạt ~target_ms.
+
+    Dùng khi build để chọn số vòng cho từng deployment (ghi vào package
+    dưới khóa ``kdf_iterations``); không bao giờ thấp hơn ``minimum``.
+    """
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=KDF_SALT, iterations=sample_iterations)
+    start = time.perf_counter()
+    kdf.derive(b'xml-protector-calibration')
+    per_iteration_ms = (time.perf_counter() - start) * 1000 / sample_iterations
+    iterations = int(target_ms / per_iteration_ms) if per_iteration_ms > 0 else minimum
+    # Làm tròn 10.000 vòng cho dễ đọc trong deployment package
+    return max(minimum, MIN_KDF_ITERATIONS, iterations // 10000 * 10000)
+
+class KeyDerivationCache:
+    """Cache company key đã derive, theo (MST, tên DN, machine ID, salt, số vòng).
+
+    Tầng 1 nằm trong process, hết hạn sau ``ttl`` giây. Tầng 2 (tùy chọn) là
+    file niêm phong trong APP_DIR: mã hóa Fernet bằng khóa HKDF từ machine ID,
+    nên file copy sang máy khác không dùng được. Tầng 2 chỉ tránh PBKDF2 lúc
+    boot, không thay thế bảo vệ của quyền truy cập APP_DIR.
+    """
+    
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def entry_id(company_mst, company_name, machine_id, salt, iterations):
+        material = json.dumps([company_mst, company_name, machine_id, salt.hex(), iterations])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+    
+    def get(self, entry_id):
+        with self.lock:
+            entry = self.entries.get(entry_id)
+            if entry and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0]
+            self.entries.pop(entry_id, None)
+            self.misses += 1
+            return None
+    
+    def put(self, entry_id, key):
+        with self.lock:
+            self.entries[entry_id] = (key, time.monotonic() + self.ttl)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+    
+    # --- Sealed disk cache --- #
+    
+    @staticmethod
+    def seal_key(machine_id, salt):
+        hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b'xml-protector-kdf-cache')
+        return base64.urlsafe_b64encode(hkdf.derive(machine_id.encode('utf-8')))
+    
+    def read_disk(self, path, machine_id):
+        """Đọc cache niêm phong, {} nếu không có, hỏng hoặc thuộc máy khác."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                sealed = json.load(f)
+            if sealed.get('version') != KDF_CACHE_VERSION:
+                return {}
+            salt = base64.b64decode(sealed['salt'])
+            data = Fernet(self.seal_key(machine_id, salt)).decrypt(sealed['token'].encode('ascii'))
+            now = time.time()
+            return {k: v for k, v in json.loads(data).items() if v[1] > now}
+        except Exception:
+            return {}
+    
+    def disk_get(self, path, machine_id, entry_id):
+        entry = self.read_disk(path, machine_id).get(entry_id)
+        if entry:
+            with self.lock:
+                self.disk_hits += 1
+            return entry[0].encode('ascii')
+        return None
+    
+    def disk_put(self, path, machine_id, entry_id, key, ttl):
+        entries = self.read_disk(path, machine_id)
+        entries[entry_id] = [key.decode('ascii'), time.time() + ttl]
+        salt = os.urandom(16)
+        token = Fernet(self.seal_key(machine_id, salt)).encrypt(json.dumps(entries).encode('utf-8'))
+        sealed = {'version': KDF_CACHE_VERSION, 'salt': base64.b64encode(salt).decode('ascii'),
+                  'token': token.decode('ascii')}
+        tmp_path = Path(path).with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sealed, f)
+        try:
+            os.chmod(tmp_path, 0o600)
+        except OSError:
+            pass
+        os.replace(tmp_path, path)
+    
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'disk_hits': self.disk_hits,
+                    'misses': self.misses, 'derived': self.misses - self.disk_hits}
+
+# Dùng chung cho mọi SecurityManager/ConfigManager trong process
+kdf_cache = KeyDerivationCache(ttl=float(os.getenv('XML_PROTECTOR_KDF_CACHE_TTL', '3600')))
+
+# --- MACHINE FINGERPRINT --- #
+MACHINE_ID_FILE = 'machine_id.json'
+_machine_id = None
+_machine_id_lock = threading.Lock()
+_machine_id_prefetch = None
+
+def host_signature():
+    return f"{platform.node()}-{platform.system()}-{platform.release()}"
+
+def mac_address():
+    """(MAC dạng aa:bb:..., có phải MAC ngẫu nhiên hay không).
+
+    Khi không đọc được MAC, uuid.getnode trả số ngẫu nhiên có bit multicast.
+    """
+    node = uuid.getnode()
+    mac = ':'.join('{:02x}'.format((node >> shift) & 0xff) for shift in range(40, -8, -8))
+    return mac, bool(node & (1 << 40))
+
+def compute_machine_id(signature=None, mac=None):
+    """Tạo Machine ID unique cho từng máy (chậm: uuid.getnode có thể gọi tiến trình phụ)."""
+    try:
+        # Kết hợp nhiều thông tin để tạo ID unique
+        machine_info = signature or host_signature()
+        
+        # Thêm MAC address nếu có
+        try:
+            machine_info += f"-{mac or mac_address()[0]}"
+        except:
+            pass
+            
+        # Hash để tạo ID ngắn gọn
+        machine_hash = hashlib.sha256(machine_info.encode()).hexdigest()[:16]
+        return machine_hash.upper()
+    except:
+        # Fallback: Random UUID
+        return str(uuid.uuid4())[:16].upper()
+
+def load_persisted_machine_id(path, signature):
+    """ID đã lưu cho host signature này, None nếu thiếu, hỏng hoặc của máy khác.
+
+    File không có chữ ký bảo vệ: chỉ dùng khi không đọc được MAC thật, để ID
+    không đổi sau mỗi lần khởi động (xem get_machine_fingerprint).
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('signature') != signature:
+            return None
+        return data['machine_id']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def persist_machine_id(path, machine_id, signature, mac):
+    tmp_path = Path(path).with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'machine_id': machine_id, 'signature': signature, 'mac': mac,
+                   'created_at': datetime.now().isoformat()}, f)
+    os.replace(tmp_path, path)
+
+def get_machine_fingerprint(app_dir):
+    """Machine ID tính một lần mỗi process, dùng chung cho mọi SecurityManager/ConfigManager.
+
+    ID luôn được tính lại từ host signature + MAC ở lần đầu trong process nên
+    copy APP_DIR sang máy khác (hoặc sửa machine_id.json) không giữ được ID
+    cũ. File trong APP_DIR chỉ được dùng khi uuid.getnode không có MAC thật
+    (trả MAC ngẫu nhiên), để ID ổn định giữa các lần khởi động.
+    """
+    global _machine_id
+    if _machine_id:
+        return _machine_id
+    with _machine_id_lock:
+        if _machine_id:
+            return _machine_id
+        path = Path(app_dir) / MACHINE_ID_FILE
+        signature = host_signature()
+        try:
+            mac, random_mac = mac_address()
+        except Exception:
+            mac, random_mac = None, True
+        if not random_mac:
+            # MAC thật: ID tính lại được mỗi lần, không cần đọc/ghi file trên đường khởi động
+            machine_id = compute_machine_id(signature, mac)
+        else:
+            machine_id = load_persisted_machine_id(path, signature)
+            if not machine_id:
+                # Chỉ ghi khi chưa có ID hợp lệ cho host này (lần đầu, file hỏng hoặc của máy khác)
+                machine_id = compute_machine_id(signature, None)
+                try:
+                    persist_machine_id(path, machine_id, signature, None)
+                except OSError:
+                    pass
+        _machine_id = machine_id
+        return machine_id
+
+def prefetch_machine_fingerprint(app_dir):
+    """Tính Machine ID trong thread nền (một lần mỗi process); ai cần ID sẽ chờ lock nếu chưa xong."""
+    global _machine_id_prefetch
+    with _machine_id_lock:
+        if _machine_id or _machine_id_prefetch:
+            return
+        _machine_id_prefetch = threading.Thread(target=get_machine_fingerprint, args=(app_dir,),
+                                                name='machine-fingerprint', daemon=True)
+    _machine_id_prefetch.start()
+
+# --- BULK DEPLOYMENT PACKAGES --- #
+_package_worker_security = None
+
+def _init_package_worker(settings):
+    """Khởi tạo worker process với đúng tham số của SecurityManager cha (xem worker_settings)."""
+    global _package_worker_security
+    _package_worker_security = SecurityManager(**settings)
+
+def _build_package_worker(company_config):
+    """Derive key + mã hóa một package trong worker process."""
+    return _package_worker_security.create_deployment_package(company_config)
+
+def write_json_atomic(path, data):
+    tmp_path = Path(path).with_name(Path(path).name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
 
 class SecurityManager:
     """Quản lý bảo mật tổng thể."""
     
-    def __init__(self):
+    def __init__(self, kdf_iterations=None, disk_key_cache=None, kdf_salt=None, machine_id=None,
+                 config_expiry_days=CONFIG_EXPIRY_DAYS, cipher=None):
         self.app_dir = Path(os.getenv('APPDATA', Path.home())) / 'XMLProtectorRuntime'
         self.app_dir.mkdir(parents=True, exist_ok=True)
         self.config_file = self.app_dir / 'secure_config.enc'
-        self.machine_id = self.get_machine_id()
+        self.kdf_cache_file = self.app_dir / 'kdf_cache.enc'
+        self.kdf_iterations = kdf_iterations or default_kdf_iterations()
+        self.kdf_salt = kdf_salt or KDF_SALT
+        self.config_expiry_days = config_expiry_days
+        # Thuật toán khi mã hóa mới; giải mã tự nhận theo header (hoặc Fernet cho payload cũ)
+        self.cipher = cipher or os.getenv('XML_PROTECTOR_CIPHER', crypto_envelope.DEFAULT_ALGORITHM)
+        if self.cipher != crypto_envelope.LEGACY_ALGORITHM and self.cipher not in crypto_envelope.ALGORITHMS:
+            raise ValueError(f"Thuật toán mã hóa không hỗ trợ: {self.cipher}")
+        # Cache niêm phong trên đĩa tắt mặc định (bật: XML_PROTECTOR_KDF_DISK_CACHE=1)
+        if disk_key_cache is None:
+            disk_key_cache = os.getenv('XML_PROTECTOR_KDF_DISK_CACHE', '0') == '1'
+        self.disk_key_cache = disk_key_cache
+        self.disk_cache_ttl = float(os.getenv('XML_PROTECTOR_KDF_DISK_TTL_DAYS', '30')) * 86400
+        # machine_id truyền vào: làm việc với config của máy khác (vd. job xoay vòng key).
+        # Không truyền: Machine ID của máy này được tính nền, chỉ chờ khi cần đến lần đầu
+        self._machine_id = machine_id
+        if not machine_id:
+            prefetch_machine_fingerprint(self.app_dir)
+    
+    @property
+    def machine_id(self):
+        return self._machine_id or self.get_machine_id()
+    
+    def worker_settings(self):
+        """Tham số constructor để dựng lại manager này trong process khác (package ra giống hệt)."""
+        return {'kdf_iterations': self.kdf_iterations, 'kdf_salt': self.kdf_salt, 'machine_id': self.machine_id,
+                'config_expiry_days': self.config_expiry_days, 'disk_key_cache': self.disk_key_cache,
+                'cipher': self.cipher}
     
     def get_machine_id(self):
-        """Tạo Machine ID unique cho từng máy."""
-        try:
-            # Kết hợp nhiều thông tin để tạo ID unique
-            machine_info = f"{platform.node()}-{platform.system()}-{platform.release()}"
-            
-            # Thêm MAC address nếu có
+        """Machine ID của máy này (dùng chung trong process, xem get_machine_fingerprint)."""
+        return get_machine_fingerprint(self.app_dir)
+    
+    def generate_company_key(self, company_mst, company_name="", iterations=None, salt=None):
+        """Tạo encryption key riêng cho từng công ty (có cache, xem KeyDerivationCache)."""
+        iterations = iterations or self.kdf_iterations
+        salt = salt or self.kdf_salt
+        entry_id = kdf_cache.entry_id(company_mst, company_name, self.machine_id, salt, iterations)
+        key = kdf_cache.get(entry_id)
+        if key:
+            return key
+        if self.disk_key_cache:
+            key = kdf_cache.disk_get(self.kdf_cache_file, self.machine_id, entry_id)
+            if key:
+                kdf_cache.put(entry_id, key)
+                return key
+        
+        key = self.derive_company_key(company_mst, company_name, iterations, salt)
+        kdf_cache.put(entry_id, key)
+        if self.disk_key_cache:
             try:
-                import uuid
-                mac = ':'.join(['{:02x}'.format((uuid.getnode() >> ele) & 0xff) 
-                               for ele in range(0,8*6,8)][::-1])
-                machine_info += f"-{mac}"
-            except:
+                kdf_cache.disk_put(self.kdf_cache_file, self.machine_id, entry_id, key, self.disk_cache_ttl)
+            except OSError:
                 pass
-                
-            # Hash để tạo ID ngắn gọn
-            machine_hash = hashlib.sha256(machine_info.encode()).hexdigest()[:16]
-            return machine_hash.upper()
-        except:
-            # Fallback: Random UUID
-            return str(uuid.uuid4())[:16].upper()
+        return key
     
-    def generate_company_key(self, company_mst, company_name=""):
-        """Tạo encryption key riêng cho từng công ty."""
+    def derive_company_key(self, company_mst, company_name="", iterations=None, salt=None):
+        """Derive key bằng PBKDF2 (không qua cache)."""
         # Kết hợp MST + tên DN + machine ID
         key_material = f"{company_mst}-{company_name}-{self.machine_id}"
         
@@ -58,8 +340,8 @@ class SecurityManager:
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
-            salt=b'xml_protector_salt_2025',
-            iterations=100000,
+            salt=salt or self.kdf_salt,
+            iterations=iterations or self.kdf_iterations,
         )
         key = base64.urlsafe_b64encode(kdf.derive(key_material.encode()))
         return key
@@ -68,7 +350,6 @@ class SecurityManager:
         """Mã hóa config với company-specific key."""
         try:
             key = self.generate_company_key(company_mst, company_name)
-            f = Fernet(key)
             
             # Thêm metadata
             secure_config = {
@@ -77,27 +358,42 @@ class SecurityManager:
                 "company_name": company_name,
                 "machine_id": self.machine_id,
                 "created_at": datetime.now().isoformat(),
-                "expires_at": (datetime.now() + timedelta(days=365)).isoformat()
+                "expires_at": (datetime.now() + timedelta(days=self.config_expiry_days)).isoformat()
             }
             
             # Mã hóa toàn bộ
-            config_json = json.dumps(secure_config, ensure_ascii=False)
-            encrypted = f.encrypt(config_json.encode())
+            config_json = json.dumps(secure_config, ensure_ascii=False).encode()
+            if self.cipher == crypto_envelope.LEGACY_ALGORITHM:
+                # Định dạng cũ (Fernet + base64) cho runtime chưa hiểu envelope
+                encrypted = Fernet(key).encrypt(config_json)
+                return base64.urlsafe_b64encode(encrypted).decode()
             
-            return base64.urlsafe_b64encode(encrypted).decode()
+            envelope = crypto_envelope.seal(base64.urlsafe_b64decode(key), config_json, self.cipher,
+                                            self.kdf_salt, self.kdf_iterations)
+            return crypto_envelope.to_text(envelope)
             
         except Exception as e:
             raise Exception(f"❌ Lỗi mã hóa config: {e}")
     
     def decrypt_config(self, encrypted_config, company_mst, company_name=""):
         """Giải mã config."""
+        return self.decrypt_config_entry(encrypted_config, company_mst, company_name)[0]
+    
+    def decrypt_config_entry(self, encrypted_config, company_mst, company_name=""):
+        """Giải mã config -> (config, thời điểm hết hạn) để cache biết khi nào phải kiểm tra lại."""
         try:
-            key = self.generate_company_key(company_mst, company_name)
-            f = Fernet(key)
-            
-            # Decode và decrypt
-            encrypted_bytes = base64.urlsafe_b64decode(encrypted_config.encode())
-            decrypted = f.decrypt(encrypted_bytes)
+            if crypto_envelope.is_envelope_text(encrypted_config):
+                # Salt + số vòng lấy từ header của envelope
+                def key_for(salt, iterations):
+                    self.check_header_iterations(iterations)
+                    return base64.urlsafe_b64decode(
+                        self.generate_company_key(company_mst, company_name, iterations, salt))
+                decrypted = crypto_envelope.unseal(crypto_envelope.from_text(encrypted_config), key_for)
+            else:
+                # Payload cũ: Fernet + base64, tham số KDF của manager này
+                key = self.generate_company_key(company_mst, company_name)
+                encrypted_bytes = base64.urlsafe_b64decode(encrypted_config.encode())
+                decrypted = Fernet(key).decrypt(encrypted_bytes)
             
             secure_config = json.loads(decrypted.decode())
             
@@ -110,11 +406,40 @@ class SecurityManager:
             if secure_config.get("machine_id") != self.machine_id:
                 raise Exception("🚫 Config không phù hợp với máy này!")
             
-            return secure_config["encrypted_data"]
+            return secure_config["encrypted_data"], expires_at
             
         except Exception as e:
             raise Exception(f"❌ Lỗi giải mã config: {e}")
     
+    def check_header_iterations(self, iterations):
+        """Từ chối số vòng PBKDF2 từ header nằm ngoài [MIN_KDF_ITERATIONS, N x số vòng cấu hình]."""
+        limit = max(self.kdf_iterations, default_kdf_iterations()) * MAX_HEADER_KDF_FACTOR
+        if not MIN_KDF_ITERATIONS <= iterations <= limit:
+            raise crypto_envelope.EnvelopeError(
+                f"Số vòng KDF trong header không hợp lệ: {iterations} (cho phép {MIN_KDF_ITERATIONS}-{limit})")
+    
+    def company_stream_key(self, company_mst, company_name=""):
+        """Company key dạng raw 32 byte cho secure_stream."""
+        return base64.urlsafe_b64decode(self.generate_company_key(company_mst, company_name))
+    
+    def encrypt_file(self, source_path, target_path, company_mst, company_name="", chunk_size=None):
+        """Mã hóa file lớn theo chunk (template bundle, EXE) bằng company key."""
+        import secure_stream
+        return secure_stream.encrypt_file(self.company_stream_key(company_mst, company_name),
+                                          source_path, target_path,
+                                          chunk_size or secure_stream.DEFAULT_CHUNK_SIZE)
+    
+    def decrypt_file(self, source_path, target_path, company_mst, company_name=""):
+        """Giải mã file đã mã hóa bằng encrypt_file."""
+        import secure_stream
+        return secure_stream.decrypt_file(self.company_stream_key(company_mst, company_name),
+                                          source_path, target_path)
+    
+    def open_encrypted_file(self, path, company_mst, company_name=""):
+        """Mở file mã hóa để đọc ngẫu nhiên từng vùng (EncryptedFileReader)."""
+        import secure_stream
+        return secure_stream.EncryptedFileReader(self.company_stream_key(company_mst, company_name), path)
+    
     def save_secure_config(self, config_data, company_mst, company_name=""):
         """Lưu config mã hóa vào file."""
         try:
@@ -130,6 +455,10 @@ class SecurityManager:
     
     def load_secure_config(self, company_mst, company_name=""):
         """Load config mã hóa từ file."""
+        return self.load_secure_config_entry(company_mst, company_name)[0]
+    
+    def load_secure_config_entry(self, company_mst, company_name=""):
+        """Load config mã hóa từ file -> (config, thời điểm hết hạn)."""
         try:
             if not self.config_file.exists():
                 raise Exception("📄 Không tìm thấy config file!")
@@ -137,7 +466,7 @@ class SecurityManager:
             with open(self.config_file, 'r', encoding='utf-8') as f:
                 encrypted_config = f.read().strip()
             
-            return self.decrypt_config(encrypted_config, company_mst, company_name)
+            return self.decrypt_config_entry(encrypted_config, company_mst, company_name)
             
         except Exception as e:
             raise Exception(f"❌ Lỗi load config: {e}")
@@ -182,6 +511,8 @@ class SecurityManager:
                 "company_name": company_config["company_name"],
                 "encrypted_config": encrypted_config,
                 "templates_count": len(company_config.get("templates", [])),
+                "kdf_iterations": self.kdf_iterations,
+                "kdf_salt": self.kdf_salt.hex(),
                 "created_at": datetime.now().isoformat(),
                 "expires_at": (datetime.now() + timedelta(days=30)).isoformat(),
                 "version": "2.0.0-secure"
@@ -192,6 +523,76 @@ class SecurityManager:
         except Exception as e:
             raise Exception(f"❌ Lỗi tạo deployment package: {e}")
     
+    def create_deployment_packages(self, company_configs, output_dir, workers=None, progress=None, max_pending=None):
+        """Tạo hàng loạt deployment package song song trên process pool.
+        
+        ``company_configs`` có thể là generator: chỉ giữ tối đa ``max_pending``
+        việc đang chạy. Package hoàn thành được ghi ngay ra ``output_dir``
+        (``<MST>_<deployment_id>.json``) và một dòng vào ``manifest.jsonl``;
+        lỗi của từng doanh nghiệp được ghi lại, không dừng cả lô.
+        ``progress(done, result)`` được gọi sau mỗi package (từ thread gọi hàm
+        này, nên GUI cần chạy hàm trong thread nền).
+        """
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+        
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        workers = workers or os.cpu_count() or 1
+        max_pending = max_pending or workers * 4
+        summary = {'total': 0, 'succeeded': 0, 'failed': 0, 'errors': [], 'workers': workers}
+        started = time.perf_counter()
+        
+        with open(output_dir / 'manifest.jsonl', 'a', encoding='utf-8') as manifest:
+            def finish(index, company_config, package=None, error=None):
+                result = {'index': index, 'company_mst': company_config.get('company_mst'), 'ok': error is None}
+                if error is None:
+                    path = output_dir / f"{package['company_mst']}_{package['deployment_id']}.json"
+                    write_json_atomic(path, package)
+                    result['path'] = str(path)
+                    summary['succeeded'] += 1
+                else:
+                    result['error'] = str(error)
+                    summary['failed'] += 1
+                    summary['errors'].append(result)
+                manifest.write(json.dumps(result, ensure_ascii=False) + '\n')
+                manifest.flush()
+                if progress:
+                    progress(summary['succeeded'] + summary['failed'], result)
+            
+            if workers == 1:
+                for index, company_config in enumerate(company_configs):
+                    summary['total'] += 1
+                    try:
+                        finish(index, company_config, self.create_deployment_package(company_config))
+                    except Exception as e:
+                        finish(index, company_config, error=e)
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_package_worker,
+                                         initargs=(self.worker_settings(),)) as pool:
+                    pending = {}
+                    
+                    def drain(return_when):
+                        done, _ = wait(pending, return_when=return_when)
+                        for future in done:
+                            index, company_config = pending.pop(future)
+                            try:
+                                finish(index, company_config, future.result())
+                            except Exception as e:
+                                finish(index, company_config, error=e)
+                    
+                    for index, company_config in enumerate(company_configs):
+                        summary['total'] += 1
+                        pending[pool.submit(_build_package_worker, company_config)] = (index, company_config)
+                        if len(pending) >= max_pending:
+                            drain(FIRST_COMPLETED)
+                    while pending:
+                        drain(FIRST_COMPLETED)
+        
+        elapsed = time.perf_counter() - started
+        summary['elapsed_s'] = round(elapsed, 3)
+        summary['packages_per_s'] = round(summary['total'] / elapsed, 2) if elapsed else 0
+        return summary
+    
     def verify_deployment_package(self, deployment_package):
         """Verify deployment package trước khi sử dụng."""
         try:
@@ -211,11 +612,137 @@ class SecurityManager:
         except Exception as e:
             return False, f"❌ Lỗi verify package: {e}"
 
+class ConfigCache:
+    """Config đã giải mã giữ trong process, vô hiệu khi mtime/size của file đổi.
+
+    Mỗi entry gắn với (file, MST, tên DN, tham số KDF). ``loader()`` trả về
+    (config, expires_at); entry quá hạn được coi là miss nên lần gọi sau giải
+    mã lại và nhận lỗi hết hạn như decrypt_config. Lỗi giải mã cũng được
+    nhớ theo chữ ký file để không giải mã lại file hỏng ở mỗi lần gọi.
+    Subscriber ``callback(path, config)`` được gọi khi nội dung config đổi:
+    lúc lưu trong process, hoặc khi ``check()`` thấy file bị thay từ bên ngoài.
+    Callback chạy sau khi đã nhả lock của cache.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.subscribers = []
+        self.hits = 0
+        self.misses = 0
+        self.changes = 0
+
+    @staticmethod
+    def file_signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def subscribe(self, callback):
+        with self.lock:
+            if callback not in self.subscribers:
+                self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    @staticmethod
+    def expired(entry):
+        return entry['expires_at'] is not None and datetime.now() > entry['expires_at']
+
+    def get(self, key, path, loader):
+        """Config cho ``key``; chỉ gọi ``loader()`` khi chưa có, file đã đổi hoặc config đã hết hạn."""
+        changed = None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry['signature'] == self.file_signature(path) and not self.expired(entry):
+                self.hits += 1
+            else:
+                self.misses += 1
+                entry, changed = self.load(key, path, loader)
+        if changed is not None:
+            self.notify(path, changed)
+        if entry['error']:
+            raise Exception(entry['error'])
+        return copy.deepcopy(entry['config'])
+
+    def load(self, key, path, loader):
+        """Nạp lại entry (gọi khi đang giữ lock) -> (entry, config mới cần báo subscriber hoặc None)."""
+        # Lấy chữ ký trước khi đọc: file bị ghi đè giữa chừng sẽ được nạp lại ở lần sau
+        signature = self.file_signature(path)
+        previous = self.entries.get(key)
+        try:
+            config, expires_at = loader()
+            entry = {'config': config, 'expires_at': expires_at, 'error': None}
+        except Exception as e:
+            entry = {'config': None, 'expires_at': None, 'error': str(e)}
+        entry.update(path=str(path), signature=signature, loader=loader)
+        self.entries[key] = entry
+        if previous and entry['config'] is not None and entry['config'] != previous['config']:
+            self.changes += 1
+            return entry, entry['config']
+        return entry, None
+
+    def update(self, key, path, config, loader=None, expires_at=None):
+        """Ghi config vừa lưu vào cache (không cần giải mã lại) và báo subscriber."""
+        with self.lock:
+            previous = self.entries.get(key)
+            self.entries[key] = {
+                'config': copy.deepcopy(config), 'expires_at': expires_at, 'error': None, 'path': str(path),
+                'signature': self.file_signature(path), 'loader': loader or (previous or {}).get('loader'),
+            }
+            changed = previous is not None and previous['config'] != config
+            if changed:
+                self.changes += 1
+        if changed:
+            self.notify(path, config)
+
+    def check(self):
+        """So chữ ký các file đang cache (chỉ stat), nạp lại và báo subscriber nếu đổi."""
+        notifications = []
+        with self.lock:
+            changed = [(key, entry) for key, entry in self.entries.items()
+                       if entry['loader'] and entry['signature'] != self.file_signature(entry['path'])]
+            for key, entry in changed:
+                _, config = self.load(key, entry['path'], entry['loader'])
+                if config is not None:
+                    notifications.append((entry['path'], config))
+        for path, config in notifications:
+            self.notify(path, config)
+        return len(changed)
+
+    def notify(self, path, config):
+        """Báo subscriber, mỗi callback một bản sao (gọi sau khi nhả lock: callback được phép dùng lại cache)."""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(str(path), copy.deepcopy(config))
+            except Exception as e:
+                print(f"⚠️ Lỗi subscriber config: {e}")
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                    'changes': self.changes, 'subscribers': len(self.subscribers)}
+
+config_cache = ConfigCache()
+
 class ConfigManager:
     """Quản lý config an toàn."""
     
-    def __init__(self):
-        self.security = SecurityManager()
+    def __init__(self, kdf_iterations=None, kdf_salt=None):
+        # kdf_salt dạng hex như trong deployment package (sau khi xoay vòng key)
+        self.security = SecurityManager(kdf_iterations=kdf_iterations,
+                                        kdf_salt=bytes.fromhex(kdf_salt) if kdf_salt else None)
         self.default_config_template = {
             "telegram": {
                 "bot_token": "",
@@ -267,18 +794,33 @@ class ConfigManager:
             company_mst = config["company_info"]["mst"]
             company_name = config["company_info"]["name"]
             
-            return self.security.save_secure_config(config, company_mst, company_name)
+            # Hạn ghi trong file muộn hơn một chút: entry cache hết hạn trước, không sau
+            expires_at = datetime.now() + timedelta(days=self.security.config_expiry_days)
+            saved = self.security.save_secure_config(config, company_mst, company_name)
+            if saved:
+                config_cache.update(self.cache_key(company_mst, company_name), self.security.config_file, config,
+                                    self.config_loader(company_mst, company_name), expires_at)
+            return saved
             
         except Exception as e:
             print(f"❌ Lỗi lưu config: {e}")
             return False
     
+    def cache_key(self, company_mst, company_name):
+        return (str(self.security.config_file), company_mst, company_name,
+                self.security.kdf_salt, self.security.kdf_iterations)
+    
+    def config_loader(self, company_mst, company_name):
+        return lambda: self.security.load_secure_config_entry(company_mst, company_name)
+    
     def load_config_secure(self, company_mst, company_name):
-        """Load config với giải mã."""
+        """Load config với giải mã (qua config_cache: chỉ giải mã lại khi file đổi)."""
         try:
-            return self.security.load_secure_config(company_mst, company_name)
+            return config_cache.get(self.cache_key(company_mst, company_name), self.security.config_file,
+                                    self.config_loader(company_mst, company_name))
         except Exception as e:
             # Fallback to environment variables
+            print(f"⚠️ Không dùng được secure config ({e}), chuyển sang biến môi trường")
             return self.load_from_environment()
     
     def load_from_environment(self):
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+XML Protector Template Bundle
+Đóng gói toàn bộ template vào một file: header + index gọn (MST, loại tờ khai,
+kỳ, offset, length, hash) + payload nén zlib, mã hóa AES-256-GCM từng template.
+Runtime chỉ đọc index lúc khởi động, payload được giải mã khi cần khôi phục.
+"""
+
+import os
+import sys
+import json
+import zlib
+import base64
+import struct
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+BUNDLE_NAME = 'templates.xpb'
+BUNDLE_MAGIC = b'XPBNDL'
+BUNDLE_VERSION = 1
+FLAG_ENCRYPTED = 0x01
+NONCE_SIZE = 12
+
+# magic | version | flags | index_length | index_nonce
+HEADER_FORMAT = '>6sBBI12s'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Trường metadata lưu trong index cho mỗi template
+INDEX_FIELDS = ('name', 'mst', 'company_name', 'document_type', 'period')
+
+log = logging.getLogger('xml_protector.templates')
+
+
+class BundleError(Exception):
+    """Bundle hỏng, sai key hoặc sai định dạng."""
+
+
+def generate_bundle_key():
+    """Key AES-256 ngẫu nhiên cho một bundle (urlsafe base64)."""
+    return base64.urlsafe_b64encode(os.urandom(32)).decode('ascii')
+
+
+def resolve_bundle_key(config_key=None):
+    """Key của bundle: XML_PROTECTOR_BUNDLE_KEY, rồi ``config_key`` (trường ``bundle_key`` của secure config).
+
+    Key không bao giờ đi cùng bundle trong EXE (ai giải nén EXE cũng lấy được
+    cả hai); nó được cấp qua secure config mã hóa bằng company key khi deploy.
+    """
+    return os.getenv('XML_PROTECTOR_BUNDLE_KEY') or config_key
+
+
+def payload_aad(header_bytes, name):
+    # magic + version + flags + tên template: payload không đổi chỗ được giữa các template
+    return header_bytes[:8] + name.encode('utf-8')
+
+
+def make_cipher(key):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    raw_key = base64.urlsafe_b64decode(key) if isinstance(key, str) else key
+    if len(raw_key) != 32:
+        raise BundleError("Bundle key phải là 32 byte")
+    return AESGCM(raw_key)
+
+
+def write_bundle(templates, output, key=None, level=9):
+    """Ghi bundle từ danh sách template info (cần ``content_bytes`` và metadata).
+
+    Không có ``key`` thì payload chỉ được nén. Ghi ra file tạm rồi replace.
+    Trả về thống kê kích thước.
+    """
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    flags = FLAG_ENCRYPTED if key else 0
+    cipher = make_cipher(key) if key else None
+    index_nonce = os.urandom(NONCE_SIZE) if key else b'\0' * NONCE_SIZE
+
+    payloads = []
+    raw_total = 0
+    used_names = set()
+    for template in templates:
+        name = template.get('name') or Path(template['file_path']).name
+        if name in used_names:
+            raise BundleError(f"Trùng tên template trong bundle: {name}")
+        used_names.add(name)
+        content = template['content_bytes']
+        entry = {field: template.get(field) for field in INDEX_FIELDS}
+        entry.update({
+            'name': name,
+            'size': len(content),
+            'sha256': hashlib.sha256(content).hexdigest(),
+        })
+        payloads.append((entry, zlib.compress(content, level)))
+        raw_total += len(content)
+
+    # AAD của payload chỉ dùng phần đầu header (chưa biết index_length lúc này)
+    header_prefix = struct.pack('>6sBB', BUNDLE_MAGIC, BUNDLE_VERSION, flags)
+    entries = []
+    encoded_payloads = []
+    offset = 0
+    for entry, compressed in payloads:
+        if cipher:
+            nonce = os.urandom(NONCE_SIZE)
+            compressed = nonce + cipher.encrypt(nonce, compressed, payload_aad(header_prefix, entry['name']))
+        entry['offset'] = offset
+        entry['length'] = len(compressed)
+        offset += len(compressed)
+        entries.append(entry)
+        encoded_payloads.append(compressed)
+
+    index_blob = zlib.compress(json.dumps({'templates': entries}, ensure_ascii=False,
+                                          separators=(',', ':')).encode('utf-8'), level)
+    header_bytes = struct.pack(HEADER_FORMAT, BUNDLE_MAGIC, BUNDLE_VERSION, flags,
+                               len(index_blob) + (16 if cipher else 0), index_nonce)
+    if cipher:
+        index_blob = cipher.encrypt(index_nonce, index_blob, header_bytes)
+
+    tmp_path = output.with_name(output.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(header_bytes)
+        f.write(index_blob)
+        for payload in encoded_payloads:
+            f.write(payload)
+    os.replace(tmp_path, output)
+    return {
+        'templates': len(entries),
+        'raw_bytes': raw_total,
+        'bundle_bytes': output.stat().st_size,
+        'index_bytes': len(index_blob),
+        'encrypted': bool(cipher),
+    }
+
+
+class TemplateBundle:
+    """Đọc bundle: index nạp ngay, payload giải nén/giải mã khi được yêu cầu.
+
+    Giữ tối đa ``cache_size`` template đã giải mã gần nhất (LRU) cho các lần
+    khôi phục lặp lại cùng một tờ khai.
+    """
+
+    def __init__(self, path, key=None, cache_size=32):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.payload_loads = 0
+        self.file = open(self.path, 'rb')
+        try:
+            self.header_bytes = self.file.read(HEADER_SIZE)
+            if len(self.header_bytes) < HEADER_SIZE:
+                raise BundleError(f"{self.path} quá ngắn, thiếu header")
+            magic, version, self.flags, index_length, index_nonce = struct.unpack(HEADER_FORMAT, self.header_bytes)
+            if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+                raise BundleError(f"{self.path} không phải template bundle v{BUNDLE_VERSION}")
+            self.cipher = None
+            index_blob = self.file.read(index_length)
+            if self.encrypted:
+                if not key:
+                    raise BundleError(f"Bundle {self.path.name} được mã hóa nhưng không có key")
+                from cryptography.exceptions import InvalidTag
+                self.cipher = make_cipher(key)
+                try:
+                    index_blob = self.cipher.decrypt(index_nonce, index_blob, self.header_bytes)
+                except InvalidTag:
+                    raise BundleError(f"Sai key hoặc index của {self.path.name} bị sửa")
+            self.entries = json.loads(zlib.decompress(index_blob).decode('utf-8'))['templates']
+            self.payload_start = HEADER_SIZE + index_length
+        except Exception:
+            self.file.close()
+            raise
+
+    @property
+    def encrypted(self):
+        return bool(self.flags & FLAG_ENCRYPTED)
+
+    def read(self, entry):
+        """Bytes của template (giải mã + giải nén + kiểm tra sha256)."""
+        name = entry['name']
+        with self.lock:
+            if name in self.cache:
+                self.cache.move_to_end(name)
+                return self.cache[name]
+            self.file.seek(self.payload_start + entry['offset'])
+            payload = self.file.read(entry['length'])
+        if self.cipher:
+            from cryptography.exceptions import InvalidTag
+            try:
+                payload = self.cipher.decrypt(payload[:NONCE_SIZE], payload[NONCE_SIZE:],
+                                              payload_aad(self.header_bytes, name))
+            except InvalidTag:
+                raise BundleError(f"Payload {name} không hợp lệ (sai key hoặc bị sửa)")
+        content = zlib.decompress(payload)
+        if hashlib.sha256(content).hexdigest() != entry['sha256']:
+            raise BundleError(f"Hash của template {name} không khớp index")
+        with self.lock:
+            self.payload_loads += 1
+            self.cache[name] = content
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return content
+
+    def stats(self):
+        return {
+            'path': str(self.path),
+            'templates': len(self.entries),
+            'encrypted': self.encrypted,
+            'payload_loads': self.payload_loads,
+            'cached': len(self.cache),
+        }
+
+    def close(self):
+        self.file.close()
+
+
+def build_bundle_from_dir(templates_dir, output, key=None):
+    """Phân tích mọi *.xml trong thư mục (giống runtime) và ghi bundle."""
+    from xml_protector_runtime import XMLProtectorRuntime
+
+    templates = []
+    for xml_file in sorted(Path(templates_dir).glob('*.xml')):
+        try:
+            template_info = XMLProtectorRuntime.parse_template(xml_file)
+        except Exception as e:
+            log.error(f"❌ Bỏ qua template {xml_file.name}: {e}")
+            continue
+        if template_info['mst']:
+            templates.append(template_info)
+    return write_bundle(templates, output, key)
+
+
+# Dòng lệnh:
+#   python template_bundle.py build TEMPLATES_DIR OUTPUT.xpb [--encrypt]
+#   python template_bundle.py info BUNDLE.xpb   (bundle mã hóa: key qua XML_PROTECTOR_BUNDLE_KEY)
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'info'):
+        print("Usage: template_bundle.py build TEMPLATES_DIR OUTPUT [--encrypt] | info BUNDLE")
+        sys.exit(2)
+
+    if sys.argv[1] == 'build':
+        bundle_key = generate_bundle_key() if '--encrypt' in sys.argv else None
+        stats = build_bundle_from_dir(sys.argv[2], sys.argv[3], bundle_key)
+        if bundle_key:
+            # Đưa vào secure config (trường bundle_key) khi deploy, không để cạnh bundle
+            stats['bundle_key'] = bundle_key
+        print(json.dumps(stats, indent=2))
+        sys.exit(0)
+
+    bundle = TemplateBundle(sys.argv[2], resolve_bundle_key())
+    print(json.dumps({'stats': bundle.stats(), 'templates': bundle.entries}, indent=2, ensure_ascii=False))
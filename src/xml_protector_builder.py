@@ -45,6 +45,11 @@ except ImportError:
     SecurityManager = None
     ConfigManager = None
 
+try:
+    import template_bundle
+except ImportError:
+    template_bundle = None
+
 # --- SECURE CONFIG TEMPLATE --- #
 SECURE_CONFIG_TEMPLATE = {
     "master_admin": {
@@ -1552,9 +1557,13 @@ class XMLProtectorBuilder:
             # Tạo tên spec file (không có đuôi .exe)
             exe_basename = exe_name.replace('.exe', '')
             
+            # Đóng gói templates thành một bundle mã hóa thay cho thư mục rời
+            template_datas, bundle_key = self.prepare_template_datas(
+                templates_path, os.path.join(output_path, f"{exe_basename}_bundle"))
+            datas_spec = ", ".join("(r'%s', '%s')" % (src.replace("\\", "/"), dest) for src, dest in template_datas)
+            
             # Tạo spec file với đường dẫn an toàn
             runtime_path = os.path.join(os.getcwd(), "src", "xml_protector_runtime.py").replace("\\", "/")
-            templates_path_safe = templates_path.replace("\\", "/")
             current_dir_safe = os.getcwd().replace("\\", "/")
             
             spec_content = f'''# -*- mode: python ; coding: utf-8 -*-
@@ -1565,7 +1574,7 @@ a = Analysis(
     [r'{runtime_path}'],
     pathex=[r'{current_dir_safe}'],
     binaries=[],
-    datas=[(r'{templates_path_safe}', 'templates')],
+    datas=[{datas_spec}],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={{}},
@@ -1634,10 +1643,12 @@ exe = EXE(
                     exe_path = dist_path
                 
                 if os.path.exists(exe_path):
+                    key_note = (f"\n\n🔑 Bundle key (đưa vào secure config khi deploy, trường bundle_key):\n{bundle_key}"
+                                if bundle_key else "")
                     messagebox.showinfo("Thành công", 
                         f"EXE đã được tạo thành công!\n\n"
                         f"📁 Vị trí: {exe_path}\n"
-                        f"📊 Kích thước: {os.path.getsize(exe_path):,} bytes")
+                        f"📊 Kích thước: {os.path.getsize(exe_path):,} bytes{key_note}")
                 else:
                     messagebox.showwarning("Cảnh báo", 
                         "EXE đã được build nhưng không tìm thấy file đầu ra!")
@@ -1649,6 +1660,26 @@ exe = EXE(
             messagebox.showerror("Lỗi", f"Build EXE thất bại: {e}")
             self.progress_var.set(0)
     
+    def prepare_template_datas(self, templates_path, bundle_dir):
+        """Build template bundle (.xpb) cho PyInstaller, lỗi thì quay về thư mục rời.
+        
+        Trả về (list (nguồn, đích) cho ``datas``/``--add-data``, bundle key hoặc None).
+        Key không được đóng vào EXE: nó đi trong secure config (``bundle_key``) khi deploy.
+        """
+        if template_bundle:
+            try:
+                os.makedirs(bundle_dir, exist_ok=True)
+                bundle_path = os.path.join(bundle_dir, template_bundle.BUNDLE_NAME)
+                bundle_key = template_bundle.generate_bundle_key()
+                stats = template_bundle.build_bundle_from_dir(templates_path, bundle_path, bundle_key)
+                if stats['templates']:
+                    print(f"📦 Template bundle: {stats['templates']} template, "
+                          f"{stats['raw_bytes']:,} -> {stats['bundle_bytes']:,} bytes")
+                    return [(bundle_path, '.')], bundle_key
+            except Exception as e:
+                print(f"⚠️ Không tạo được template bundle, dùng thư mục templates: {e}")
+        return [(templates_path, 'templates')], None
+    
     def deploy_to_telegram(self):
         """Gửi EXE lên Telegram."""
         try:
@@ -2921,7 +2952,10 @@ exe = EXE(
             
             # Build EXE với PyInstaller
             exe_name = f"{enterprise_code}_Protector"
-            build_cmd = f'pyinstaller --onefile --windowed --name="{exe_name}" --add-data="templates;templates" --add-data="{config_file};config" --add-data="logs;logs" src/xml_protector_runtime.py'
+            template_datas, bundle_key = self.prepare_template_datas(
+                "templates", os.path.join("build", f"{enterprise_code}_bundle"))
+            add_templates = " ".join(f'--add-data="{src};{dest}"' for src, dest in template_datas)
+            build_cmd = f'pyinstaller --onefile --windowed --name="{exe_name}" {add_templates} --add-data="{config_file};config" --add-data="logs;logs" src/xml_protector_runtime.py'
             
             # Chạy build command
             result = os.system(build_cmd)
@@ -2930,6 +2964,8 @@ exe = EXE(
                 # Cập nhật trạng thái
                 enterprise["last_build"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 enterprise["status"] = "built"
+                # Key của bundle trong EXE này, cấp cho máy khách qua secure config khi deploy
+                enterprise["bundle_key"] = bundle_key
                 self.save_enterprises()
                 self.refresh_enterprises_list()
                 
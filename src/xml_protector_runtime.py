@@ -5,35 +5,36 @@ XML Protector Runtime - Standalone Version
 Chạy độc lập, không có GUI Builder
 """
 
+# Chỉ import những gì watcher, matcher và restore cần lúc khởi động.
+# Notifier (requests), giải mã config (security_manager/cryptography), control
+# server, exporter metrics và trace được import lazy khi dùng lần đầu để EXE
+# one-file khởi động nhanh hơn.
 import os
 import sys
 import time
-import glob
 import json
-import pickle
+import queue
 import shutil
 import logging
-import requests
-import re
 import xml.etree.ElementTree as ET
+import hashlib
 import threading
-import subprocess
-import psutil
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
-try:
-    import winreg
-except ImportError:
-    winreg = None
+from runtime_metrics import MetricsRegistry
+from log_pipeline import setup_runtime_logging, shutdown_runtime_logging, stage_logger, get_log_stats
 
-# --- SECURE CONFIG LOADING --- #
-try:
-    from security_manager import SecurityManager, ConfigManager
-except ImportError:
-    SecurityManager = None
-    ConfigManager = None
+config_log = stage_logger('config')
+templates_log = stage_logger('templates')
+watcher_log = stage_logger('watcher')
+matcher_log = stage_logger('matcher')
+restore_log = stage_logger('restore')
+notify_log = stage_logger('notify')
+control_log = stage_logger('control')
+metrics_log = stage_logger('metrics')
+trace_log = stage_logger('trace')
 
 # --- DEFAULT COMPANY INFO --- #
 COMPANY_INFO = {
@@ -75,17 +76,37 @@ def load_deployment_info():
             pass
     return None
 
+def load_config_manager():
+    """Import ConfigManager lazy (kéo theo cryptography), None nếu không có."""
+    try:
+        from security_manager import ConfigManager
+        return ConfigManager
+    except ImportError:
+        return None
+
+def get_config_cache():
+    """config_cache của security_manager nếu secure config đã được nạp (không import thêm)."""
+    security_manager = sys.modules.get('security_manager')
+    return getattr(security_manager, 'config_cache', None)
+
 def load_secure_telegram_config():
-    """Load secure Telegram configuration."""
+    """Load secure Telegram configuration.
+
+    Trả về (telegram_config, company_info, bundle_key); bundle key của template
+    bundle chỉ được cấp trong secure config đã mã hóa.
+    """
     try:
+        # Chỉ cần giải mã (và import cryptography) khi có deployment info
+        deployment_info = load_deployment_info()
+        ConfigManager = load_config_manager() if deployment_info else None
         if ConfigManager:
-            config_mgr = ConfigManager()
-            deployment_info = load_deployment_info()
-            if deployment_info:
-                company_mst = deployment_info.get("company_mst", "")
-                company_name = deployment_info.get("company_name", "")
-                full_config = config_mgr.load_config_secure(company_mst, company_name)
-                return full_config["telegram"], full_config["company_info"]
+            # Số vòng PBKDF2 / salt do builder (hoặc job xoay vòng key) chọn cho deployment này
+            config_mgr = ConfigManager(kdf_iterations=deployment_info.get("kdf_iterations"),
+                                       kdf_salt=deployment_info.get("kdf_salt"))
+            company_mst = deployment_info.get("company_mst", "")
+            company_name = deployment_info.get("company_name", "")
+            full_config = config_mgr.load_config_secure(company_mst, company_name)
+            return full_config["telegram"], full_config["company_info"], full_config.get("bundle_key")
         
         # Fallback to environment variables
         bot_token = os.getenv('XML_PROTECTOR_BOT_TOKEN')
@@ -98,14 +119,14 @@ def load_secure_telegram_config():
                 "chat_id": chat_id,
                 "admin_ids": [int(aid.strip()) for aid in admin_ids if aid.strip().isdigit()]
             }
-            return telegram_config, COMPANY_INFO
+            return telegram_config, COMPANY_INFO, None
         
-        logging.warning("No secure config found, using demo mode")
-        return None, COMPANY_INFO
+        config_log.warning("No secure config found, using demo mode")
+        return None, COMPANY_INFO, None
         
     except Exception as e:
-        logging.error(f"Error loading secure config: {e}")
-        return None, COMPANY_INFO
+        config_log.error(f"Error loading secure config: {e}")
+        return None, COMPANY_INFO, None
 
 def parse_xml_safely(xml_path):
     """Safely parse XML file."""
@@ -113,60 +134,157 @@ def parse_xml_safely(xml_path):
         tree = ET.parse(xml_path)
         return tree.getroot()
     except Exception as e:
-        logging.error(f"Error parsing XML {xml_path}: {e}")
+        matcher_log.error(f"Error parsing XML {xml_path}: {e}")
         return None
 
 def setup_logging():
-    """Thiết lập logging thông minh."""
+    """Thiết lập logging thông minh (queue + file xoay vòng có nén, chỉ cài một lần)."""
     ensure_app_dirs()
-    logging.basicConfig(
-        level=logging.INFO,
-        format='[%(asctime)s] %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE, encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    setup_runtime_logging(LOG_FILE)
     logging.info("🚀 XML Protector đang khởi động...")
 
+class TemplateIndex:
+    """Snapshot bất biến của template index.
+
+    Mỗi thay đổi tạo snapshot mới (copy-on-write) rồi swap nguyên tử, nên
+    matcher luôn thấy một index hoàn chỉnh.
+    """
+    
+    def __init__(self, by_file=None, generation=0):
+        self.by_file = by_file or {}
+        self.generation = generation
+        self.by_key = {}
+        for template_info in self.by_file.values():
+            self.by_key[self.template_key(template_info)] = template_info
+        self.msts = frozenset(key[0] for key in self.by_key)
+    
+    @staticmethod
+    def template_key(template_info):
+        return (template_info['mst'], template_info['document_type'], template_info['period'])
+    
+    def with_changes(self, upserts, removals):
+        """Tạo index mới từ index hiện tại + thay đổi."""
+        by_file = dict(self.by_file)
+        for file_path in removals:
+            by_file.pop(file_path, None)
+        by_file.update(upserts)
+        return TemplateIndex(by_file, self.generation + 1)
+
 class XMLProtectorRuntime:
     """XML Protector Runtime - phiên bản chạy độc lập."""
     
     def __init__(self):
         self.setup_logging()
         self.running = True
+        self.paused = False
+        self.started_at = time.time()
         self.observer = None
-        self.templates = {}
+        self.control_server = None
+        self.watch_paths = []
+        self.template_lock = threading.Lock()
+        self.template_index = TemplateIndex()
+        self.template_source = None
+        self.template_bundle = None
+        self.template_dirs = []
+        self.template_observer = None
         self.telegram_config = None
         self.company_info = None
+        self.config_cache = None
+        self.metrics = MetricsRegistry()
+        self.metrics_exporter = None
+        self.metrics_endpoint = None
+        self.monitoring = None
+        self.monitoring_lock = threading.Lock()
+        self.monitoring_failed = False
+        self.trace_recorder = None
+        self.event_handler = None
+        self.sweep_lock = threading.Lock()
+        self.sweep_state = {'running': False, 'files_scanned': 0, 'last_started': None, 'last_finished': None}
         self.load_secure_config()
         self.load_templates()
         
     def setup_logging(self):
         """Thiết lập logging thông minh."""
-        ensure_app_dirs()
-        logging.basicConfig(
-            level=logging.INFO,
-            format='[%(asctime)s] %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(LOG_FILE, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        setup_logging()
         logging.info("📁 Tạo thư mục ứng dụng...")
         logging.info("🔐 Khởi tạo hệ thống bảo mật...")
         logging.info("📄 Đang load templates XML...")
     
     def load_secure_config(self):
         """Load secure configuration."""
-        self.telegram_config, self.company_info = load_secure_telegram_config()
+        self.telegram_config, self.company_info, self.bundle_key = load_secure_telegram_config()
         if self.telegram_config:
-            logging.info(f"Loaded secure config for company: {self.company_info.get('name', 'Unknown')}")
+            config_log.info(f"Loaded secure config for company: {self.company_info.get('name', 'Unknown')}")
         else:
-            logging.warning("No Telegram config available - notifications disabled")
+            config_log.warning("No Telegram config available - notifications disabled")
+        # Nhận config mới khi secure_config.enc đổi, không phải giải mã lại ở mỗi lần đọc
+        self.config_cache = get_config_cache()
+        if self.config_cache:
+            self.config_cache.subscribe(self.on_config_changed)
+    
+    def on_config_changed(self, path, config):
+        """Áp dụng config mới (gọi từ config_cache)."""
+        self.telegram_config, self.company_info = config["telegram"], config["company_info"]
+        self.bundle_key = config.get("bundle_key")
+        config_log.info(f"🔄 Config thay đổi ({Path(path).name}), đã áp dụng cho {self.company_info.get('name', 'Unknown')}")
+    
+    def check_config(self):
+        """Kiểm tra secure config có đổi không (chỉ stat file)."""
+        if self.config_cache:
+            self.config_cache.check()
+    
+    def find_template_bundle(self):
+        """Tìm template bundle (.xpb): env, trong EXE, thư mục local, app data."""
+        candidates = [
+            os.getenv('XML_PROTECTOR_TEMPLATE_BUNDLE'),
+            Path(sys._MEIPASS) / 'templates.xpb' if hasattr(sys, '_MEIPASS') else None,
+            Path('templates.xpb'),
+            APP_DIR / 'templates.xpb',
+        ]
+        for candidate in candidates:
+            if candidate and Path(candidate).is_file():
+                return Path(candidate)
+        return None
+    
+    def load_template_bundle(self, bundle_path):
+        """Chỉ nạp index của bundle; payload được giải mã khi cần khôi phục."""
+        try:
+            from template_bundle import TemplateBundle, resolve_bundle_key
+            bundle = TemplateBundle(bundle_path, resolve_bundle_key(self.bundle_key))
+        except Exception as e:
+            templates_log.error(f"❌ Không đọc được template bundle {bundle_path}: {e}")
+            return {}
+        
+        self.template_bundle = bundle
+        upserts = {}
+        for entry in bundle.entries:
+            template_info = {
+                'file_path': f"{bundle.path.resolve()}!{entry['name']}",
+                'mst': entry['mst'],
+                'company_name': entry['company_name'],
+                'document_type': entry['document_type'],
+                'period': entry['period'],
+                'size': entry['size'],
+                'sha256': entry['sha256'],
+                'bundle': bundle,
+                'bundle_entry': entry,
+            }
+            upserts[template_info['file_path']] = template_info
+        templates_log.info(f"📦 Template bundle {bundle_path}: {len(upserts)} template "
+                           f"({'mã hóa' if bundle.encrypted else 'không mã hóa'}, payload nạp khi cần)")
+        return upserts
     
     def load_templates(self):
-        """Load templates từ thư mục bundled hoặc external."""
+        """Load templates từ bundle (.xpb), thư mục bundled hoặc external."""
+        start_time = time.time()
+        upserts = {}
+        self.template_bundle = None
+        bundle_path = self.find_template_bundle()
+        if bundle_path:
+            upserts = self.load_template_bundle(bundle_path)
+            if upserts:
+                self.template_source = str(bundle_path)
+        
         templates_paths = [
             # Thử trong bundle (khi chạy từ EXE)
             Path(sys._MEIPASS) / 'templates' if hasattr(sys, '_MEIPASS') else None,
@@ -176,48 +294,153 @@ class XMLProtectorRuntime:
             TEMPLATES_DIR
         ]
         
-        for template_path in templates_paths:
+        xml_files = []
+        # Có bundle thì không cần quét thư mục template rời
+        for template_path in ([] if upserts else templates_paths):
             if template_path and template_path.exists():
-                xml_files = list(template_path.glob('*.xml'))
-                if xml_files:
-                    logging.info(f"Tìm thấy {len(xml_files)} template XML trong {template_path}")
-                    for xml_file in xml_files:
-                        self.load_single_template(xml_file)
+                found = list(template_path.glob('*.xml'))
+                if found:
+                    templates_log.info(f"Tìm thấy {len(found)} template XML trong {template_path}")
+                    self.template_source = str(template_path)
+                    xml_files.extend(found)
                     break
         
+        # Thư mục app data luôn được load thêm và theo dõi để hot-reload
+        self.template_dirs = [TEMPLATES_DIR.resolve()]
+        if self.template_source and not self.template_bundle and not hasattr(sys, '_MEIPASS'):
+            source_dir = Path(self.template_source).resolve()
+            if source_dir not in self.template_dirs:
+                self.template_dirs.append(source_dir)
+        if self.template_source and Path(self.template_source).resolve() != TEMPLATES_DIR.resolve():
+            xml_files.extend(TEMPLATES_DIR.glob('*.xml'))
+        
+        for xml_file in xml_files:
+            template_info = self.load_single_template(xml_file)
+            if template_info:
+                upserts[template_info['file_path']] = template_info
+        
+        with self.template_lock:
+            self.template_index = TemplateIndex(generation=self.template_index.generation).with_changes(upserts, ())
+        
+        load_ms = (time.time() - start_time) * 1000
         if not self.templates:
-            logging.warning("⚠️ Không tìm thấy template XML nào!")
+            templates_log.warning("⚠️ Không tìm thấy template XML nào!")
         else:
-            logging.info(f"✅ Đã load thành công {len(self.templates)} template XML")
-            logging.info("🛡️ Hệ thống bảo vệ đã sẵn sàng!")
+            templates_log.info(f"✅ Đã load thành công {len(self.templates)} template XML "
+                         f"(gen {self.template_index.generation}, {load_ms:.1f}ms)")
+            templates_log.info("🛡️ Hệ thống bảo vệ đã sẵn sàng!")
+    
+    @property
+    def templates(self):
+        """Template hiện hành theo key (MST, loại tờ khai, kỳ)."""
+        return self.template_index.by_key
+    
+    def template_bytes(self, template):
+        """Nội dung template để ghi đè (payload bundle được giải mã lúc này)."""
+        if 'content_bytes' in template:
+            return template['content_bytes']
+        content = template['bundle'].read(template['bundle_entry'])
+        self.metrics.inc('bundle_payload_loads')
+        return content
+    
+    @staticmethod
+    def is_template_content(data, template):
+        """File đã đúng nội dung template chưa (bundle: so size + sha256, không cần giải mã)."""
+        if 'content_bytes' in template:
+            return data == template['content_bytes']
+        return len(data) == template['size'] and hashlib.sha256(data).hexdigest() == template['sha256']
+    
+    @classmethod
+    def parse_template(cls, xml_file):
+        """Phân tích một file template XML (dùng chung với template_bundle khi build)."""
+        tree = ET.parse(xml_file)
+        root = tree.getroot()
+        
+        # Phân tích thông tin quan trọng
+        template_info = {
+            'file_path': str(Path(xml_file).resolve()),
+            'mst': cls.extract_mst(root),
+            'company_name': cls.extract_company_name(root),
+            'document_type': cls.extract_document_type(root),
+            'period': cls.extract_period(root),
+            'content': ET.tostring(root, encoding='unicode')
+        }
+        template_info['content_bytes'] = template_info['content'].encode('utf-8')
+        template_info['size'] = len(template_info['content_bytes'])
+        return template_info
     
     def load_single_template(self, xml_file):
         """Load một template XML và phân tích nội dung."""
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
+            template_info = self.parse_template(xml_file)
             
-            # Phân tích thông tin quan trọng
-            template_info = {
-                'file_path': str(xml_file),
-                'mst': self.extract_mst(root),
-                'company_name': self.extract_company_name(root),
-                'document_type': self.extract_document_type(root),
-                'period': self.extract_period(root),
-                'content': ET.tostring(root, encoding='unicode')
-            }
-            
-            # Sử dụng MST làm key
             if template_info['mst']:
-                self.templates[template_info['mst']] = template_info
-                logging.info(f"📋 Load template: {xml_file.name} - MST: {template_info['mst']}")
-                logging.info(f"   🏢 Công ty: {template_info['company_name']}")
-                logging.info(f"   📅 Kỳ kê khai: {template_info['period']}")
+                templates_log.info(f"📋 Load template: {Path(xml_file).name} - MST: {template_info['mst']}")
+                templates_log.info(f"   🏢 Công ty: {template_info['company_name']}")
+                templates_log.info(f"   📅 Kỳ kê khai: {template_info['period']}")
+                return template_info
             
         except Exception as e:
-            logging.error(f"Lỗi load template {xml_file}: {e}")
+            templates_log.error(f"Lỗi load template {xml_file}: {e}")
+        return None
     
-    def extract_mst(self, root):
+    def apply_template_changes(self, changed_paths):
+        """Cập nhật index theo các file template đã thêm/sửa/xóa (copy-on-write)."""
+        start_time = time.time()
+        upserts = {}
+        removals = []
+        for path in changed_paths:
+            path = Path(path)
+            if path.suffix.lower() == '.xml' and path.is_file():
+                template_info = self.load_single_template(path)
+                if template_info:
+                    upserts[template_info['file_path']] = template_info
+                    continue
+            removals.append(str(path.resolve()))
+        
+        with self.template_lock:
+            current = self.template_index
+            new_index = current.with_changes(upserts, removals)
+            self.template_index = new_index
+        
+        reload_ms = (time.time() - start_time) * 1000
+        added = len([p for p in upserts if p not in current.by_file])
+        templates_log.info(f"🔁 Template index gen {current.generation} -> {new_index.generation}: "
+                     f"+{added} ~{len(upserts) - added} -{len([p for p in removals if p in current.by_file])} "
+                     f"({len(new_index.by_key)} template, {reload_ms:.1f}ms)")
+        return {
+            'generation': new_index.generation,
+            'count': len(new_index.by_key),
+            'reload_ms': round(reload_ms, 1),
+        }
+    
+    def is_template_path(self, path):
+        """File có nằm trong thư mục template đang theo dõi không."""
+        try:
+            parent = Path(path).resolve().parent
+        except OSError:
+            return False
+        return parent in self.template_dirs
+    
+    def start_template_watcher(self):
+        """Theo dõi thư mục template để hot-reload."""
+        handler = TemplateDirHandler(self)
+        self.template_observer = Observer()
+        for template_dir in self.template_dirs:
+            if template_dir.exists():
+                self.template_observer.schedule(handler, str(template_dir), recursive=False)
+                templates_log.info(f"👀 Theo dõi templates: {template_dir}")
+        self.template_observer.start()
+    
+    def stop_template_watcher(self):
+        """Dừng theo dõi thư mục template."""
+        if self.template_observer:
+            self.template_observer.stop()
+            self.template_observer.join()
+            self.template_observer = None
+    
+    @staticmethod
+    def extract_mst(root):
         """Trích xuất MST từ XML."""
         for tag in COMPANY_CONFIG["mst_tags"]:
             for elem in root.iter():
@@ -225,7 +448,8 @@ class XMLProtectorRuntime:
                     return elem.text.strip()
         return None
     
-    def extract_company_name(self, root):
+    @staticmethod
+    def extract_company_name(root):
         """Trích xuất tên công ty từ XML."""
         for tag in COMPANY_CONFIG["company_name_tags"]:
             for elem in root.iter():
@@ -233,7 +457,8 @@ class XMLProtectorRuntime:
                     return elem.text.strip()
         return None
     
-    def extract_document_type(self, root):
+    @staticmethod
+    def extract_document_type(root):
         """Trích xuất loại tài liệu."""
         # Tìm các tag thường chứa thông tin loại tài liệu
         doc_type_tags = ["LoaiToKhai", "DocumentType", "Form", "LoaiHoSo"]
@@ -243,7 +468,8 @@ class XMLProtectorRuntime:
                     return elem.text.strip()
         return None
     
-    def extract_period(self, root):
+    @staticmethod
+    def extract_period(root):
         """Trích xuất kỳ kê khai."""
         period_tags = ["KyKhaiThue", "TaxPeriod", "Period", "Ky"]
         for tag in period_tags:
@@ -255,63 +481,76 @@ class XMLProtectorRuntime:
     def should_protect_file(self, xml_path):
         """Kiểm tra xem file XML có cần bảo vệ không."""
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
+            parse_start = time.perf_counter()
+            with open(xml_path, 'rb') as f:
+                data = f.read()
+            self.metrics.inc('bytes_read', len(data))
+            root = ET.fromstring(data)
+            match_start = time.perf_counter()
+            self.metrics.observe('parse', match_start - parse_start)
+            self.metrics.inc('files_parsed')
             
             file_mst = self.extract_mst(root)
             if not file_mst:
                 return False, None
             
-            # Kiểm tra xem MST có trong templates không
-            if file_mst in self.templates:
-                template = self.templates[file_mst]
-                
-                # So sánh thông tin chi tiết
+            # Snapshot index một lần: reload song song không ảnh hưởng lần kiểm tra này
+            index = self.template_index
+            if file_mst in index.msts:
                 file_company = self.extract_company_name(root)
                 file_doc_type = self.extract_document_type(root)
                 file_period = self.extract_period(root)
                 
                 # Nếu trùng MST và các thông tin khác
-                if (file_company == template['company_name'] and 
-                    file_doc_type == template['document_type'] and
-                    file_period == template['period']):
+                template = index.by_key.get((file_mst, file_doc_type, file_period))
+                if template and file_company == template['company_name']:
+                    self.metrics.observe('match', time.perf_counter() - match_start)
+                    # File đã đúng nội dung template (vd. sự kiện modified do chính lần ghi đè trước)
+                    if self.is_template_content(data, template):
+                        self.metrics.inc('already_restored')
+                        return False, None
+                    self.metrics.inc('matches')
                     return True, template
             
+            self.metrics.observe('match', time.perf_counter() - match_start)
             return False, None
             
         except Exception as e:
-            logging.error(f"Lỗi phân tích file {xml_path}: {e}")
+            matcher_log.error(f"Lỗi phân tích file {xml_path}: {e}")
             return False, None
     
-    def overwrite_with_template(self, xml_path, template):
+    def overwrite_with_template(self, xml_path, template, detected_at=None):
         """Ghi đè file với template gốc."""
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
-            logging.info(f"🛡️ Bắt đầu bảo vệ file: {Path(xml_path).name}")
+            restore_log.debug(f"🛡️ Bắt đầu bảo vệ file: {Path(xml_path).name}")
             
             # Backup file gốc
-            backup_start = time.time()
             backup_path = str(xml_path) + f'.backup.{int(time.time())}'
             shutil.copy2(xml_path, backup_path)
-            backup_time = (time.time() - backup_start) * 1000
-            logging.info(f"💾 Tạo backup: {backup_time:.1f}ms")
+            restore_start = time.perf_counter()
+            self.metrics.observe('backup', restore_start - start_time)
             
             # Ghi đè với nội dung template
-            overwrite_start = time.time()
-            with open(xml_path, 'w', encoding='utf-8') as f:
-                f.write(template['content'])
-            overwrite_time = (time.time() - overwrite_start) * 1000
-            logging.info(f"🔄 Ghi đè hoàn thành: {overwrite_time:.1f}ms")
+            content = self.template_bytes(template)
+            with open(xml_path, 'wb') as f:
+                f.write(content)
+            restored_at = time.perf_counter()
+            self.metrics.inc('bytes_written', len(content) + os.path.getsize(backup_path))
+            self.metrics.observe('restore', restored_at - restore_start)
+            self.metrics.observe('detect_to_restore', restored_at - (detected_at or start_time))
+            self.metrics.inc('files_protected')
             
-            # Tính tổng thời gian
-            total_time = (time.time() - start_time) * 1000
-            logging.info(f"✅ BẢO VỆ THÀNH CÔNG! (Tổng: {total_time:.1f}ms)")
+            total_time = (restored_at - start_time) * 1000
+            restore_log.info(f"✅ BẢO VỆ THÀNH CÔNG! (Tổng: {total_time:.1f}ms)")
             
             # Gửi thông báo Telegram
             self.send_protection_alert(xml_path, template)
+            self.metrics.observe('notify', time.perf_counter() - restored_at)
             
         except Exception as e:
-            logging.error(f"❌ Lỗi ghi đè file {xml_path}: {e}")
+            self.metrics.inc('protection_errors')
+            restore_log.error(f"❌ Lỗi ghi đè file {xml_path}: {e}")
     
     def send_protection_alert(self, xml_path, template):
         """Gửi cảnh báo bảo vệ qua Telegram."""
@@ -332,12 +571,12 @@ class XMLProtectorRuntime:
             self.send_telegram_message(message)
             
         except Exception as e:
-            logging.error(f"Lỗi gửi Telegram alert: {e}")
+            notify_log.error(f"Lỗi gửi Telegram alert: {e}")
     
     def send_telegram_message(self, message):
         """Gửi message qua Telegram."""
         if not self.telegram_config:
-            logging.warning("No Telegram config - message not sent")
+            notify_log.warning("No Telegram config - message not sent")
             return
             
         try:
@@ -348,43 +587,398 @@ class XMLProtectorRuntime:
                 "parse_mode": "Markdown"
             }
             
+            import requests
             response = requests.post(url, data=data, timeout=10)
             if response.status_code == 200:
-                logging.info("Đã gửi Telegram alert")
+                notify_log.info("Đã gửi Telegram alert")
             else:
-                logging.error(f"Lỗi gửi Telegram: {response.status_code}")
+                notify_log.error(f"Lỗi gửi Telegram: {response.status_code}")
                 
         except Exception as e:
-            logging.error(f"Lỗi gửi Telegram: {e}")
+            notify_log.error(f"Lỗi gửi Telegram: {e}")
+
+    def reload_templates(self):
+        """Load lại toàn bộ templates (lệnh reload-templates)."""
+        start_time = time.time()
+        previous_count = len(self.templates)
+        self.load_templates()
+        reload_ms = (time.time() - start_time) * 1000
+        templates_log.info(f"🔁 Reload templates: {previous_count} -> {len(self.templates)} ({reload_ms:.1f}ms)")
+        return {
+            'previous_count': previous_count,
+            'count': len(self.templates),
+            'generation': self.template_index.generation,
+            'reload_ms': round(reload_ms, 1),
+        }
+    
+    def pause(self):
+        """Tạm dừng bảo vệ (vẫn nhận sự kiện nhưng bỏ qua)."""
+        self.paused = True
+        watcher_log.warning("⏸️ Bảo vệ XML đã tạm dừng")
+    
+    def resume(self):
+        """Tiếp tục bảo vệ."""
+        self.paused = False
+        watcher_log.info("▶️ Bảo vệ XML đã tiếp tục")
+    
+    def request_sweep(self, paths=None):
+        """Quét lại toàn bộ XML trong các thư mục (chạy ở thread riêng).
+
+        ``paths``: None (mọi thư mục đang theo dõi) hoặc list đường dẫn không rỗng.
+        """
+        if paths is not None and (not isinstance(paths, list) or not paths
+                                  or not all(isinstance(p, str) and p for p in paths)):
+            raise ValueError("paths phải là list đường dẫn (chuỗi) không rỗng")
+        paths = [p for p in (paths or self.watch_paths) if os.path.exists(p)]
+        with self.sweep_lock:
+            if self.sweep_state['running']:
+                return {'started': False, 'reason': 'sweep already running'}
+            self.sweep_state.update(running=True, files_scanned=0, last_started=time.time())
+        threading.Thread(target=self.run_sweep, args=(paths,), name='xml-protector-sweep', daemon=True).start()
+        return {'started': True, 'paths': paths}
+    
+    def run_sweep(self, paths):
+        """Duyệt các thư mục và kiểm tra từng file XML."""
+        # Dùng lại handler của observer; chỉ tạo handler tạm (và đóng thread settle của nó) khi chưa có
+        handler = self.event_handler or XMLFileHandler(self)
+        try:
+            watcher_log.info(f"🧹 Bắt đầu quét XML: {paths}")
+            for root_path in paths:
+                for dirpath, _, filenames in os.walk(root_path):
+                    if not self.running:
+                        return
+                    for filename in filenames:
+                        if filename.endswith('.xml'):
+                            self.sweep_state['files_scanned'] += 1
+                            handler.check_and_protect(os.path.join(dirpath, filename))
+            watcher_log.info(f"✅ Quét xong {self.sweep_state['files_scanned']} file XML")
+        except Exception as e:
+            watcher_log.error(f"❌ Lỗi quét XML: {e}")
+        finally:
+            if handler is not self.event_handler:
+                handler.close()
+            self.sweep_state.update(running=False, last_finished=time.time())
+    
+    def get_queue_depths(self):
+        """Độ sâu các hàng đợi của pipeline."""
+        observer_depth = 0
+        if self.observer is not None:
+            try:
+                observer_depth = self.observer.event_queue.qsize()
+            except (AttributeError, NotImplementedError):
+                pass
+        log_stats = get_log_stats()
+        return {
+            'observer_events': observer_depth,
+            'settle_pending': self.event_handler.pending_checks() if self.event_handler else 0,
+            'log_records': log_stats['queue_depth'] if log_stats else 0,
+            'sweep_running': self.sweep_state['running'],
+        }
+    
+    def get_metrics(self):
+        """Snapshot counters + histogram độ trễ theo stage."""
+        return self.metrics.snapshot()
+    
+    def openmetrics_lines(self):
+        """Counters, histogram theo stage và độ sâu hàng đợi của pipeline dạng OpenMetrics."""
+        from runtime_metrics import openmetrics_family
+        queues = self.get_queue_depths()
+        lines = self.metrics.openmetrics_lines()
+        lines += openmetrics_family('xml_protector_queue_depth', 'gauge', [
+            ({'queue': 'observer_events'}, queues['observer_events']),
+            ({'queue': 'settle_pending'}, queues['settle_pending']),
+            ({'queue': 'log_records'}, queues['log_records']),
+        ], "Items waiting in pipeline queues")
+        lines += openmetrics_family('xml_protector_paused', 'gauge', [(None, int(self.paused))],
+                                    "1 while protection is paused")
+        return lines
+    
+    def get_template_stats(self):
+        """Thống kê template index."""
+        index = self.template_index
+        templates = list(index.by_key.values())
+        return {
+            'count': len(templates),
+            'files': len(index.by_file),
+            'generation': index.generation,
+            'source': self.template_source,
+            'bundle': self.template_bundle.stats() if self.template_bundle else None,
+            'watched_dirs': [str(d) for d in self.template_dirs],
+            'templates': [
+                {
+                    'mst': t['mst'],
+                    'company_name': t['company_name'],
+                    'document_type': t['document_type'],
+                    'period': t['period'],
+                    'file': Path(t['file_path']).name,
+                    'size': t['size'],
+                }
+                for t in templates
+            ],
+        }
+    
+    def get_status(self):
+        """Trạng thái tổng quan của runtime."""
+        company_info = self.company_info or {}
+        return {
+            'running': self.running,
+            'paused': self.paused,
+            'pid': os.getpid(),
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'version': company_info.get('version', COMPANY_INFO['version']),
+            'company': {'name': company_info.get('name'), 'mst': company_info.get('mst')},
+            'notifications_enabled': bool(self.telegram_config),
+            'watch_paths': self.watch_paths,
+            'templates': {
+                'count': len(self.templates),
+                'generation': self.template_index.generation,
+                'source': self.template_source,
+            },
+            'queues': self.get_queue_depths(),
+            'counters': self.metrics.snapshot()['counters'],
+            'sweep': dict(self.sweep_state),
+            'logging': get_log_stats(),
+            'config_cache': self.config_cache.stats() if self.config_cache else None,
+            'trace': {
+                'file': str(self.trace_recorder.path),
+                'events_recorded': self.trace_recorder.events_recorded,
+            } if self.trace_recorder else None,
+        }
+    
+    def start_control_server(self):
+        """Khởi động control server cục bộ (tắt bằng XML_PROTECTOR_CONTROL=0)."""
+        if os.getenv('XML_PROTECTOR_CONTROL', '1') == '0':
+            return
+        try:
+            from control_server import ControlServer
+            port = int(os.getenv('XML_PROTECTOR_CONTROL_PORT', '0'))
+            transport = 'tcp' if port else None
+            self.control_server = ControlServer(self, APP_DIR, transport=transport, port=port)
+            self.control_server.start()
+        except Exception as e:
+            self.control_server = None
+            control_log.error(f"❌ Không khởi động được control server: {e}")
+    
+    def start_metrics_exporter(self):
+        """Xuất metrics định kỳ (XML_PROTECTOR_METRICS_INTERVAL giây, 0 = tắt)."""
+        interval = int(os.getenv('XML_PROTECTOR_METRICS_INTERVAL', '60'))
+        if interval <= 0:
+            return
+        from runtime_metrics import MetricsExporter
+        # Monitoring DB (psutil, SQLite, thread lấy mẫu) được tạo ở lần xuất đầu tiên trong thread
+        # exporter, không phải lúc boot
+        db_sink = self.record_monitoring_snapshot if os.getenv('XML_PROTECTOR_METRICS_DB', '1') != '0' else None
+        self.metrics_exporter = MetricsExporter(self.metrics, APP_DIR, interval, db_sink)
+        self.metrics_exporter.start()
+    
+    def get_monitoring(self):
+        """AdvancedMonitoringSystem, tạo lần đầu khi cần (None nếu không tạo được)."""
+        with self.monitoring_lock:
+            if self.monitoring is None and not self.monitoring_failed:
+                try:
+                    from monitoring_system import AdvancedMonitoringSystem
+                    self.monitoring = AdvancedMonitoringSystem(metrics=self.metrics)
+                    # Lấy mẫu hệ thống + throughput xử lý XML mỗi tick vào performance_stats
+                    self.monitoring.start_monitoring()
+                except Exception as e:
+                    self.monitoring_failed = True
+                    metrics_log.warning(f"Không ghi metrics vào monitoring DB: {e}")
+            return self.monitoring
+    
+    def record_monitoring_snapshot(self, snapshot):
+        """db_sink của MetricsExporter: ghi snapshot vào monitoring DB."""
+        import platform
+        monitoring = self.get_monitoring()
+        if monitoring:
+            monitoring.record_runtime_metrics(snapshot, platform.node())
+    
+    def monitoring_openmetrics_lines(self):
+        """Metrics của monitoring cho endpoint; rỗng cho tới khi monitoring được tạo (scrape không tạo DB)."""
+        monitoring = self.monitoring
+        return monitoring.openmetrics_lines() if monitoring else []
+    
+    def start_metrics_endpoint(self):
+        """Endpoint OpenMetrics trên localhost (XML_PROTECTOR_METRICS_PORT, mặc định tắt)."""
+        port = int(os.getenv('XML_PROTECTOR_METRICS_PORT', '0'))
+        if port <= 0:
+            return
+        try:
+            from metrics_http import MetricsHTTPServer
+            collectors = [self.openmetrics_lines, self.monitoring_openmetrics_lines]
+            self.metrics_endpoint = MetricsHTTPServer(collectors, port).start()
+        except Exception as e:
+            metrics_log.error(f"❌ Không khởi động được metrics endpoint: {e}")
+            self.metrics_endpoint = None
+    
+    def stop_metrics_endpoint(self):
+        if self.metrics_endpoint:
+            self.metrics_endpoint.stop()
+            self.metrics_endpoint = None
+    
+    def stop_metrics_exporter(self):
+        """Dừng exporter và ghi snapshot cuối."""
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+        with self.monitoring_lock:
+            if self.monitoring:
+                # Ghi nốt hàng đợi write-behind (gồm snapshot cuối) trước khi thoát
+                self.monitoring.close()
+                self.monitoring = None
+    
+    def start_trace_recorder(self):
+        """Ghi trace sự kiện filesystem nếu đặt XML_PROTECTOR_TRACE_FILE (đuôi .gz để nén)."""
+        trace_file = os.getenv('XML_PROTECTOR_TRACE_FILE')
+        if not trace_file:
+            return
+        try:
+            from event_trace import EventTraceRecorder
+            self.trace_recorder = EventTraceRecorder(trace_file, roots=self.watch_paths)
+            trace_log.info(f"🎞️ Đang ghi trace sự kiện: {trace_file}")
+        except Exception as e:
+            trace_log.error(f"❌ Không mở được trace file {trace_file}: {e}")
+    
+    def stop_trace_recorder(self):
+        """Đóng trace file."""
+        recorder, self.trace_recorder = self.trace_recorder, None
+        if recorder:
+            recorder.close()
+    
+    def stop_control_server(self):
+        """Dừng control server."""
+        if self.control_server:
+            self.control_server.stop()
+            self.control_server = None
+
+class TemplateDirHandler(FileSystemEventHandler):
+    """Gom sự kiện trong thư mục template và cập nhật index theo lô."""
+    
+    DEBOUNCE_SECONDS = 0.5
+    CHANGE_EVENTS = ('created', 'modified', 'deleted', 'moved')
+    
+    def __init__(self, protector):
+        self.protector = protector
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.timer = None
+    
+    def on_any_event(self, event):
+        # Bỏ qua opened/closed: chính việc đọc template cũng sinh ra các sự kiện này
+        if event.is_directory or event.event_type not in self.CHANGE_EVENTS:
+            return
+        paths = [event.src_path]
+        if getattr(event, 'dest_path', None):
+            paths.append(event.dest_path)
+        with self.lock:
+            self.pending.update(p for p in paths if p.lower().endswith('.xml'))
+            if self.pending and self.timer is None:
+                self.timer = threading.Timer(self.DEBOUNCE_SECONDS, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+    
+    def flush(self):
+        with self.lock:
+            changed, self.pending = self.pending, set()
+            self.timer = None
+        if changed:
+            try:
+                self.protector.apply_template_changes(changed)
+            except Exception as e:
+                templates_log.error(f"❌ Lỗi cập nhật template index: {e}")
 
 class XMLFileHandler(FileSystemEventHandler):
     """Handler xử lý sự kiện file XML."""
     
+    SETTLE_DELAY = 1.0  # Giây đợi file được ghi xong trước khi kiểm tra
+    
     def __init__(self, protector):
         self.protector = protector
+        self.dispatch_started = None
+        # File XML chờ settle trên thread riêng: thread dispatch của observer không bao giờ ngủ,
+        # nên sự kiện dồn dập vẫn được nhận (và ghi trace) đúng lúc chúng đến
+        self.settle_queue = queue.Queue()
+        self.settle_thread = threading.Thread(target=self.settle_loop, name='xml-protector-settle', daemon=True)
+        self.settle_thread.start()
+    
+    def dispatch(self, event):
+        """Ghi trace sự kiện thô (nếu bật) trước khi xử lý."""
+        # Observer dispatch tuần tự trên một thread: thuộc tính này là mốc của sự kiện đang xử lý
+        self.dispatch_started = time.perf_counter()
+        recorder = self.protector.trace_recorder
+        if recorder is not None:
+            recorder.record(event)
+        super().dispatch(event)
     
     def on_created(self, event):
         """Xử lý khi file mới được tạo."""
-        if not event.is_directory and event.src_path.endswith('.xml'):
-            time.sleep(1)  # Đợi file được ghi xong
-            self.check_and_protect(event.src_path)
+        self.handle_event(event)
     
     def on_modified(self, event):
         """Xử lý khi file được sửa đổi."""
-        if not event.is_directory and event.src_path.endswith('.xml'):
-            time.sleep(1)  # Đợi file được ghi xong
-            self.check_and_protect(event.src_path)
+        self.handle_event(event)
+    
+    def handle_event(self, event):
+        """Lọc sự kiện XML, đợi file ghi xong rồi kiểm tra."""
+        received_at = time.perf_counter()
+        metrics = self.protector.metrics
+        metrics.inc('events_received')
+        is_xml = not event.is_directory and event.src_path.endswith('.xml')
+        accepted_at = time.perf_counter()
+        metrics.observe('prefilter', accepted_at - received_at)
+        if is_xml:
+            # event_receive: thời gian sự kiện chiếm thread dispatch (trace + lọc), không gồm settle
+            metrics.observe('event_receive', accepted_at - (self.dispatch_started or received_at))
+            self.settle_queue.put((event.src_path, accepted_at))
     
-    def check_and_protect(self, xml_path):
+    def settle_loop(self):
+        """Kiểm tra từng file SETTLE_DELAY giây sau khi nhận (delay cố định nên hàng FIFO giữ đúng thứ tự hạn)."""
+        while True:
+            item = self.settle_queue.get()
+            try:
+                if item is None:
+                    return
+                path, accepted_at = item
+                delay = accepted_at + self.SETTLE_DELAY - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                settled_at = time.perf_counter()
+                # Thời gian chờ thực tế (gồm cả xếp hàng sau các lần kiểm tra trước)
+                self.protector.metrics.observe('settle', settled_at - accepted_at)
+                # detect_to_restore tính từ lúc bắt đầu kiểm tra (sau settle)
+                self.check_and_protect(path, settled_at)
+            except Exception as e:
+                watcher_log.error(f"❌ Lỗi kiểm tra file sau settle: {e}")
+            finally:
+                self.settle_queue.task_done()
+    
+    def pending_checks(self):
+        return self.settle_queue.qsize()
+    
+    def drain(self):
+        """Chờ kiểm tra xong mọi file đang chờ settle."""
+        self.settle_queue.join()
+    
+    def close(self, timeout=5):
+        """Kiểm tra nốt các file đang chờ rồi dừng thread settle."""
+        self.settle_queue.put(None)
+        self.settle_thread.join(timeout)
+    
+    def check_and_protect(self, xml_path, detected_at=None):
         """Kiểm tra và bảo vệ file XML."""
+        metrics = self.protector.metrics
+        metrics.inc('events_seen')
+        if self.protector.paused:
+            metrics.inc('events_skipped_paused')
+            return
+        if self.protector.is_template_path(xml_path):
+            return
+        metrics.inc('files_checked')
         should_protect, template = self.protector.should_protect_file(xml_path)
         if should_protect:
-            logging.info(f"🚨 PHÁT HIỆN FILE GIẢ MẠO: {Path(xml_path).name}")
-            logging.info(f"📍 Đường dẫn: {xml_path}")
-            logging.info(f"🔍 Template khớp: {template.get('mst', 'Unknown')}")
-            self.protector.overwrite_with_template(xml_path, template)
+            watcher_log.info(f"🚨 PHÁT HIỆN FILE GIẢ MẠO: {xml_path} (MST {template.get('mst', 'Unknown')})")
+            self.protector.overwrite_with_template(xml_path, template, detected_at)
         else:
-            logging.debug(f"📄 File {Path(xml_path).name} không cần bảo vệ")
+            watcher_log.debug(f"📄 File {Path(xml_path).name} không cần bảo vệ")
 
 def main():
     """Hàm chính."""
@@ -404,6 +998,7 @@ def main():
     
     # Khởi động file monitoring
     event_handler = XMLFileHandler(protector)
+    protector.event_handler = event_handler
     observer = Observer()
     
     # Monitor tất cả ổ đĩa
@@ -412,10 +1007,16 @@ def main():
     for drive in drives:
         if os.path.exists(drive):
             observer.schedule(event_handler, drive, recursive=True)
+            protector.watch_paths.append(drive)
             print(f"   📂 Monitor: {drive}")
     
+    protector.start_trace_recorder()
     observer.start()
     protector.observer = observer
+    protector.start_template_watcher()
+    protector.start_metrics_exporter()
+    protector.start_metrics_endpoint()
+    protector.start_control_server()
     
     print("✅ XML Protector đã sẵn sàng!")
     print("🛡️ Đang bảo vệ các file XML...")
@@ -426,12 +1027,20 @@ def main():
     try:
         while protector.running:
             time.sleep(1)
+            protector.check_config()
     except KeyboardInterrupt:
         print("\n⏹️ Đang tắt XML Protector...")
         protector.running = False
         observer.stop()
     
+    protector.stop_control_server()
+    protector.stop_template_watcher()
+    protector.stop_metrics_endpoint()
+    protector.stop_metrics_exporter()
+    protector.stop_trace_recorder()
     observer.join()
+    event_handler.close()
+    shutdown_runtime_logging()
     print("✅ XML Protector đã tắt!")
     print("👋 Cảm ơn bạn đã sử dụng!")
 